@@ -23,12 +23,51 @@ settings = Dynaconf(
         Validator("runtime.realm", default="realm"),
         Validator("runtime.is_orchestration_runtime", default=False),
         Validator("runtime.tags", default=[]),
+        Validator("runtime.create_workers", default=4, gte=1),
+        Validator("runtime.create_queue_size", default=100, gte=0),
+        Validator("runtime.create_queue_timeout_sec", default=30, gte=0),
+        Validator("runtime.create_retry_after_sec", default=5, gte=0),
+        Validator("runtime.delete_workers", default=4, gte=1),
+        Validator("runtime.stop_grace_sec", default=3, gte=0),
+        Validator("runtime.delete_timeout_sec", default=30, gte=0),
+        Validator("runtime.shutdown_timeout_sec", default=15, gt=0),
+        Validator("runtime.journal_path", default=""),
+        Validator("runtime.keep_modules_on_exit", default=False),
+        Validator("runtime.timer_workers", default=2, gte=1),
+        Validator("runtime.module_max_lifetime_sec", default=0, gte=0),
+        Validator("runtime.control_workers", default=4, gte=1),
+        Validator("runtime.control_create_concurrency", default=2, gte=1),
+        Validator("runtime.control_queue_size", default=1000, gte=0),
+        Validator("runtime.quotas", default={}),
+        Validator("runtime.restart_policy", default="never", is_in=["never", "on-failure", "always"]),
+        Validator("runtime.restart_backoff_sec", default=1, gt=0),
+        Validator("runtime.restart_backoff_max_sec", default=60, gt=0),
+        Validator("runtime.restart_max_failures", default=5, gte=0),
+        Validator("runtime.restart_window_sec", default=300, gt=0),
+        Validator("runtime.response_cache_size", default=10000, gte=0),
+        Validator("runtime.response_cache_ttl_sec", default=600, gte=0),
+        Validator("runtime.inactivity_action", default="delete", is_in=["delete", "hibernate"]),
+        Validator("runtime.shards", default=0, gte=0),
+        Validator("runtime.identities", default=[], is_type_of=list),
+        Validator("runtime.host_pressure", default={}),
+        Validator("runtime.pressure_action", default="defer", is_in=["defer", "reject"]),
+        Validator("runtime.profiles", default={}),
 
         # gen runtime uuid default value (if empty)
         Validator("runtime.uuid", default=str(uuid.uuid4())),
 
         # mqtt required settings
         Validator("mqtt.host", "mqtt.port", "mqtt.ssl", must_exist=True),
+        Validator("mqtt.clean_session", default=False),
+
+        # errors of bad input published aggregated by kind (max_per_window 0 = every error published)
+        Validator("error_reporting.window_sec", default=10, gt=0),
+        Validator("error_reporting.max_per_window", default=5, gte=0),
+
+        # local control socket (disabled if no path)
+        Validator("control_socket.path", default=""),
+        Validator("control_socket.mode", default="660"),
+        Validator("control_socket.max_frame_bytes", default=1048576, gt=0),
 
         # topic list is required (no check on particular topic vaules due to template substitution)
         Validator("topics", must_exist=True),
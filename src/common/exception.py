@@ -41,6 +41,12 @@ class ProgramFileException(RuntimeException):
     def __init__(self, data):
         super().__init__("error getting program file", data)
 
+class CreateCancelled(RuntimeException):
+    """Module create cancelled (e.g. by a delete request)."""
+
+    def __init__(self, data):
+        super().__init__("create cancelled", data)
+
 class LauncherException(RuntimeException):
     """Error instantiating a launcher, creating/starting a module."""
 
@@ -11,10 +11,13 @@ from logzero import logger
 import uuid
 import subprocess
 import json
+import math
+import os
 import requests
 
 from common import LauncherException
 from .launcher import QoSParams
+from .docker_pool import DockerPool, DockerEndpoint
 
 class DockerContainerStatus(str, Enum):
     """Docker container statuses enum; TODO: add more."""
@@ -50,10 +53,30 @@ class DockerClient(QoSParams):
                 }
     # attach_socket options: include stdin, stdout, stderr
     _CTN_SOCK_OPTS = {'stdin': 1, 'stdout': 1, 'stderr': 1, 'stream': 1}
+
+    # cfs period (us) of the cpu quota that limits the cpus of a container
+    CPU_PERIOD_US = 100000
+
+    # docker api client shared by all instances (created on first use)
+    __docker_api_client = None
+    __docker_api_lock = threading.Lock()
+
+    # labels identifying the runtime and module a container belongs to
+    LABEL_RUNTIME = 'slruntime.runtime'
+    LABEL_MODULE = 'slruntime.module'
+
+    # docker endpoints pool; the endpoint the container is placed on, and its key there (when modules are placed on a pool of endpoints)
+    _pool: DockerPool = None
+    _endpoint: DockerEndpoint = None
+    _placement_key: str = None
     
     def __init__(self, **kwargs) -> None:
         self._settings = kwargs
         self._container = None
+        self._started = False
+        self._exit_notify = None
+        self._exit_code = None
+        self._paused = False
         self._stats: Dict[str, float] = {}
         
         # image to run
@@ -64,19 +87,32 @@ class DockerClient(QoSParams):
         # options we use to run our containers; user settings override defaults
         self._run_opts = { **DockerClient._RUN_OPTS['dft_opts'], **self._settings.get( DockerClient._RUN_OPTS['key'], {} )}
         
-        try:
-            self._client = docker.from_env()
-        except docker.errors.DockerException as docker_exception:
-            raise LauncherException(f"[DockerClient] Error starting docker (is the docker daemon running ?). {docker_exception}") from docker_exception
+        # with several docker endpoints, the endpoint (and its api client) is chosen when the container is created
+        endpoints = self._settings.get('endpoints')
+        self._pool = DockerPool.get(endpoints, self._settings.get('endpoints_refresh_sec') or 30) if endpoints else None
+        self._client = DockerClient.__docker_api() if self._pool is None else None
+
+    @staticmethod
+    def __docker_api() -> docker.DockerClient:
+        """Docker api client; one per process, shared by the containers of all modules (and runtimes)"""
+        with DockerClient.__docker_api_lock:
+            if DockerClient.__docker_api_client is None:
+                try:
+                    DockerClient.__docker_api_client = docker.from_env()
+                except docker.errors.DockerException as docker_exception:
+                    raise LauncherException(f"[DockerClient] Error starting docker (is the docker daemon running ?). {docker_exception}") from docker_exception
+            return DockerClient.__docker_api_client
         
     def wait_for_container(self, container, exit_notify_call):
         """Called within dedicated thread to wait for a container to exit"""
 
         try:
-            container.wait()
+            result = container.wait()
+            if isinstance(result, dict): self._exit_code = result.get('StatusCode')
         except docker.errors.NotFound:
             logger.warning("Container exited before we could wait on it.")
 
+        self.__release()
         exit_notify_call()
         
     def __del__(self) -> None:
@@ -114,6 +150,14 @@ class DockerClient(QoSParams):
             Returns
                 A socket attached to the container's stdin/stdout
         """        
+        self.create(command, id, workdir_mount_source, exit_notify, **kwargs)
+        return self.start()
+
+    def create(self, command: str, id: str=None, workdir_mount_source: str=None, exit_notify: Callable=None, **kwargs) -> None:
+        """
+            Create (but do not start) a container to run command on container image with options received 
+            (docker create); start() later starts it. Arguments as in start_attached()
+        """
         if id is None:
             id = str(uuid.uuid4())
 
@@ -125,23 +169,95 @@ class DockerClient(QoSParams):
                 kwargs['volumes'] = [ f"{workdir_mount_source}:{self._settings['workdir']}" ]
                             
         # merge user options with ours such; ours will override user options
-        run_options = {'image':self.image, 'command': command, **self._run_opts, **kwargs}
+        create_options = {'image':self.image, 'command': command, **self._run_opts, **kwargs}
+        # docker create does not take run-only options
+        create_options.pop('detach', None)
+
+        # place the container on the least loaded docker endpoint; the program files are mounted from its host's path
+        if self._pool is not None:
+            self.__release()
+            self._endpoint = self._pool.place(id, *DockerClient.__requested(create_options))
+            self._placement_key = id
+            self._client = self._endpoint.client
+            if workdir_mount_source:
+                workdir_mount = f"{workdir_mount_source}:{self._settings['workdir']}"
+                create_options['volumes'] = [f"{self._endpoint.host_path(workdir_mount_source)}:{self._settings['workdir']}" 
+                                             if vol == workdir_mount else vol for vol in create_options['volumes']]
+
+        # create container
+        try:
+            self._container = self._client.containers.create(**create_options)
+        except Exception:
+            self.__release()
+            raise
+        self._started = False
+        self._exit_notify = exit_notify
+        self._exit_code = None
+
+    def start(self) -> socket.SocketIO:
+        """
+            Start a container previously created, with stdin/stdout attached to a socket
+            Returns
+                A socket attached to the container's stdin/stdout
+        """
+        if not self._container:
+            raise LauncherException(f"[DockerClient] Container not created!")
 
-        # run container
-        self._container = self._client.containers.run(**run_options) 
+        # attach socket before starting so no output is missed
+        sock = self._container.attach_socket(params=DockerClient._CTN_SOCK_OPTS)
+
+        # start container
+        self._container.start()
+        self._started = True
+
+        self.__monitor()
+        
+        return sock
+
+    def adopt(self, labels: Dict[str, str], exit_notify: Callable=None) -> socket.SocketIO:
+        """
+            Take over a running container with the given labels (e.g. started by a previous runtime process)
+
+            Arguments
+            ---------
+                labels:
+                    labels the container must have
+                exit_notify:
+                    a callable to deliver container exit notification to
+            Returns
+                A socket attached to the container's stdin/stdout; None if no running container has the labels
+        """
+        label_filters = [f"{key}={value}" for key, value in labels.items()]
+        if self._pool is not None:
+            endpoint, containers = self._pool.find(label_filters)
+        else:
+            try:
+                containers = self._client.containers.list(filters={'label': label_filters})
+            except docker.errors.APIError as docker_err:
+                raise LauncherException(f"[DockerClient] Error listing containers: {docker_err}") from docker_err
+        if not containers: return None
+
+        self._container = containers[0]
+        if self._pool is not None:
+            self._endpoint, self._placement_key, self._client = endpoint, self._container.id, endpoint.client
+            limits = self.limits()
+            endpoint.place(self._placement_key, limits['cpus'], limits['mem_mb'])
+        self._started = True
+        self._exit_notify = exit_notify
 
-        # attach socket
         sock = self._container.attach_socket(params=DockerClient._CTN_SOCK_OPTS)
+        self.__monitor()
+
+        return sock
 
-        # setup thread to wait for container to exit
-        if exit_notify:
-            monitor_thread = threading.Thread(target=self.wait_for_container, args=(self._container,exit_notify))
+    def __monitor(self):
+        """Setup thread to wait for the (started) container to exit and init stats"""
+        if self._exit_notify:
+            monitor_thread = threading.Thread(target=self.wait_for_container, args=(self._container,self._exit_notify), daemon=True)
             monitor_thread.start()
           
         # init stats
         self._stats = { 'previous_cpu': 0.0, 'previous_system': 0.0 }
-        
-        return sock
 
     def __get_cpu_stats(self, d: Dict, previous_cpu: float, previous_system: float) -> Tuple:
         """ Get cpu percentage from docker stats
@@ -194,7 +310,9 @@ class DockerClient(QoSParams):
         net_stats = self.__get_network_stats(ctn_stats)
 
         stats_cmd = ['docker', 'stats', '--no-stream', self._container.id, '--format', '{{ json . }}']
-        result = subprocess.run(stats_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        # the docker cli asks the daemon of the container's endpoint
+        stats_env = {**os.environ, 'DOCKER_HOST': self._endpoint.url} if self._endpoint is not None else None
+        result = subprocess.run(stats_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=stats_env)
         try:
             dstats = json.loads(result.stdout.decode('utf-8'))
         except json.JSONDecodeError:
@@ -218,17 +336,128 @@ class DockerClient(QoSParams):
             
         blkio_bytes = self.__get_blkio_stats(ctn_stats)
         stats = { **ctn_stats, 'cpu_percent': cpu_percent, 'mem_usage': mem_usage_bytes, 'blkio_bytes': blkio_bytes, **net_stats }
+        if self._endpoint is not None: self._endpoint.observe(self._placement_key, cpu_percent / 100, mem_usage_bytes / 1e6)
         
         return stats
     
-    def stop(self):
+    def stop(self, grace_sec: float=None):
+        """
+            Stop the container; sends SIGTERM and SIGKILL if the container did not exit after grace_sec 
+            (docker default if not given). Escalates to kill() if the stop request fails
+        """
+        if not self._container:
+            raise LauncherException(f"[DockerClient] Container not running!")
+
+        if not self._started:
+            # created but never started; no exit notification will come, so remove it now
+            self.remove()
+            raise LauncherException(f"[DockerClient] Container not running!")
+
+        # a paused container cannot handle SIGTERM; unpause it first
+        if self._paused:
+            try:
+                self.unpause()
+            except LauncherException as err:
+                logger.warning(f"{err}")
+
+        try:
+            if grace_sec is None: self._container.stop()
+            else: self._container.stop(timeout=math.ceil(grace_sec))
+        except docker.errors.NotFound as docker_err:
+            raise LauncherException(f"[DockerClient] Container not running!") from docker_err
+        except (docker.errors.APIError, requests.exceptions.RequestException) as docker_err:
+            logger.warning(f"[DockerClient] Error stopping container ({docker_err}); killing it.")
+            self.kill()
+
+    def pause(self):
+        """Freeze all processes in the container (docker pause)"""
+        if not self._container:
+            raise LauncherException(f"[DockerClient] Container not running!")
+        try:
+            self._container.pause()
+        except (docker.errors.APIError, requests.exceptions.RequestException) as docker_err:
+            raise LauncherException(f"[DockerClient] Error pausing container: {docker_err}") from docker_err
+        self._paused = True
+
+    def unpause(self):
+        """Resume the processes of a paused container (docker unpause)"""
         if not self._container:
             raise LauncherException(f"[DockerClient] Container not running!")
+        try:
+            self._container.unpause()
+        except (docker.errors.APIError, requests.exceptions.RequestException) as docker_err:
+            raise LauncherException(f"[DockerClient] Error unpausing container: {docker_err}") from docker_err
+        self._paused = False
+
+    def update(self, cpus: float=None, cpu_shares: int=None, cpuset_cpus: str=None, mem_mb: float=None) -> Dict:
+        """
+            Change the resource limits of the running (or paused) container in place (docker update); 
+            only the limits given are changed. Returns the limits applied (see limits())
+        """
+        if not self._container:
+            raise LauncherException(f"[DockerClient] Container not running!")
+
+        update_opts = {}
+        if cpus is not None: update_opts.update(cpu_period=DockerClient.CPU_PERIOD_US, cpu_quota=int(cpus * DockerClient.CPU_PERIOD_US))
+        if cpu_shares is not None: update_opts['cpu_shares'] = int(cpu_shares)
+        if cpuset_cpus is not None: update_opts['cpuset_cpus'] = cpuset_cpus
+        if mem_mb is not None:
+            mem_bytes = int(mem_mb * 2**20)
+            # the swap limit cannot be below the memory limit; as docker sets it at create (swap as large as memory)
+            update_opts.update(mem_limit=mem_bytes, memswap_limit=2 * mem_bytes)
 
         try:
-            self._container.stop()
+            self._container.update(**update_opts)
+            self._container.reload()
         except docker.errors.NotFound as docker_err:
             raise LauncherException(f"[DockerClient] Container not running!") from docker_err
+        except (docker.errors.APIError, requests.exceptions.RequestException) as docker_err:
+            raise LauncherException(f"[DockerClient] Error updating container: {docker_err}") from docker_err
+        return self.limits()
+
+    def limits(self) -> Dict:
+        """Resource limits of the container (as last inspected): cpus, mem_mb and cpu_shares (0 = no limit/default), cpuset_cpus ('' = all)"""
+        host_cfg = (self._container.attrs.get('HostConfig') or {}) if self._container else {}
+        cpus = 0
+        if host_cfg.get('NanoCpus'): cpus = host_cfg['NanoCpus'] / 1e9
+        elif (host_cfg.get('CpuQuota') or 0) > 0 and host_cfg.get('CpuPeriod'): cpus = host_cfg['CpuQuota'] / host_cfg['CpuPeriod']
+        return { 'cpus': cpus,
+                 'mem_mb': (host_cfg.get('Memory') or 0) / 2**20,
+                 'cpu_shares': host_cfg.get('CpuShares') or 0,
+                 'cpuset_cpus': host_cfg.get('CpusetCpus') or '' }
+
+    def detach(self):
+        """Forget the container without stopping it (no exit notification, no stop on cleanup)"""
+        self._exit_notify = None
+        self._container = None
+        self.__release()
+
+    def __release(self):
+        """The container left its docker endpoint (exited, removed or detached)"""
+        if self._endpoint is not None: self._endpoint.release(self._placement_key)
+
+    @staticmethod
+    def __requested(create_options: Dict) -> Tuple[float, float]:
+        """cpus and memory (MB) limits in container create options (0 = no limit)"""
+        cpus = 0
+        if create_options.get('cpu_quota') and create_options.get('cpu_period'): cpus = create_options['cpu_quota'] / create_options['cpu_period']
+        mem_mb = 0
+        mem_limit = create_options.get('mem_limit')
+        if isinstance(mem_limit, str) and mem_limit[-1:].lower() == 'm': mem_mb = float(mem_limit[:-1])
+        elif isinstance(mem_limit, (int, float)): mem_mb = mem_limit / 2**20
+        return cpus, mem_mb
+
+    def remove(self):
+        """Remove the container (forcing it to stop if needed)"""
+        if not self._container:
+            return
+        self.__release()
+        try:
+            self._container.remove(force=True)
+        except docker.errors.NotFound:
+            pass # already removed (e.g. auto_remove)
+        except docker.errors.APIError as docker_err:
+            logger.warning(f"[DockerClient] Error removing container: {docker_err}")
 
     def kill(self):
         if not self._container:
@@ -239,6 +468,10 @@ class DockerClient(QoSParams):
         except docker.errors.NotFound as docker_err:
             raise LauncherException(f"[DockerClient] Container not running!") from docker_err
 
+    def exit_code(self):
+        """Exit code of the container (once it exited and we waited on it); None if unknown"""
+        return self._exit_code
+
     def is_running(self):
         """ return True if container is running; False otherwise
         """
@@ -0,0 +1,203 @@
+"""
+*TL;DR
+Pool of docker endpoints (daemons on several hosts, reached by unix socket or tcp) modules are
+placed on; each module goes to the least loaded endpoint, by the stats of the modules running on
+it (or the resources they requested, until their first stats sample)
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import docker
+import requests
+from logzero import logger
+
+from common import LauncherException
+
+class _Placed():
+    """A module placed on an endpoint: the cpus and memory (MB) it requested, and those it used at the last stats sample"""
+
+    __slots__ = ('cpus', 'mem_mb', 'used_cpus', 'used_mem_mb')
+
+    def __init__(self, cpus: float, mem_mb: float) -> None:
+        self.cpus = cpus
+        self.mem_mb = mem_mb
+        self.used_cpus = None
+        self.used_mem_mb = None
+
+class DockerEndpoint():
+    """
+        A docker daemon modules can be placed on
+
+        Arguments
+        ---------
+            url:
+                daemon url (e.g. unix:///var/run/docker.sock, tcp://node2:2375)
+            name:
+                endpoint name reported in keepalives; defaults to the url
+            max_modules:
+                max modules placed on the endpoint; 0 = no limit
+            path_map:
+                host path prefixes of program files as seen by the daemon's host, by local prefix
+                (program files must be on a filesystem both hosts mount)
+            timeout_sec:
+                docker api call timeout
+    """
+
+    def __init__(self, url: str, name: str=None, max_modules: int=0, path_map: Dict[str, str]=None, timeout_sec: float=60, **kwargs) -> None:
+        self.url = url
+        self.name = name or url
+        self.max_modules = max_modules or 0
+        self.__path_map = dict(path_map or {})
+        self.__timeout_sec = timeout_sec
+        self.client: docker.DockerClient = None
+        self.healthy = False
+        self.ncpus = 0
+        self.mem_total_mb = 0
+        self.refreshed_at = None
+        self.__placed: Dict[str, _Placed] = {}
+        self.__lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Connect (if needed) and read the host cpus and memory; returns True if the daemon answered"""
+        try:
+            if self.client is None: self.client = docker.DockerClient(base_url=self.url, timeout=self.__timeout_sec)
+            info = self.client.info()
+            self.ncpus = info.get('NCPU') or 1
+            self.mem_total_mb = (info.get('MemTotal') or 0) / 2**20
+            if not self.healthy: logger.info(f"Docker endpoint {self.name} up ({self.ncpus} cpus, {int(self.mem_total_mb)} MB).")
+            self.healthy = True
+        except (docker.errors.DockerException, requests.exceptions.RequestException) as err:
+            if self.healthy or self.refreshed_at is None: logger.warning(f"Docker endpoint {self.name} unavailable: {err}")
+            self.healthy = False
+        self.refreshed_at = time.monotonic()
+        return self.healthy
+
+    def place(self, key: str, cpus: float=0, mem_mb: float=0) -> None:
+        """Account a module placed on the endpoint"""
+        with self.__lock:
+            self.__placed[key] = _Placed(cpus, mem_mb)
+
+    def observe(self, key: str, cpus: float, mem_mb: float) -> None:
+        """Stats sample (cpus and memory used) of a module placed on the endpoint"""
+        with self.__lock:
+            placed = self.__placed.get(key)
+            if placed is None: return
+            placed.used_cpus = cpus
+            placed.used_mem_mb = mem_mb
+
+    def release(self, key: str) -> None:
+        """A module left the endpoint (no-op if it is not placed there)"""
+        with self.__lock:
+            self.__placed.pop(key, None)
+
+    def host_path(self, path: str) -> str:
+        """Path of a local program files folder on the endpoint's host"""
+        for local, remote in self.__path_map.items():
+            if path.startswith(local): return remote + path[len(local):]
+        return path
+
+    def __used(self) -> Tuple[float, float]:
+        """cpus and memory used by the modules placed (requested, until their first stats sample); called with lock held"""
+        cpus = sum(p.cpus if p.used_cpus is None else p.used_cpus for p in self.__placed.values())
+        mem_mb = sum(p.mem_mb if p.used_mem_mb is None else p.used_mem_mb for p in self.__placed.values())
+        return cpus, mem_mb
+
+    @property
+    def full(self) -> bool:
+        with self.__lock:
+            return bool(self.max_modules) and len(self.__placed) >= self.max_modules
+
+    def load(self) -> Tuple[float, int]:
+        """Placement order: the largest of the fractions of the host cpus and memory used, then modules placed"""
+        with self.__lock:
+            cpus, mem_mb = self.__used()
+            nmodules = len(self.__placed)
+        cpu_load = cpus / self.ncpus if self.ncpus else 0
+        mem_load = mem_mb / self.mem_total_mb if self.mem_total_mb else 0
+        return max(cpu_load, mem_load), nmodules
+
+    def usage(self) -> Dict:
+        """Endpoint usage reported in keepalives"""
+        with self.__lock:
+            cpus, mem_mb = self.__used()
+            nmodules = len(self.__placed)
+        return { 'name': self.name, 'url': self.url, 'healthy': self.healthy, 'modules': nmodules,
+                 'cpus': round(cpus, 3), 'mem_mb': round(mem_mb, 1), 'ncpus': self.ncpus, 'mem_total_mb': round(self.mem_total_mb, 1) }
+
+class DockerPool():
+    """
+        Docker endpoints modules are placed on; one pool per endpoints configuration, shared by
+        the docker clients of all modules (see get())
+
+        Arguments
+        ---------
+            endpoints:
+                endpoints (DockerEndpoint arguments)
+            refresh_sec:
+                how often endpoints are checked (and those down retried), at placement
+    """
+
+    __pools: Dict[str, 'DockerPool'] = {}
+    __pools_lock = threading.Lock()
+
+    def __init__(self, endpoints: List[Dict], refresh_sec: float=30) -> None:
+        if not endpoints: raise LauncherException("[DockerPool] No docker endpoints configured")
+        self.__endpoints = [DockerEndpoint(**endpoint) for endpoint in endpoints]
+        self.__refresh_sec = refresh_sec
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def get(endpoints: List[Dict], refresh_sec: float=30) -> 'DockerPool':
+        """Pool of the endpoints given, created on first use"""
+        endpoints = [dict(endpoint) for endpoint in endpoints]
+        key = json.dumps(endpoints, sort_keys=True, default=str)
+        with DockerPool.__pools_lock:
+            pool = DockerPool.__pools.get(key)
+            if pool is None: pool = DockerPool.__pools[key] = DockerPool(endpoints, refresh_sec)
+            return pool
+
+    @staticmethod
+    def usage_all() -> Optional[List[Dict]]:
+        """Usage of the endpoints of all pools; None if modules are not placed on docker endpoints"""
+        with DockerPool.__pools_lock:
+            pools = list(DockerPool.__pools.values())
+        if not pools: return None
+        return [endpoint.usage() for pool in pools for endpoint in pool.endpoints]
+
+    @property
+    def endpoints(self) -> List[DockerEndpoint]:
+        return list(self.__endpoints)
+
+    def __refresh(self) -> None:
+        """Check endpoints not checked for refresh_sec"""
+        now = time.monotonic()
+        for endpoint in self.__endpoints:
+            if endpoint.refreshed_at is None or now - endpoint.refreshed_at >= self.__refresh_sec: endpoint.refresh()
+
+    def place(self, key: str, cpus: float=0, mem_mb: float=0) -> DockerEndpoint:
+        """Place a module on the least loaded endpoint that is up and not full"""
+        with self.__lock:
+            self.__refresh()
+            candidates = [endpoint for endpoint in self.__endpoints if endpoint.healthy and not endpoint.full]
+            if not candidates:
+                raise LauncherException("[DockerPool] No docker endpoint available (all down or full)")
+            endpoint = min(candidates, key=lambda endpoint: endpoint.load())
+            endpoint.place(key, cpus, mem_mb)
+        logger.debug(f"Module {key} placed on docker endpoint {endpoint.name}.")
+        return endpoint
+
+    def find(self, label_filters: List[str]) -> Tuple[Optional[DockerEndpoint], List]:
+        """Endpoint running the containers with the labels given (and the containers); (None, []) if none does"""
+        with self.__lock:
+            self.__refresh()
+        for endpoint in self.__endpoints:
+            if not endpoint.healthy: continue
+            try:
+                containers = endpoint.client.containers.list(filters={'label': label_filters})
+            except (docker.errors.APIError, requests.exceptions.RequestException) as err:
+                logger.warning(f"Error listing containers on docker endpoint {endpoint.name}: {err}")
+                continue
+            if containers: return endpoint, containers
+        return None, []
@@ -7,7 +7,7 @@ a docker client to do so (this is what PythonLauncher does). Other launchers can
 A module launcher factory (LauncherContext) instanciates launchers based on settings
 """
 
-from typing import Protocol, Dict, Callable
+from typing import Protocol, Dict, Callable, List, Optional
 from abc import abstractmethod
 from enum import Enum
 from logzero import logger
@@ -15,7 +15,7 @@ from dynaconf import LazySettings
 
 from model import Module, ModuleStats
 from common import settings, LauncherException, ClassUtils
-from program_files import ProgramFilesBuilder
+from program_files import ProgramFilesBuilder, ProgramFilesCache
 from pubsub import PubsubListner
 
 class ModuleLauncher(Protocol):
@@ -30,8 +30,79 @@ class ModuleLauncher(Protocol):
         raise NotImplementedError
 
     @abstractmethod
-    def stop_module(self):
-        """Stop module"""
+    def fetch_files(self, files_cache: ProgramFilesCache=None):
+        """Create stage 1: get the program files the module needs; optionally share fetched files through a files cache"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_container(self, exit_notify: Callable=None):
+        """Create stage 2: create (but do not start) the module with previously fetched files; optionally provide an exit notify callable"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_container(self):
+        """Create stage 3: start the module previously created"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def attach_streamer(self, input_notify: Callable=None):
+        """Create stage 4: setup a streamer for stdin, stdout, stderr of the started module; 
+           optionally provide a callable notified when input for the module arrives"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def restart_container(self, exit_notify: Callable=None):
+        """Replace the module's exited container with a new one and start it, using the program files 
+           already fetched (create stages 2-3 again); optionally provide an exit notify callable"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def exit_code(self):
+        """Exit code of the module's container once it exited; None if unknown (or still running)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def adopt_container(self, exit_notify: Callable=None, state: Dict=None) -> bool:
+        """Take over the module running in a container started by a previous runtime process (instead of 
+           create stages 1-3); returns False if there is no such container. Optionally provide an exit notify callable.
+           state is the launcher_state() of the launcher that started it (what it needs to restart and clean up the module)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def launcher_state(self) -> Dict:
+        """State (json serializable) another runtime process needs to take over the module (see adopt_container())"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stop_module(self, grace_sec: float=None):
+        """Stop module; the module is killed if it did not exit after grace_sec (launcher default if not given)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_resources(self, limits: Dict) -> Dict:
+        """Change the resource limits of the running module in place (limits: 'cpus', 'mem_mb', 'cpu_shares', 
+           'cpuset_cpus'; only those given change); returns the limits applied"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def pause_module(self):
+        """Freeze the running module (it keeps its memory, but gets no cpu) until resume_module()"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def resume_module(self):
+        """Resume a module frozen by pause_module()"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def detach(self):
+        """Leave the module running (to be adopted by another runtime process); release the container
+        and program files without stopping or removing them"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def cleanup(self):
+        """Remove what the create stages left behind (container, program files); used when a create fails or is cancelled"""
         raise NotImplementedError
 
     @abstractmethod
@@ -75,6 +146,12 @@ class LauncherContext():
                             f"launcher.{module.filetype}.class", launcher_settings=ls, module=module, **kwargs)
         return mlauncher
 
+    @staticmethod
+    def hosts_usage() -> Optional[List[Dict]]:
+        """Usage of each host modules are placed on, when launchers place them on several docker endpoints; None otherwise"""
+        from .docker_pool import DockerPool # imported here, as launchers (and their backends) are loaded from settings
+        return DockerPool.usage_all()
+
 class QoSParams(Protocol):
     """
         An interface to convert a request arguments (usually a module create) into
@@ -23,6 +23,7 @@ from common import LauncherException
 from .launcher import ModuleLauncher
 from .docker_client import DockerClient
 from pubsub import PubsubStreamer, PubsubListner
+from program_files import ProgramFilesCache, ProgramFilesInfo
 
 class PythonLauncher(ModuleLauncher):
     """
@@ -47,6 +48,7 @@ class PythonLauncher(ModuleLauncher):
         self._settings = launcher_settings
         self._module = module
         self._ctn_sock = None
+        self._files_info = None
         if self._settings.get('pipe_stdout'): self._pubsubc = pubsubc
         else: self._pubsubc = None
 
@@ -64,22 +66,58 @@ class PythonLauncher(ModuleLauncher):
         """
             Start the module; Optionally accepts the setup data for a streamer to 
             publish/subcribe stdin, stdout, stderr of the module
+            Runs all create stages (fetch_files, create_container, start_container, attach_streamer) in sequence
             
             Arguments
             ---------
                 exit_notify:
                     a callable to deliver container exit notification to
         """    
+        self.fetch_files()
+        self.create_container(exit_notify)
+        self.start_container()
+        self.attach_streamer()
+
+    def fetch_files(self, files_cache: ProgramFilesCache=None):
+        """
+            Write auth token and get the program files into a tmp folder (at files_info.path)
+
+            Arguments
+            ---------
+                files_cache:
+                    if given, program files are downloaded once into the cache and copied 
+                    from there by all modules running the same program
+        """
         # write auth token for arena-py; TODO: auth token should come from request, dont access settings here
         auth_token_json = json.dumps({ 'username': settings.get('mqtt', {'username': 'nouser'}).get('username', ""), 'token': settings.get('mqtt', {'password': 'nouser'}).get('password', "")})
         self._file_repo.file_from_string_contents(auth_token_json, '.arena_mqtt_auth')
     
-        # get the files from repo url base on module name (this creates a list of files to download) TODO: dont access settings here
-        self._file_repo.from_module_data(settings.repository.url, self._module)
+        if files_cache is not None:
+            # copy the files shared by modules running the same program
+            files_url = self._file_repo.module_files_url(settings.repository.url, self._module)
+            self._file_repo.from_program_files(files_cache.get(files_url, self.__fetch_shared_files))
+        else:
+            # get the files from repo url base on module name (this creates a list of files to download) TODO: dont access settings here
+            self._file_repo.from_module_data(settings.repository.url, self._module)
         
         # get the files into a tmp folder at files_info.path (this acctualy downloads the files)
         self._files_info = self._file_repo.get_files()
-            
+
+    def __fetch_shared_files(self) -> ProgramFilesInfo:
+        """Download the module program files into their own folder, to be shared through a files cache"""
+        shared_repo = ClassUtils.class_instance_from_settings_class_path('repository.class')
+        shared_repo.from_module_data(settings.repository.url, self._module)
+        return shared_repo.get_files()
+
+    def create_container(self, exit_notify: Callable=None):
+        """
+            Create container with the files previously fetched; start_container() starts it
+
+            Arguments
+            ---------
+                exit_notify:
+                    a callable to deliver container exit notification to
+        """
         # create a Path object to get program file from last component of file
         fnp = Path(self._module.file)
         
@@ -101,23 +139,68 @@ class PythonLauncher(ModuleLauncher):
         # add PROGRAM_OBJECT_ID
         mod_env = self.__add_env_var(mod_env, f"PROGRAM_OBJECT_ID={self._module.uuid}")
 
-        logger.debug(f"Starting module {self._module.name}. cmd: {cmd}, env: {mod_env}")
+        logger.debug(f"Creating module {self._module.name}. cmd: {cmd}, env: {mod_env}")
     
-        # prepare parameters to start container
-        start_attached_params = { 
+        # prepare parameters to create container
+        create_params = { 
                         'command': cmd,
                         'id': self._module.uuid,
                         'name': re.sub('[^A-Za-z0-9]+', '', self._module.uuid),
                         'environment': mod_env,
                         'workdir_mount_source': str(self._files_info.path),
+                        'labels': self.__labels(),
                         'exit_notify': exit_notify }
+
+        # cpus and memory the module requested are container limits; cpus as a cpu quota (not nano_cpus),
+        # which docker can update in place (update_resources())
+        if self._module.requested_cpus: 
+            create_params['cpu_period'] = DockerClient.CPU_PERIOD_US
+            create_params['cpu_quota'] = int(self._module.requested_cpus * DockerClient.CPU_PERIOD_US)
+        if self._module.requested_mem_mb: create_params['mem_limit'] = f"{int(self._module.requested_mem_mb)}m"
+        if self._module.cpu_shares: create_params['cpu_shares'] = int(self._module.cpu_shares)
+        if self._module.cpuset_cpus: create_params['cpuset_cpus'] = self._module.cpuset_cpus
         
-        # start container with stdin, stdout, stderr attached to a socket
-        self._ctn_sock = self._docker_client.start_attached(**start_attached_params)
+        self._docker_client.create(**create_params)
+
+    def start_container(self):
+        """Start container created by create_container() with stdin, stdout, stderr attached to a socket"""
+        logger.debug(f"Starting module {self._module.name}.")
+        self._ctn_sock = self._docker_client.start()
+
+    def restart_container(self, exit_notify: Callable=None):
+        """Remove the exited container and start a new one on the program files already fetched"""
+        logger.debug(f"Restarting module {self._module.name}.")
+        self._docker_client.remove()
+        self._prev_net_bytes = None
+        self._prev_blkio_bytes = None
+        self.create_container(exit_notify)
+        self.start_container()
+
+    def exit_code(self):
+        return self._docker_client.exit_code()
+
+    def adopt_container(self, exit_notify: Callable=None, state: Dict=None) -> bool:
+        """Attach to the running container of the module (found by its runtime and module labels); takes over 
+           its program files (to restart it, and remove them at cleanup) given by state"""
+        files_state = (state or {}).get('files')
+        if files_state: self._files_info = ProgramFilesInfo.from_state(files_state)
+        self._ctn_sock = self._docker_client.adopt(self.__labels(), exit_notify)
+        if self._ctn_sock is None: return False
+        logger.debug(f"Adopted module {self._module.name}.")
+        return True
 
-        # start pubsub streamer that will publish/subscribe stdin, stdout, stderr topics
+    def launcher_state(self) -> Dict:
+        """Program files of the module (see adopt_container())"""
+        return {'files': self._files_info.state()} if self._files_info else {}
+
+    def __labels(self) -> Dict[str, str]:
+        """Container labels identifying the runtime (module parent) and module"""
+        return { DockerClient.LABEL_RUNTIME: self._module.parent, DockerClient.LABEL_MODULE: self._module.uuid }
+
+    def attach_streamer(self, input_notify: Callable=None):
+        """Start pubsub streamer that will publish/subscribe stdin, stdout, stderr topics"""
         if self._pubsubc:
-            self._streamer = PubsubStreamer(self._pubsubc, self._ctn_sock, self._module.topics)
+            self._streamer = PubsubStreamer(self._pubsubc, self._ctn_sock, self._module.topics, input_notify=input_notify)
                      
     def __add_env_var(self, mod_env: Iterable, evar_str: str):
         if isinstance(mod_env, dict):
@@ -180,7 +263,38 @@ class PythonLauncher(ModuleLauncher):
 
         return cpu_active or net_active or blkio_active
 
-    def stop_module(self):
-        """Stop module"""
+    def stop_module(self, grace_sec: float=None):
+        """Stop module; the container is killed if it did not exit after grace_sec"""
         logger.debug(f"Stopping module {self._module.name}.")
-        self._docker_client.stop()
+        self._docker_client.stop(grace_sec)
+
+    def update_resources(self, limits: Dict) -> Dict:
+        """Change the container resource limits in place; returns the limits applied"""
+        logger.debug(f"Updating module {self._module.name} resources: {limits}")
+        return self._docker_client.update(**limits)
+
+    def pause_module(self):
+        """Pause the container"""
+        logger.debug(f"Pausing module {self._module.name}.")
+        self._docker_client.pause()
+
+    def resume_module(self):
+        """Unpause the container"""
+        logger.debug(f"Resuming module {self._module.name}.")
+        self._docker_client.unpause()
+
+    def detach(self):
+        """Leave the container running and keep its program files"""
+        logger.debug(f"Detaching module {self._module.name}.")
+        self._docker_client.detach()
+        if self._files_info: self._files_info.keep()
+
+    def cleanup(self):
+        """Remove the container (if created; forcing it to stop) and the program files fetched (or partially fetched)"""
+        logger.debug(f"Cleaning up module {self._module.name}.")
+        self._docker_client.remove()
+        if self._files_info:
+            self._files_info.cleanup()
+            self._files_info = None
+        else:
+            self._file_repo.discard()
@@ -15,7 +15,10 @@ from common.config import settings
 from dynaconf import ValidationError
 
 from pubsub.listner import MQTTListner
+from pubsub.socket_listner import SocketListner
 from runtime.runtime_mngr import RuntimeMngr
+from runtime.shards import ShardSet, shard_config
+from runtime.runtime_group import RuntimeGroup, identity_settings
 
 # print settings with no password
 def print_settings():
@@ -33,11 +36,30 @@ def main(args):
     loglevel = getattr(logzero, settings.loglevel)
     logzero.loglevel(loglevel)
 
-    # create runtime mngr instance
-    rtmngr = RuntimeMngr(**settings)
+    identities = settings.runtime.identities
+    if identities:
+        # several runtimes in this process, sharing the mqtt connection (and scheduler, docker client)
+        if settings.runtime.shards > 1: raise ValueError("runtime.identities and runtime.shards cannot be combined")
+        identities = [identity_settings(settings, overrides) for overrides in identities]
+        rtmngr = RuntimeGroup(identities[0]['topics']['runtimes'], settings.runtime.timer_workers, errors=settings.error_reporting)
+        for identity in identities:
+            rtmngr.add(RuntimeMngr(scheduler=rtmngr.scheduler, **identity))
+        error_topic = identities[0]['topics']['runtimes']
+    else:
+        # sharded runtime: this process registers the runtime and supervises the shard processes running the modules
+        shards = ShardSet(settings.runtime.shards, shard_config(settings)) if settings.runtime.shards > 1 else None
+
+        # create runtime mngr instance
+        rtmngr = RuntimeMngr(shards=shards, **settings)
+        error_topic = settings.topics.runtimes
+
+    # local control socket (co-located orchestrators); sits between the mqtt client and the runtime mngr (or group)
+    control_socket = settings.get('control_socket')
+    if control_socket.get('path'):
+        rtmngr = SocketListner(rtmngr, **control_socket, error_topic=error_topic, errors=settings.error_reporting)
 
-    # pass runtime mngr as pubsub handler to mqtt client
-    mqttc = MQTTListner(rtmngr, **settings.get('mqtt'), error_topic=settings.topics.runtimes)
+    # pass runtime mngr (or group) as pubsub handler to mqtt client
+    mqttc = MQTTListner(rtmngr, **settings.get('mqtt'), error_topic=error_topic, errors=settings.error_reporting)
 
     # wait for init to be done
     rtmngr.wait_init()
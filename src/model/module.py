@@ -6,6 +6,7 @@ Module model; Store information about wasm modules running
 from uuid import uuid4
 import re 
 
+from common import InvalidArgument
 from pubsub import PubsubMessage
 from .model_base import ModelBase
 from .runtime_types import *
@@ -51,6 +52,11 @@ class Module(ModelBase, dict):
             namespaced_scene=kwargs.get('scene'), 
             env=kwargs.get('env'))
 
+        # namespace/scene the module is accounted to (quotas); a 'namespace/scene' scene keeps its namespace here
+        scene = kwargs.get('scene')
+        valid_scene = isinstance(scene, str) and re.fullmatch("[a-z0-9_-]{3,}/[a-z0-9_-]{3,}", scene, re.IGNORECASE)
+        self.__tenant_scene = scene if valid_scene else ns_scene
+
         kwargs['uuid'] = uuid
         kwargs['type'] = MessageType.mod
         kwargs['scene'] = ns_scene
@@ -223,6 +229,78 @@ class Module(ModelBase, dict):
     def resources(self, m_resources):
         self['resources'] = m_resources
 
+    # cpus and memory (MB) the module requests; sum of the 'cpus' and 'mem_mb' of its resources objects
+    @property
+    def requested_cpus(self):
+        return self.__requested('cpus')
+
+    @property
+    def requested_mem_mb(self):
+        return self.__requested('mem_mb')
+
+    def __requested(self, key):
+        resources = self.resources
+        if isinstance(resources, dict): resources = [resources]
+        try:
+            return sum(float(res.get(key) or 0) for res in resources if isinstance(res, dict))
+        except (TypeError, ValueError) as err:
+            raise InvalidArgument(f"resources {key}", resources) from err
+
+    # cpu shares (relative cpu weight) and cpus (e.g. '0-1') the module is pinned to; None = docker defaults
+    @property
+    def cpu_shares(self):
+        return self.__resource('cpu_shares')
+
+    @property
+    def cpuset_cpus(self):
+        return self.__resource('cpuset_cpus')
+
+    def __resource(self, key):
+        resources = self.resources
+        if isinstance(resources, dict): resources = [resources]
+        for res in resources:
+            if isinstance(res, dict) and res.get(key) is not None: return res[key]
+        return None
+
+    @staticmethod
+    def check_resource_limits(limits: dict) -> dict:
+        """Check resource limits for a module update ('cpus', 'mem_mb', 'cpu_shares', 'cpuset_cpus'); returns them converted"""
+        if not isinstance(limits, dict) or not limits:
+            raise InvalidArgument("resources", limits)
+        checked = {}
+        for key, value in limits.items():
+            try:
+                if key in ('cpus', 'mem_mb'):
+                    checked[key] = float(value)
+                    if checked[key] <= 0: raise ValueError(key)
+                elif key == 'cpu_shares':
+                    checked[key] = int(value)
+                    if checked[key] < 2: raise ValueError(key) # docker minimum
+                elif key == 'cpuset_cpus':
+                    if not isinstance(value, str) or not re.fullmatch(r'[0-9]+(-[0-9]+)?(,[0-9]+(-[0-9]+)?)*', value): raise ValueError(key)
+                    checked[key] = value
+                else:
+                    raise ValueError(key)
+            except (TypeError, ValueError) as err:
+                raise InvalidArgument(f"resources {key}", value) from err
+        return checked
+
+    def update_resources(self, limits: dict) -> None:
+        """Replace the module resources with one resources object holding its limits, changed by limits (checked)"""
+        resources = { 'cpus': self.requested_cpus, 'mem_mb': self.requested_mem_mb, 
+                      'cpu_shares': self.cpu_shares, 'cpuset_cpus': self.cpuset_cpus, **limits }
+        self.resources = [{k: v for k, v in resources.items() if v}]
+
+    # namespace/scene the module is accounted to; the scene requested when in the 'namespace/scene' form 
+    # (the 'scene' attribute puts every requested scene in the default namespace)
+    @property
+    def tenant_scene(self):
+        return self.__tenant_scene
+
+    @property
+    def namespace(self):
+        return self.__tenant_scene.split('/', 1)[0]
+
     @property
     def fault_crash(self):
         return self.get('fault_crash', [])
@@ -231,6 +309,33 @@ class Module(ModelBase, dict):
     def fault_crash(self, m_fault_crash):
         self['fault_crash'] = m_fault_crash
         
+    # seconds the module has to exit after SIGTERM before it is killed; None = runtime default
+    @property
+    def stop_grace_sec(self):
+        return self.get('stop_grace_sec')
+
+    @stop_grace_sec.setter
+    def stop_grace_sec(self, m_stop_grace_sec):
+        self['stop_grace_sec'] = m_stop_grace_sec
+
+    # seconds the module may run before it is deleted; None = runtime default, 0 = no limit
+    @property
+    def max_lifetime_sec(self):
+        return self.get('max_lifetime_sec')
+
+    @max_lifetime_sec.setter
+    def max_lifetime_sec(self, m_max_lifetime_sec):
+        self['max_lifetime_sec'] = m_max_lifetime_sec
+
+    # restart policy (RestartPolicy) when the module exits on its own; None = runtime default
+    @property
+    def restart_policy(self):
+        return self.get('restart_policy')
+
+    @restart_policy.setter
+    def restart_policy(self, m_restart_policy):
+        self['restart_policy'] = m_restart_policy
+
     @property
     def status(self):
         return self.get('status')
@@ -256,12 +361,15 @@ class Module(ModelBase, dict):
         delete = dict(map(lambda k: (k, self.get(k)), self._delete_attrs))
         return { **delete }
 
-    def confirm_msg(self, msg_to_confirm) -> PubsubMessage:
+    def confirm_msg(self, msg_to_confirm, result=Result.ok, details=None) -> PubsubMessage:
+        """Response to msg_to_confirm; details default to the request data"""
+        if details is None: details = msg_to_confirm.get('data')
         return self.__mod_msgs.resp(
             self.__topics['mio'],
             msg_to_confirm.get('object_id'),
             action=msg_to_confirm.get('action'),
-            details=msg_to_confirm.get('data'))
+            details=details,
+            result=result)
         
     def delete_msg(self) -> PubsubMessage:
         return self.__mod_msgs.req(self.__topics['mio'], 
@@ -184,28 +184,276 @@ class Runtime(ModelBase, dict):
     def inactivity_check_interval_sec(self, v):
         self['inactivity_check_interval_sec'] = v
 
+    @property
+    def create_workers(self):
+        return self.get('create_workers')
+
+    @create_workers.setter
+    def create_workers(self, v):
+        self['create_workers'] = v
+
+    @property
+    def create_queue_size(self):
+        return self.get('create_queue_size')
+
+    @create_queue_size.setter
+    def create_queue_size(self, v):
+        self['create_queue_size'] = v
+
+    @property
+    def create_queue_timeout_sec(self):
+        return self.get('create_queue_timeout_sec')
+
+    @create_queue_timeout_sec.setter
+    def create_queue_timeout_sec(self, v):
+        self['create_queue_timeout_sec'] = v
+
+    @property
+    def create_retry_after_sec(self):
+        return self.get('create_retry_after_sec')
+
+    @create_retry_after_sec.setter
+    def create_retry_after_sec(self, v):
+        self['create_retry_after_sec'] = v
+
+    @property
+    def delete_workers(self):
+        return self.get('delete_workers')
+
+    @delete_workers.setter
+    def delete_workers(self, v):
+        self['delete_workers'] = v
+
+    @property
+    def stop_grace_sec(self):
+        return self.get('stop_grace_sec')
+
+    @stop_grace_sec.setter
+    def stop_grace_sec(self, v):
+        self['stop_grace_sec'] = v
+
+    @property
+    def delete_timeout_sec(self):
+        return self.get('delete_timeout_sec')
+
+    @delete_timeout_sec.setter
+    def delete_timeout_sec(self, v):
+        self['delete_timeout_sec'] = v
+
+    @property
+    def shutdown_timeout_sec(self):
+        return self.get('shutdown_timeout_sec')
+
+    @shutdown_timeout_sec.setter
+    def shutdown_timeout_sec(self, v):
+        self['shutdown_timeout_sec'] = v
+
+    @property
+    def journal_path(self):
+        return self.get('journal_path')
+
+    @journal_path.setter
+    def journal_path(self, v):
+        self['journal_path'] = v
+
+    @property
+    def keep_modules_on_exit(self):
+        return self.get('keep_modules_on_exit')
+
+    @keep_modules_on_exit.setter
+    def keep_modules_on_exit(self, v):
+        self['keep_modules_on_exit'] = v
+
+    @property
+    def timer_workers(self):
+        return self.get('timer_workers')
+
+    @timer_workers.setter
+    def timer_workers(self, v):
+        self['timer_workers'] = v
+
+    @property
+    def module_max_lifetime_sec(self):
+        return self.get('module_max_lifetime_sec')
+
+    @module_max_lifetime_sec.setter
+    def module_max_lifetime_sec(self, v):
+        self['module_max_lifetime_sec'] = v
+
+    @property
+    def control_workers(self):
+        return self.get('control_workers')
+
+    @control_workers.setter
+    def control_workers(self, v):
+        self['control_workers'] = v
+
+    @property
+    def control_create_concurrency(self):
+        return self.get('control_create_concurrency')
+
+    @control_create_concurrency.setter
+    def control_create_concurrency(self, v):
+        self['control_create_concurrency'] = v
+
+    @property
+    def control_queue_size(self):
+        return self.get('control_queue_size')
+
+    @control_queue_size.setter
+    def control_queue_size(self, v):
+        self['control_queue_size'] = v
+
+    @property
+    def quotas(self):
+        return self.get('quotas')
+
+    @quotas.setter
+    def quotas(self, v):
+        self['quotas'] = v
+
+    @property
+    def restart_policy(self):
+        return self.get('restart_policy')
+
+    @restart_policy.setter
+    def restart_policy(self, v):
+        self['restart_policy'] = v
+
+    @property
+    def restart_backoff_sec(self):
+        return self.get('restart_backoff_sec')
+
+    @restart_backoff_sec.setter
+    def restart_backoff_sec(self, v):
+        self['restart_backoff_sec'] = v
+
+    @property
+    def restart_backoff_max_sec(self):
+        return self.get('restart_backoff_max_sec')
+
+    @restart_backoff_max_sec.setter
+    def restart_backoff_max_sec(self, v):
+        self['restart_backoff_max_sec'] = v
+
+    @property
+    def restart_max_failures(self):
+        return self.get('restart_max_failures')
+
+    @restart_max_failures.setter
+    def restart_max_failures(self, v):
+        self['restart_max_failures'] = v
+
+    @property
+    def restart_window_sec(self):
+        return self.get('restart_window_sec')
+
+    @restart_window_sec.setter
+    def restart_window_sec(self, v):
+        self['restart_window_sec'] = v
+
+    @property
+    def response_cache_size(self):
+        return self.get('response_cache_size')
+
+    @response_cache_size.setter
+    def response_cache_size(self, v):
+        self['response_cache_size'] = v
+
+    @property
+    def response_cache_ttl_sec(self):
+        return self.get('response_cache_ttl_sec')
+
+    @response_cache_ttl_sec.setter
+    def response_cache_ttl_sec(self, v):
+        self['response_cache_ttl_sec'] = v
+
+    @property
+    def inactivity_action(self):
+        return self.get('inactivity_action')
+
+    @inactivity_action.setter
+    def inactivity_action(self, v):
+        self['inactivity_action'] = v
+
+    @property
+    def shards(self):
+        return self.get('shards')
+
+    @shards.setter
+    def shards(self, v):
+        self['shards'] = v
+
+    @property
+    def identities(self):
+        return self.get('identities')
+
+    @identities.setter
+    def identities(self, v):
+        self['identities'] = v
+
+    @property
+    def host_pressure(self):
+        return self.get('host_pressure')
+
+    @host_pressure.setter
+    def host_pressure(self, v):
+        self['host_pressure'] = v
+
+    @property
+    def pressure_action(self):
+        return self.get('pressure_action')
+
+    @pressure_action.setter
+    def pressure_action(self, v):
+        self['pressure_action'] = v
+
+    @property
+    def profiles(self):
+        return self.get('profiles')
+
+    @profiles.setter
+    def profiles(self, v):
+        self['profiles'] = v
+
     @property
     def topics(self):
         return self.__topics
     
-    def _create_delete_runtime_msg(self, action) -> PubsubMessage:
+    def _create_delete_runtime_msg(self, action, pressure=None) -> PubsubMessage:
         """Create/Delete (according to action) runtime message.
         Parameters
         ----------
             action (RuntimeTypes.Action): message action (create=register/delete=unregister)
+            pressure (dict): host pressure sample to include, if given
         """
         # return a view of the object for a register/unregister request
         reg_req = dict(map(lambda k: (k, self.get(k)), self.__reg_attrs))
+        if pressure is not None: reg_req['pressure'] = pressure
         return self.__rt_msgs.req(self.__topics.runtimes, action, reg_req)
             
-    def create_runtime_msg(self) -> PubsubMessage:
-        return self._create_delete_runtime_msg(Action.create)
+    def create_runtime_msg(self, pressure=None) -> PubsubMessage:
+        return self._create_delete_runtime_msg(Action.create, pressure)
 
     def delete_runtime_msg(self) -> PubsubMessage:
         return self._create_delete_runtime_msg(Action.delete)
 
-    def keepalive_msg(self, children) -> PubsubMessage:
+    def confirm_msg(self, msg_to_confirm, result=Result.ok, details=None) -> PubsubMessage:
+        """Response to a request handled by the runtime itself (e.g. bulk requests); details default to the request data"""
+        if details is None: details = msg_to_confirm.get('data')
+        return self.__rt_msgs.resp(
+            self.__topics.runtimes,
+            msg_to_confirm.get('object_id'),
+            action=msg_to_confirm.get('action'),
+            details=details,
+            result=result)
+
+    def keepalive_msg(self, children, pressure=None, expected_load=None, hosts=None) -> PubsubMessage:
         keepalive = dict(map(lambda k: (k, self.get(k)), self.__ka_attrs))
-        # add children
+        # add host pressure (if sampled), load expected from the program profiles of the modules, usage of the 
+        # hosts modules are placed on (if several), and children
+        if pressure is not None: keepalive['pressure'] = pressure
+        if expected_load is not None: keepalive['expected_load'] = {k: round(v, 3) for k, v in expected_load.items()}
+        if hosts is not None: keepalive['hosts'] = hosts
         keepalive['children'] = children
         return self.__rt_msgs.req(self.__topics.keepalive, Action.update, keepalive)
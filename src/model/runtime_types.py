@@ -6,12 +6,61 @@ class Result():
     """Result ok/error enum."""
     ok = 'ok'
     err = 'error'
+    pending = 'pending'
+    busy = 'busy'
 
 class Action():
     """Action create/delete enum."""
     create = 'create'
     delete = 'delete'
     update = 'update'
+    bulk_create = 'bulk_create'
+    bulk_delete = 'bulk_delete'
+    prepare = 'prepare'
+    start = 'start'
+    resume = 'resume'
+    list = 'list' # modules of a runtime (answered from state and stats cached at the last keepalive)
+    status = 'status' # state and cached stats of a module
+    capacity = 'capacity' # capacity and load of a runtime
+
+class ModuleState():
+    """Module lifecycle state enum."""
+    pending = 'pending'
+    fetching = 'fetching'
+    starting = 'starting'
+    prepared = 'prepared'
+    running = 'running'
+    hibernated = 'hibernated' # idle; frozen (paused) until resumed
+    restarting = 'restarting' # exited on its own; waiting to be restarted
+    stopping = 'stopping'
+
+class SessionState():
+    """Runtime pubsub session state enum."""
+    init = 'init' # never connected
+    registering = 'registering'
+    ready = 'ready' # registered (or registration skipped); module requests are handled
+
+class InactivityAction():
+    """What to do with modules idle for longer than the inactivity timeout enum."""
+    delete = 'delete'
+    hibernate = 'hibernate' # freeze (pause) the module; it is resumed on stdin input or a resume request
+
+class PressureAction():
+    """What to do with creates while the host is under pressure enum."""
+    defer = 'defer' # queue them (as when the runtime is full) until the pressure drops
+    reject = 'reject' # turn them down with a busy response
+
+class RestartPolicy():
+    """Module restart policy enum; what to do when a module exits on its own."""
+    never = 'never'
+    on_failure = 'on-failure' # restart if it exited with an error (non-zero exit code)
+    always = 'always'
+
+class ControlPriority():
+    """Control message priority enum; lower values are handled first."""
+    reclaim = 0 # deletes; free capacity
+    control = 1 # other requests on existing modules (e.g. start)
+    work = 2 # creates; take capacity, shed first under overload
 
 class MessageType():
     """Message type enum."""
@@ -4,6 +4,7 @@ try:
     from .file_action import *
     from .filestore_builder import *
     from .program_files import *
+    from .program_files_cache import *
 except ImportError:
     # this might be relevant during the installation process
     pass
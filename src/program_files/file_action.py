@@ -100,6 +100,7 @@ class FileCopyAction(FileAction):
         return self._file
 
     def execute(self) -> FileInfo:
+        os.makedirs(os.path.dirname(self._file.path), exist_ok=True)
         shutil.copy2(self._file.source_path, self._file.path)
         # tmp files are delete after copy
         if self._file.tmp and os.path.exists(self._file.source_path):
@@ -34,15 +34,27 @@ class FileStoreBuilder(ProgramFilesBuilder):
         # new instance of program files
         self._files_info = ProgramFilesInfo(do_cleanup=do_cleanup)
 
+    def module_files_url(self, store_base_url: str, module: Module) -> str:
+        """Url of the folder with the module program files; modules with the same url run the same program files"""
+        if len(module.file) == 0: raise ProgramFileException("Error fetching module files; file cannot be empty")
+        if len(module.location) == 0: raise ProgramFileException("Error fetching module files; location cannot be empty")
+        path = Path(module.location).joinpath(module.file)
+        return urljoin(store_base_url, str(path.parent))
+
     def from_module_data(self, store_base_url: str, module: Module) -> None:
         """Get files from module data        
            NOTE: Creates the full url and calls from_url(); assumes directory index listing is enabled on the webserver
         """
-        if len(module.file) == 0: raise ProgramFileException("Error fetching module files; file cannot be empty")
-        if len(module.location) == 0: raise ProgramFileException("Error fetching module files; location cannot be empty")
-        path = Path(module.location).joinpath(module.file)
-        url = urljoin(store_base_url, str(path.parent))
-        self.from_url(url)
+        self.from_url(self.module_files_url(store_base_url, module))
+
+    def from_program_files(self, files_info: ProgramFilesInfo) -> None:
+        """
+            Add files previously fetched into another ProgramFilesInfo to files list; 
+            they will be copied in get_files (keeping their path relative to files_info.path)
+        """
+        for fi in files_info.files:
+            dfp = self._files_info.path.joinpath(Path(fi.path).relative_to(files_info.path))
+            self._files_info.add_file(Path(fi.path), dfp, FileCopyAction)
         
     def __from_url(self, url: str, base_path: str) -> int:
         """Internal get files from url to be called recursively
@@ -127,6 +139,14 @@ class FileStoreBuilder(ProgramFilesBuilder):
         # add file to be copied (copy action) and mark as tmp (so it is deleted after copy)
         self._files_info.add_file(Path(source_filepath), Path(dfp), FileCopyAction, False)
 
+    def discard(self) -> None:
+        """
+            Remove files fetched so far into the instance being built (e.g. a fetch failed
+            or was cancelled half way) and start a new ProgramFilesInfo instance
+        """
+        self._files_info.cleanup()
+        self.reset()
+
     def get_files(self, tar_files: bool=False) -> ProgramFilesInfo:
         """
             Get files; Execute file actions and optionally compress the files
@@ -1,7 +1,7 @@
 """
 Program files are collected (downloaded/copied/compressed/...) into a destination folder or tar file
 """
-from typing import Optional
+from typing import Dict, Optional
 import tempfile
 import os
 import shutil
@@ -72,6 +72,30 @@ class ProgramFilesInfo:
         # only perform cleanup if do_cleanup=True
         if not self._do_cleanup: return
         
+        self.cleanup()
+
+    def state(self) -> Dict:
+        """ Where the files are and if they are removed once this object is gone; from_state() rebuilds the object """
+        return {'base_path': str(self._base_path), 'do_cleanup': self._do_cleanup,
+                'tar_filepath': str(self._tar_filepath) if self._tar_filepath else None}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "ProgramFilesInfo":
+        """ Object for files fetched by another process (e.g. a previous runtime), given its state() """
+        files_info = cls.__new__(cls)
+        files_info._do_cleanup = state.get('do_cleanup', True)
+        files_info._base_path = Path(state['base_path'])
+        files_info._tar_filepath = Path(state['tar_filepath']) if state.get('tar_filepath') else None
+        files_info._file_actions = []
+        files_info._files = []
+        return files_info
+
+    def keep(self) -> None:
+        """ Keep files once this object is gone (e.g. still in use by a module left running) """
+        self._do_cleanup = False
+
+    def cleanup(self) -> None:
+        """ Remove files (including files of actions not executed yet) """
         # remove files
         for fa in self._file_actions:
             if os.path.exists(fa.file.path):
@@ -81,7 +105,7 @@ class ProgramFilesInfo:
                 os.remove(fa.file.source_path)
 
         # delete tar
-        if self._tar_filepath:
+        if self._tar_filepath and os.path.exists(self._tar_filepath):
             os.remove(self._tar_filepath)
 
         # delete entire folder just in case
@@ -23,6 +23,14 @@ class ProgramFilesBuilder(Protocol):
     def from_module_data(self, store_base_url, module):
         """Get files from module data in the form """
         
+    @abstractmethod
+    def module_files_url(self, store_base_url, module) -> str:
+        """Location of the module program files; identifies program files shared by modules """
+
+    @abstractmethod
+    def from_program_files(self, files_info):
+        """Add files previously fetched into another ProgramFilesInfo to files list; they will be copied in get_files """
+
     @abstractmethod
     def from_url(self, url):
         """Get files listed from 'from_url' """
@@ -47,6 +55,10 @@ class ProgramFilesBuilder(Protocol):
                                   MUST include the filename
         """
 
+    @abstractmethod
+    def discard(self):
+        """ Remove files fetched so far into the instance being built and start a new one """
+
     @abstractmethod
     def get_files(self, tar_files: bool=False):
         """ Get program files from repository """
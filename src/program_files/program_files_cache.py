@@ -0,0 +1,67 @@
+"""
+*TL;DR
+Share program files among modules running the same program;
+The first module asking for a program fetches its files, others wait and reuse them
+"""
+import threading
+from typing import Callable, Dict
+
+from .program_files import ProgramFilesInfo
+
+class CachedProgramFiles():
+    """Program files being fetched (or already fetched) for a program"""
+
+    def __init__(self) -> None:
+        self.ready = threading.Event()
+        self.files_info: ProgramFilesInfo = None
+        self.error: Exception = None
+
+class ProgramFilesCache():
+    """
+        Cache of fetched ProgramFilesInfo by program key (e.g. the url where the program files are)
+        Files are removed when the cache (and the ProgramFilesInfo instances in it) are released
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__entries: Dict[str, CachedProgramFiles] = {}
+
+    def get(self, key: str, fetch: Callable[[], ProgramFilesInfo]) -> ProgramFilesInfo:
+        """
+            Return the program files for key; calls fetch if no one fetched them yet,
+            otherwise waits for the fetch in progress
+
+            Arguments
+            ---------
+                key:
+                    identifies the program files
+                fetch:
+                    callable returning a ProgramFilesInfo with the files already fetched
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = CachedProgramFiles()
+                self.__entries[key] = entry
+
+        if owner:
+            try:
+                entry.files_info = fetch()
+            except Exception as err:
+                entry.error = err
+                # let a later request retry the fetch
+                with self.__lock:
+                    self.__entries.pop(key, None)
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+
+        if entry.error:
+            raise entry.error
+        return entry.files_info
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
@@ -4,7 +4,9 @@ try:
     from .listner import *
     from .pubsub import *
     from .pubsub_msg import *
+    from .error_reporter import *
     from .pubsub_streamer import *
+    from .socket_listner import *
 except ImportError:
     # this might be relevant during the installation process
     pass
@@ -0,0 +1,115 @@
+"""
+*TL;DR
+Error messages of bad input (invalid topics, invalid json, requests failing) published aggregated by kind;
+a misbehaving client makes the runtime publish a few errors and a summary per window, not one error per message
+"""
+import json
+import threading
+import time
+from typing import Callable, Dict
+
+from logzero import logger
+
+from pubsub.pubsub_msg import PubsubMessage
+
+class _ErrorKind():
+    """Errors of one kind in the current window"""
+
+    __slots__ = ('started_at', 'count', 'published', 'seen', 'last_data', 'timer')
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.count = 0 # errors in the window
+        self.published = 0 # errors published as they happened
+        self.seen = set() # data of the errors published (identical errors are published once per window)
+        self.last_data = None
+        self.timer: threading.Timer = None
+
+    @property
+    def suppressed(self) -> int:
+        return self.count - self.published
+
+class ErrorReporter():
+    """
+        Publishes error messages, aggregated by kind (their desc); in each window, the first errors of a kind are published
+        as they happen (identical ones once), the others are counted and published as one summary at the end of the window:
+        {"desc", "data" (of the last error), "count" (errors in the window), "suppressed", "window_sec"}
+
+        Arguments
+        ---------
+            publish:
+                publishes a message
+            error_topic:
+                topic where errors are sent
+            window_sec:
+                errors of a kind are counted over windows of window_sec
+            max_per_window:
+                errors of a kind published as they happen in a window; 0 = every error is published
+    """
+
+    _MAX_SEEN = 100 # distinct errors remembered per kind and window
+
+    def __init__(self, publish: Callable[[PubsubMessage], None], error_topic: str, window_sec: float=10, max_per_window: int=5, **kwargs) -> None:
+        self.__publish = publish
+        self.__error_topic = error_topic
+        self.__window_sec = window_sec
+        self.__max_per_window = max_per_window
+        self.__kinds: Dict[str, _ErrorKind] = {}
+        self.__lock = threading.Lock()
+        self.__closed = False
+
+    def report(self, payload: Dict) -> bool:
+        """Report an error ({"desc", "data"}); returns True if it was published now (False if it counts toward a summary)"""
+        if not self.__max_per_window:
+            self.__publish(PubsubMessage(self.__error_topic, payload))
+            return True
+
+        kind_key = str(payload.get('desc'))
+        data = payload.get('data')
+        data_key = json.dumps(data, sort_keys=True, default=str)
+        with self.__lock:
+            kind = self.__kinds.get(kind_key)
+            if kind is None or time.monotonic() - kind.started_at >= self.__window_sec:
+                # window over (its summary, if any, is published by its timer)
+                kind = self.__kinds[kind_key] = _ErrorKind()
+            kind.count += 1
+            kind.last_data = data
+            publish = kind.published < self.__max_per_window and data_key not in kind.seen
+            if publish:
+                kind.published += 1
+                if len(kind.seen) < ErrorReporter._MAX_SEEN: kind.seen.add(data_key)
+            elif kind.timer is None and not self.__closed:
+                # first error held back in the window; summarize at its end
+                kind.timer = threading.Timer(max(0, kind.started_at + self.__window_sec - time.monotonic()), self.__end_window, (kind_key, kind))
+                kind.timer.daemon = True
+                kind.timer.start()
+
+        if publish: self.__publish(PubsubMessage(self.__error_topic, payload))
+        else: logger.debug(f"Error not published (aggregated): {payload}")
+        return publish
+
+    def __end_window(self, kind_key: str, kind: _ErrorKind) -> None:
+        """Publish the summary of the window of a kind (if errors were held back)"""
+        with self.__lock:
+            if self.__kinds.get(kind_key) is kind: self.__kinds.pop(kind_key)
+            kind.timer = None
+            if not kind.suppressed: return
+            summary = {"desc": kind_key, "data": kind.last_data, "count": kind.count,
+                       "suppressed": kind.suppressed, "window_sec": self.__window_sec}
+            kind.published = kind.count # summarized once
+        logger.warning(f"{summary['suppressed']} errors '{kind_key}' aggregated in the last {self.__window_sec}s.")
+        self.__publish(PubsubMessage(self.__error_topic, summary))
+
+    def flush(self) -> None:
+        """End all windows now, publishing their summaries"""
+        with self.__lock:
+            kinds = list(self.__kinds.items())
+        for kind_key, kind in kinds:
+            if kind.timer is not None: kind.timer.cancel()
+            self.__end_window(kind_key, kind)
+
+    def close(self) -> None:
+        """Publish the pending summaries; no more timers are started"""
+        with self.__lock:
+            self.__closed = True
+        self.flush()
@@ -3,7 +3,10 @@
 from subprocess import call
 import traceback
 import json
+import time
+import threading
 import ssl as ssl_lib
+from collections import OrderedDict
 from json.decoder import JSONDecodeError
 from typing import Dict, Tuple, Any, Callable
 import uuid
@@ -12,6 +15,7 @@ from logzero import logger
 
 from common import RuntimeException
 
+from pubsub.error_reporter import ErrorReporter
 from pubsub.pubsub_msg import PubsubMessage
 from pubsub.pubsub import PubsubListner, PubsubHandler
 
@@ -35,10 +39,20 @@ class MQTTListner(paho.Client, PubsubListner):
     ssl: bool
         MQTT ssl connection
     cid : str
-        Client ID for paho MQTT client.
+        Client ID for paho MQTT client; a new uuid if not given.
+    clean_session: bool
+        False asks the broker for a persistent session (subscriptions survive reconnects);
+        subscriptions are renewed on reconnect if the session was not resumed
+    errors: dict
+        error aggregation (ErrorReporter window_sec, max_per_window); errors of bad input are 
+        published aggregated by kind instead of one per message
     """
 
     __subscribe_mid: Dict[int, str]
+    __topics: Dict[str, bool] # topics subscribed (renewed on reconnect)
+    __unacked: Dict[int, paho.MQTTMessageInfo]
+
+    _ACKED_MIDS_KEPT = 256 # acknowledgements kept for messages not recorded yet
     
     def __init__(self,
                 pubsub_handler: PubsubHandler,
@@ -48,12 +62,19 @@ class MQTTListner(paho.Client, PubsubListner):
                 username: str = None,
                 password: str = None,
                 ssl: bool= False,
-                cid: str= str(uuid.uuid4())) -> None:
+                cid: str= None,
+                clean_session: bool= False,
+                errors: Dict= None) -> None:
 
-        super().__init__(paho.CallbackAPIVersion.VERSION2)
+        super().__init__(paho.CallbackAPIVersion.VERSION2, client_id=cid or str(uuid.uuid4()), clean_session=clean_session)
 
         self._error_topic = error_topic
+        self.__errors = ErrorReporter(self.message_publish, error_topic, **(errors or {}))
         self.__subscribe_mid = {}
+        self.__topics = {}
+        self.__unacked = {} # QoS > 0 messages published and not acknowledged yet, by mid
+        self.__acked = OrderedDict() # mids acknowledged before message_publish recorded them (most recent)
+        self.__unacked_lock = threading.Lock() # never held calling into paho (paho calls on_publish holding its own locks)
 
         logger.debug("Starting MQTT client...")
 
@@ -70,30 +91,47 @@ class MQTTListner(paho.Client, PubsubListner):
 
         self.loop_start()
         
-    def __pubsub_handler_call(self, handler_call: Callable, args):
+    def __pubsub_handler_call(self, handler_call: Callable, *args):
         if not self.__pubsub_handler:
             logger.info(f"Call to {getattr(callable, '__name__', repr(callable))} skipped: no pubsub handler provided.")
             
         # check if method is bound
         if hasattr(handler_call, '__self__'):
-            return handler_call(args)
+            return handler_call(*args)
         else:
-            return handler_call(self.__pubsub_handler, args)
+            return handler_call(self.__pubsub_handler, *args)
     
     def on_connect(self, mqttc, userctx, flags, rc, properties) -> None:
-        """Client connect callback."""
+        """Client connect callback; renews subscriptions if the broker did not resume our session."""
         if rc == 0:
-            logger.debug("Connected.")
-            self.__pubsub_handler_call(handler_call=self.__pubsub_handler.pubsub_connected, args=(mqttc))
+            session_present = bool(getattr(flags, 'session_present', False))
+            if session_present:
+                logger.debug("Connected; session resumed.")
+            else:
+                logger.debug("Connected.")
+                self.__resubscribe()
+            self.__pubsub_handler_call(self.__pubsub_handler.pubsub_connected, mqttc, session_present)
         else:
             logger.error(f"Bad connection returned code={rc}")
 
+    def on_disconnect(self, mqttc, userctx, flags, rc, properties) -> None:
+        """Client disconnect callback; paho keeps trying to reconnect."""
+        logger.warning(f"Disconnected (code={rc}).")
+        self.__pubsub_handler_call(self.__pubsub_handler.pubsub_disconnected)
+
+    def __resubscribe(self) -> None:
+        """Subscribe again to the topics we had subscribed (message callbacks are kept by the client)"""
+        for topic in list(self.__topics):
+            (result, mid) = self.subscribe(topic)
+            if result == paho.MQTT_ERR_SUCCESS:
+                self.__subscribe_mid[mid] = topic
+
     def on_message(self, mqttc, userctx, msg) -> None:
         """MQTT Message handler.
            All runtime messages are handled with callbacks on specific topics
         """
 
-        self.message_publish(PubsubMessage(self._error_topic, {"desc": "Invalid topic", "data": msg.topic}))
+        self.__errors.report({"desc": "Invalid topic", "data": msg.topic})
         
     def on_subscribe(self, mqttc, obj, mid, reason_codes, properties) -> None:
         """Subscribe callback."""
@@ -103,12 +141,20 @@ class MQTTListner(paho.Client, PubsubListner):
             if sub_result >= 128:
                 logger.error(f"MQTT Error: Error subscribing - {sub_result}")
 
+    def on_publish(self, mqttc, userctx, mid, reason_code, properties) -> None:
+        """Publish callback; message sent (QoS 0) or acknowledged by the broker (QoS > 0)."""
+        with self.__unacked_lock:
+            if self.__unacked.pop(mid, None) is not None: return
+            # acknowledged before message_publish recorded it (or QoS 0)
+            self.__acked[mid] = None
+            if len(self.__acked) > MQTTListner._ACKED_MIDS_KEPT: self.__acked.popitem(last=False)
+
     def on_log(self, mqttc, obj, level, string) -> None:
         """Logging callback."""
 
         if level == paho.MQTT_LOG_ER:
             logger.error(f"MQTT Error: {string}")
-            self.__pubsub_handler_call(handler_call=self.__pubsub_handler.pubsub_error, args=("MQTT Error", string))
+            self.__pubsub_handler_call(self.__pubsub_handler.pubsub_error, "MQTT Error", string)
 
             return
         if level == paho.MQTT_LOG_WARNING:
@@ -126,7 +172,7 @@ class MQTTListner(paho.Client, PubsubListner):
         payload = json.dumps(lastwill_msg.payload)
         logger.debug(f"Setting last will \
                             {str(lastwill_msg.topic)}: {payload}")
-        self.will_set(lastwill_msg.topic, payload)
+        self.will_set(lastwill_msg.topic, payload, qos=lastwill_msg.qos)
 
     def message_handler_add(self,
                                 topic: str,
@@ -144,6 +190,7 @@ class MQTTListner(paho.Client, PubsubListner):
         (result, mid) = self.subscribe(topic)
         if result == paho.MQTT_ERR_SUCCESS:
              self.__subscribe_mid[mid] = topic
+        self.__topics[topic] = True
 
         callbk = lambda mqttc, userctx, msg: self.on_message_callback(msg, decode_json, handler)
         self.message_callback_add(topic, callbk)
@@ -153,6 +200,7 @@ class MQTTListner(paho.Client, PubsubListner):
             topic:
                 the topic to subscribe
         """
+        self.__topics.pop(topic, None)
         for mid in self.__subscribe_mid:
             if self.__subscribe_mid[mid] == topic:
                 subs_topic = self.__subscribe_mid.pop(mid, None)
@@ -160,15 +208,51 @@ class MQTTListner(paho.Client, PubsubListner):
                 self.message_callback_remove(subs_topic)
                 break
 
+    def disconnect(self, *args, **kwargs):
+        """Publish the pending error summaries, then disconnect"""
+        self.__errors.close()
+        return super().disconnect(*args, **kwargs)
+
     def message_publish(self, pubsub_msg: PubsubMessage) -> None:
         """Publish a message; Called by PubsubHandler
             pubsub_msg : PubsubMessage
-                message (topic, payload) to publish
+                message (topic, payload, qos) to publish
         """
 
         payload = json.dumps(pubsub_msg.payload)
         logger.debug(f"Publish msg: {pubsub_msg.topic}: {payload}")
-        self.publish(pubsub_msg.topic, payload)
+        msg_info = self.publish(pubsub_msg.topic, payload, qos=pubsub_msg.qos)
+        # QoS 0 messages are never acknowledged; only QoS > 0 messages are waited for (flush)
+        if pubsub_msg.qos == 0: return
+        with self.__unacked_lock:
+            if msg_info.mid in self.__acked:
+                # acknowledged already (on_publish ran before we got here)
+                del self.__acked[msg_info.mid]
+                return
+            if not msg_info.is_published(): self.__unacked[msg_info.mid] = msg_info
+
+    def flush(self, timeout_sec: float) -> bool:
+        """Wait until the QoS > 0 messages published so far are acknowledged (QoS 0 messages are not waited for);
+           returns False if some messages were not acknowledged within timeout_sec
+        """
+        deadline = time.time() + timeout_sec
+        with self.__unacked_lock:
+            pending = list(self.__unacked.values())
+
+        for msg_info in pending:
+            remaining = deadline - time.time()
+            if remaining <= 0: break
+            try:
+                msg_info.wait_for_publish(remaining)
+            except (ValueError, RuntimeError) as err:
+                # message was not queued (e.g. queue full or not connected); it will never be acknowledged
+                logger.warning(f"Message {msg_info.mid} not published: {err}")
+                with self.__unacked_lock:
+                    self.__unacked.pop(msg_info.mid, None)
+
+        unacked = [msg_info.mid for msg_info in pending if not msg_info.is_published()]
+        if unacked: logger.warning(f"{len(unacked)} messages not acknowledged in {timeout_sec}s.")
+        return len(unacked) == 0
 
     def __decode_msg(self, msg, decode_json: bool) -> PubsubMessage:
         """Attempt to decode JSON MQTT message."""
@@ -186,7 +270,11 @@ class MQTTListner(paho.Client, PubsubListner):
         """Callback message handler. 
            Perform message decoding and deliver it to handler
         """        
-        res = self.__on_message_callback(msg, decode_json, handler)
+        try:
+            res = self.__on_message_callback(msg, decode_json, handler)
+        except RuntimeException as rte:
+            self.__errors.report(rte.error_msg_payload())
+            return
 
         # only publish if not `None`
         if res != None:
@@ -197,23 +285,23 @@ class MQTTListner(paho.Client, PubsubListner):
 
         Handlers take a (topic, data) ```Message``` as input, and return either
         a ```Message``` to send in response, ```None``` for no response, or
-        raise an ```RuntimeException``` which should be given as a response.
+        raise an ```RuntimeException``` which is reported as an error (aggregated).
         """        
         try:
             decoded_mqtt_msg = self.__decode_msg(msg, decode_json)
         except JSONDecodeError:
-            return PubsubMessage(self._error_topic,
-                {"desc": "Invalid JSON", "data": msg.payload.decode('utf-8')})
+            self.__errors.report({"desc": "Invalid JSON", "data": msg.payload.decode('utf-8', 'ignore')})
+            return None
 
         try:
-            return self.__pubsub_handler_call(handler, args = (decoded_mqtt_msg))
-        except RuntimeException as rte:
-            return PubsubMessage(self._error_topic, rte.error_msg_payload())
+            return self.__pubsub_handler_call(handler, decoded_mqtt_msg)
+        except RuntimeException:
+            raise # reported (aggregated) by on_message_callback
             
         # Uncaught exceptions should only be due to programmer error.
         except Exception as e:
             logger.warning(traceback.format_exc())
             logger.warning(f"Input message: {str(decoded_mqtt_msg.payload)}")
-            return PubsubMessage(self._error_topic, 
-                {"desc": "Uncaught exception", "data": str(e)})
+            self.__errors.report({"desc": "Uncaught exception", "data": str(e)})
+            return None
 
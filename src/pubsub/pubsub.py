@@ -53,17 +53,33 @@ class PubsubListner(Protocol):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def flush(self, timeout_sec: float) -> bool:
+        """Wait until the messages published so far are acknowledged
+            timeout_sec:
+                max time to wait
+            Returns False if some messages were not acknowledged in time
+        """
+        raise NotImplementedError
+
 class PubsubHandler(Protocol):
     """Calls the mqtt listner performs on the PubsubHandler to deliver notifications"""
 
     @abstractmethod
-    def pubsub_connected(self, client: PubsubListner):
-        """When mqtt listner connects
+    def pubsub_connected(self, client: PubsubListner, session_present: bool=False):
+        """When mqtt listner connects (or reconnects)
             client:
                 mqtt listner instance if handler wants to save it
+            session_present:
+                the broker resumed a previous session (subscriptions survived)
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def pubsub_disconnected(self):
+        """When mqtt listner loses the connection; the listner keeps trying to reconnect"""
+        raise NotImplementedError
+
     @abstractmethod
     def pubsub_error(self, desc: str, data: str):
         """When an error notification is received from the mqtt library
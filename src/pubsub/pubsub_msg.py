@@ -4,11 +4,12 @@ from typing import Dict
 from common import MissingField
 
 class PubsubMessage(dict):
-    """Pubsub Message container."""
+    """Pubsub Message container; qos is the mqtt QoS it is published with (1: acknowledged by the broker)"""
 
-    def __init__(self, topic: str, payload: Dict):
+    def __init__(self, topic: str, payload: Dict, qos: int=0):
         self.topic = topic
         self.payload = payload
+        self.qos = qos
 
     def get(self, *args):
         """Get attribute, or raise appropriate error.
@@ -6,7 +6,7 @@ Get a stream from a socket in/out of pubsub
 import threading
 import socket
 import os
-from typing import Dict
+from typing import Callable, Dict
 from enum import Enum
 from logzero import logger
 
@@ -48,8 +48,10 @@ class PubsubStreamer:
                  sock: socket.SocketIO, 
                  topics: Dict = { Streams.stdin: 'in_topic', Streams.stdout: 'out_topic', Streams.stderr: 'err_topic'}, 
                  multiplexed: bool = True,
-                 encode_decode: bool = True) -> None:
+                 encode_decode: bool = True,
+                 input_notify: Callable[[], None] = None) -> None:
         self._sock = sock
+        self._input_notify = input_notify
         self._pubsub_client = pubsubl
         self._topics = topics
         self._multiplexed = multiplexed
@@ -99,6 +101,7 @@ class PubsubStreamer:
             
     def input(self, msg: PubsubMessage) -> None:
         """ Receive input msgs from mqtt, output to socket """
+        if self._input_notify: self._input_notify()
         data = f"{msg.payload}\n"
         if self._encode_decode:
             os.write(self._sock.fileno(), data.encode('utf-8'))
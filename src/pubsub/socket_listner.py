@@ -0,0 +1,274 @@
+"""
+*TL;DR
+Local control socket; a unix domain socket co-located orchestrators (and tests) send requests on
+instead of going through the mqtt broker. It sits between the mqtt client and the runtime: the runtime
+subscribes and publishes through it as usual (subscriptions and publishes also go to mqtt), and
+messages received on the socket are handled by the same topic handlers
+
+Frames are a 4-byte (big-endian) length followed by a utf-8 json object:
+    {"topic": ..., "payload": {...}}   message; delivered to the handlers subscribed to the topic
+    {"subscribe": topic}               the connection gets messages the runtime publishes on topic (mqtt wildcards allowed)
+    {"unsubscribe": topic}
+Responses of the handlers are sent back on the connection that sent the request (and published as usual; errors
+are published aggregated, see ErrorReporter)
+"""
+import json
+import os
+import socket
+import struct
+import threading
+import traceback
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import paho.mqtt.client as paho
+from logzero import logger
+
+from common import RuntimeException
+
+from pubsub.error_reporter import ErrorReporter
+from pubsub.pubsub_msg import PubsubMessage
+from pubsub.pubsub import PubsubListner, PubsubHandler
+
+_HEADER = struct.Struct('!I')
+
+class _Connection():
+    """A client connected to the control socket and the topics it subscribed"""
+
+    def __init__(self, sock: socket.socket, cid: int) -> None:
+        self.sock = sock
+        self.cid = cid
+        self.topics: Set[str] = set()
+        self.__lock = threading.Lock()
+
+    def send(self, pubsub_msg: PubsubMessage) -> bool:
+        """Send a message frame; False if the connection is gone"""
+        frame = json.dumps({'topic': pubsub_msg.topic, 'payload': pubsub_msg.payload}).encode('utf-8')
+        try:
+            with self.__lock:
+                self.sock.sendall(_HEADER.pack(len(frame)) + frame)
+            return True
+        except OSError:
+            return False
+
+    def subscribed(self, topic: str) -> bool:
+        return any(paho.topic_matches_sub(sub, topic) for sub in list(self.topics))
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class SocketListner(PubsubListner, PubsubHandler):
+    """
+        Control socket; pubsub listner of the runtime (or runtime group) and pubsub handler of the mqtt client
+
+        Arguments
+        ---------
+            pubsub_handler:
+                runtime (or runtime group) handling the messages
+            path:
+                unix socket path (a stale socket file is replaced)
+            error_topic:
+                topic where errors handling messages are sent
+            mode:
+                socket file permissions (octal string or int); who can control the runtime
+            max_frame_bytes:
+                largest frame accepted; a connection sending a larger one is closed
+            errors:
+                error aggregation (ErrorReporter window_sec, max_per_window) of the errors published on mqtt
+    """
+
+    def __init__(self,
+                pubsub_handler: PubsubHandler,
+                path: str,
+                error_topic: str = 'error_topic',
+                mode = '660',
+                max_frame_bytes: int = 1048576,
+                errors: Dict = None,
+                **kwargs) -> None:
+        self.__pubsub_handler = pubsub_handler
+        self.__path = path
+        self._error_topic = error_topic
+        self.__max_frame_bytes = max_frame_bytes
+        self.__upstream: PubsubListner = None
+        self.__errors = ErrorReporter(self.__publish_upstream, error_topic, **(errors or {}))
+        self.__handlers: Dict[str, Tuple[Callable[[PubsubMessage], None], bool]] = {} # by topic subscribed
+        self.__connections: Dict[int, _Connection] = {}
+        self.__next_cid = 0
+        self.__lock = threading.Lock()
+        self.__closed = False
+
+        if os.path.exists(path): os.unlink(path)
+        self.__sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__sock.bind(path)
+        os.chmod(path, int(mode, 8) if isinstance(mode, str) else mode)
+        self.__sock.listen()
+        logger.info(f"Listening for control messages on {path}.")
+
+        threading.Thread(target=self.__accept, name='control-socket', daemon=True).start()
+
+    # --- pubsub handler of the mqtt client: relay notifications to the runtime, with ourselfs as its client
+
+    def pubsub_connected(self, client: PubsubListner, session_present: bool=False):
+        self.__upstream = client
+        self.__pubsub_handler.pubsub_connected(self, session_present)
+
+    def pubsub_disconnected(self):
+        self.__pubsub_handler.pubsub_disconnected()
+
+    def pubsub_error(self, desc: str, data: str):
+        self.__pubsub_handler.pubsub_error(desc, data)
+
+    def wait_init(self, timeout_secs=15) -> None:
+        self.__pubsub_handler.wait_init(timeout_secs)
+
+    # --- pubsub listner of the runtime
+
+    def last_will_set(self, lastwill_msg: PubsubMessage) -> None:
+        self.__upstream.last_will_set(lastwill_msg)
+
+    def message_handler_add(self, topic: str, handler: Callable[[PubsubMessage], None], decode_json: bool=True) -> None:
+        with self.__lock:
+            self.__handlers[topic] = (handler, decode_json)
+        self.__upstream.message_handler_add(topic, handler, decode_json)
+
+    def message_handler_remove(self, topic: str) -> None:
+        with self.__lock:
+            self.__handlers.pop(topic, None)
+        self.__upstream.message_handler_remove(topic)
+
+    def message_publish(self, pubsub_msg: PubsubMessage) -> None:
+        """Publish a message on mqtt and to the connections subscribed to its topic"""
+        self.__upstream.message_publish(pubsub_msg)
+        self.__publish_local(pubsub_msg)
+
+    def flush(self, timeout_sec: float) -> bool:
+        """Messages are written to the socket connections as they are published; wait for mqtt only"""
+        return self.__upstream.flush(timeout_sec)
+
+    def disconnect(self) -> None:
+        self.close()
+        if self.__upstream is not None: self.__upstream.disconnect()
+
+    def close(self) -> None:
+        """Stop listening and close the connections"""
+        with self.__lock:
+            if self.__closed: return
+            self.__closed = True
+            connections = list(self.__connections.values())
+            self.__connections.clear()
+        self.__errors.close()
+        self.__sock.close()
+        for conn in connections: conn.close()
+        try:
+            os.unlink(self.__path)
+        except OSError:
+            pass
+
+    # --- socket
+
+    def __accept(self) -> None:
+        """Accept connections; each is read by its own thread"""
+        while True:
+            try:
+                sock, _ = self.__sock.accept()
+            except OSError:
+                return # closed
+            with self.__lock:
+                if self.__closed:
+                    sock.close()
+                    return
+                self.__next_cid += 1
+                conn = self.__connections[self.__next_cid] = _Connection(sock, self.__next_cid)
+            logger.debug(f"Control socket connection {conn.cid} opened.")
+            threading.Thread(target=self.__read, args=(conn,), name=f"control-socket-{conn.cid}", daemon=True).start()
+
+    def __read_exact(self, conn: _Connection, nbytes: int) -> Optional[bytes]:
+        """Read nbytes from the connection; None if it was closed"""
+        data = b''
+        while len(data) < nbytes:
+            chunk = conn.sock.recv(nbytes - len(data))
+            if not chunk: return None
+            data += chunk
+        return data
+
+    def __read(self, conn: _Connection) -> None:
+        """Read frames of a connection until it is closed"""
+        try:
+            while True:
+                header = self.__read_exact(conn, _HEADER.size)
+                if header is None: break
+                (length,) = _HEADER.unpack(header)
+                if length > self.__max_frame_bytes:
+                    conn.send(PubsubMessage(self._error_topic, {"desc": "Frame too large", "data": length}))
+                    break
+                frame = self.__read_exact(conn, length)
+                if frame is None: break
+                self.__on_frame(conn, frame)
+        except OSError as err:
+            logger.debug(f"Control socket connection {conn.cid} error: {err}")
+        with self.__lock:
+            self.__connections.pop(conn.cid, None)
+        conn.close()
+        logger.debug(f"Control socket connection {conn.cid} closed.")
+
+    def __on_frame(self, conn: _Connection, frame: bytes) -> None:
+        try:
+            obj = json.loads(frame.decode('utf-8', 'ignore'))
+        except ValueError:
+            conn.send(PubsubMessage(self._error_topic, {"desc": "Invalid JSON", "data": frame.decode('utf-8', 'ignore')}))
+            return
+        if not isinstance(obj, dict) or not (obj.get('topic') or obj.get('subscribe') or obj.get('unsubscribe')):
+            conn.send(PubsubMessage(self._error_topic, {"desc": "Invalid frame", "data": obj}))
+            return
+
+        if obj.get('subscribe'):
+            conn.topics.add(obj['subscribe'])
+        elif obj.get('unsubscribe'):
+            conn.topics.discard(obj['unsubscribe'])
+        else:
+            self.__deliver(conn, obj['topic'], obj.get('payload'))
+
+    def __deliver(self, conn: _Connection, topic: str, payload) -> None:
+        """Message received on the socket; handled like one received on mqtt, and the responses sent back to conn"""
+        with self.__lock:
+            handlers = [handler for sub, handler in self.__handlers.items() if paho.topic_matches_sub(sub, topic)]
+        if not handlers:
+            conn.send(PubsubMessage(self._error_topic, {"desc": "Invalid topic", "data": topic}))
+            return
+
+        for handler, decode_json in handlers:
+            if not decode_json and not isinstance(payload, str): msg_payload = json.dumps(payload)
+            else: msg_payload = payload
+            try:
+                resp = handler(PubsubMessage(topic, msg_payload))
+            except RuntimeException as rte:
+                self.__error(conn, rte.error_msg_payload())
+                continue
+            # Uncaught exceptions should only be due to programmer error.
+            except Exception as e:
+                logger.warning(traceback.format_exc())
+                logger.warning(f"Input message: {str(msg_payload)}")
+                self.__error(conn, {"desc": "Uncaught exception", "data": str(e)})
+                continue
+            if resp is None: continue
+            conn.send(resp)
+            self.__publish_upstream(resp)
+            self.__publish_local(resp, skip=conn)
+
+    def __error(self, conn: _Connection, payload: Dict) -> None:
+        """Error handling a message of conn; always sent back on conn, published on mqtt aggregated"""
+        conn.send(PubsubMessage(self._error_topic, payload))
+        self.__errors.report(payload)
+
+    def __publish_upstream(self, pubsub_msg: PubsubMessage) -> None:
+        if self.__upstream is not None: self.__upstream.message_publish(pubsub_msg)
+
+    def __publish_local(self, pubsub_msg: PubsubMessage, skip: _Connection=None) -> None:
+        """Send a message to the connections subscribed to its topic"""
+        with self.__lock:
+            connections = [conn for conn in self.__connections.values() if conn is not skip and conn.topics]
+        for conn in connections:
+            if conn.subscribed(pubsub_msg.topic): conn.send(pubsub_msg)
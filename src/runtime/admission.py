@@ -0,0 +1,141 @@
+"""
+*TL;DR
+Admission control for module creates; Admits creates up to a hard capacity (max_nmodules),
+keeps a bounded queue of creates waiting for a free slot and drops creates that waited
+in the queue past their deadline; admission can be held (e.g. while the host is under pressure)
+"""
+import time
+import threading
+from collections import deque
+from typing import Any, List, Tuple
+
+class Admission():
+    """Admission decision enum."""
+    admitted = 'admitted'
+    queued = 'queued'
+    rejected = 'rejected'
+
+class QueuedCreate():
+    """A create waiting in the admission queue"""
+
+    def __init__(self, key: str, item: Any) -> None:
+        self.key = key
+        self.item = item
+        self.queued_at = time.time()
+
+class AdmissionQueue():
+    """
+        Keep track of admitted creates (in-flight or running modules) and creates waiting for a slot
+
+        Arguments
+        ---------
+            capacity:
+                max number of admitted modules (in-flight or running)
+            queue_size:
+                max number of creates waiting for a free slot; creates beyond this are rejected
+            queue_timeout_sec:
+                max time a create can wait in the queue; 0 = no deadline
+            retry_after_sec:
+                minimum retry-after hint given to rejected creates
+    """
+
+    # weight of the last sample in the queue wait time moving average
+    _EWMA_ALPHA = 0.2
+
+    def __init__(self, capacity: int, queue_size: int=0, queue_timeout_sec: float=0, retry_after_sec: float=1) -> None:
+        self.__capacity = capacity
+        self.__queue_size = queue_size
+        self.__queue_timeout_sec = queue_timeout_sec
+        self.__retry_after_sec = retry_after_sec
+        self.__lock = threading.Lock()
+        self.__active = 0
+        self.__queue: deque = deque()
+        self.__avg_wait_sec = 0.0
+        self.__held = False
+
+    def offer(self, key: str, item: Any) -> str:
+        """Request admission for a create; returns an Admission decision"""
+        with self.__lock:
+            if self.__active < self.__capacity and not self.__queue and not self.__held:
+                self.__active += 1
+                return Admission.admitted
+            if len(self.__queue) >= self.__queue_size:
+                return Admission.rejected
+            self.__queue.append(QueuedCreate(key, item))
+            return Admission.queued
+
+    def acquire(self) -> None:
+        """Take a slot regardless of capacity (for modules already running, e.g. adopted)"""
+        with self.__lock:
+            self.__active += 1
+
+    def release(self) -> Tuple[List[Any], List[Any]]:
+        """A slot was freed; returns a tuple with (items admitted from the queue, expired items)"""
+        with self.__lock:
+            self.__active = max(0, self.__active - 1)
+            return self.__drain()
+
+    def expire(self) -> Tuple[List[Any], List[Any]]:
+        """Drop creates past their deadline; returns a tuple with (items admitted from the queue, expired items)"""
+        with self.__lock:
+            return self.__drain()
+
+    def hold(self, held: bool) -> Tuple[List[Any], List[Any]]:
+        """Hold admission (creates are queued even with free slots) or let it go again; returns a tuple with 
+           (items admitted from the queue, expired items)"""
+        with self.__lock:
+            self.__held = held
+            return self.__drain()
+
+    def remove(self, key: str) -> Any:
+        """Remove a create from the queue; returns the item removed or None"""
+        with self.__lock:
+            for entry in self.__queue:
+                if entry.key == key:
+                    self.__queue.remove(entry)
+                    return entry.item
+        return None
+
+    def __drain(self) -> Tuple[List[Any], List[Any]]:
+        """Admit queued creates while there are free slots; called with lock held"""
+        now = time.time()
+        admitted = []
+        expired = []
+        while self.__queue:
+            entry = self.__queue[0]
+            waited = now - entry.queued_at
+            if self.__queue_timeout_sec and waited > self.__queue_timeout_sec:
+                expired.append(self.__queue.popleft().item)
+                continue
+            if self.__active >= self.__capacity or self.__held:
+                break
+            self.__queue.popleft()
+            self.__active += 1
+            self.__avg_wait_sec += AdmissionQueue._EWMA_ALPHA * (waited - self.__avg_wait_sec)
+            admitted.append(entry.item)
+        return admitted, expired
+
+    def retry_after(self) -> int:
+        """Retry-after hint (seconds) for rejected creates, from how long admitted creates waited in the queue"""
+        with self.__lock:
+            return int(max(self.__retry_after_sec, round(self.__avg_wait_sec)))
+
+    def __contains__(self, key: str) -> bool:
+        with self.__lock:
+            return any(entry.key == key for entry in self.__queue)
+
+    @property
+    def active(self) -> int:
+        return self.__active
+
+    @property
+    def held(self) -> bool:
+        return self.__held
+
+    @property
+    def queued(self) -> int:
+        return len(self.__queue)
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
@@ -0,0 +1,71 @@
+"""
+*TL;DR
+Collect the per-module results of a bulk request into one aggregated confirm
+"""
+import threading
+from typing import Callable, List
+
+from model import Result
+from pubsub import PubsubMessage
+
+class BatchRequest():
+    """
+        Per-module results of a bulk request; calls on_complete with all the results
+        once every module result is final and the batch is sealed
+
+        Arguments
+        ---------
+            expected:
+                number of module results expected
+            on_complete:
+                callable receiving the list of module results
+    """
+
+    def __init__(self, expected: int, on_complete: Callable[[List], None]) -> None:
+        self.__expected = expected
+        self.__on_complete = on_complete
+        self.__lock = threading.Lock()
+        self.__results = []
+        self.__sealed = False
+        self.__completed = False
+
+    def add(self, mod_uuid: str, result: str, details=None) -> None:
+        """Add a final module result; only non-ok results carry details"""
+        entry = {'uuid': mod_uuid, 'result': result}
+        if result != Result.ok and details is not None: entry['details'] = details
+        with self.__lock:
+            self.__results.append(entry)
+            complete = self.__is_complete()
+        if complete: self.__on_complete(self.__results)
+
+    def done(self, mod_uuid: str, resp: PubsubMessage) -> None:
+        """Add a final module result from the response message that would be sent for the module"""
+        data = resp.payload.get('data', {})
+        self.add(mod_uuid, data.get('result'), data.get('details'))
+
+    def seal(self) -> List:
+        """No more modules will be added; returns the results if the batch is already complete (on_complete is not called then)"""
+        with self.__lock:
+            self.__sealed = True
+            if self.__is_complete(): return self.__results
+        return None
+
+    def __is_complete(self) -> bool:
+        """Check (and flag) completion; called with lock held"""
+        if self.__completed or not self.__sealed or len(self.__results) < self.__expected:
+            return False
+        self.__completed = True
+        return True
+
+    @staticmethod
+    def summary(results: List) -> dict:
+        """Aggregated details: count of modules per result and the module results"""
+        counts = {}
+        for entry in results:
+            counts[entry['result']] = counts.get(entry['result'], 0) + 1
+        return {'counts': counts, 'modules': results}
+
+    @staticmethod
+    def result(results: List) -> str:
+        """Batch is ok only if all modules are ok"""
+        return Result.ok if all(entry['result'] == Result.ok for entry in results) else Result.err
@@ -0,0 +1,113 @@
+"""
+*TL;DR
+Control message dispatch in priority lanes, off the pubsub network thread
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Hashable
+from logzero import logger
+
+class ControlDispatcher():
+    """
+        Runs control calls on a pool of worker threads, highest priority lane first (lower value).
+        Each lane can have a concurrency limit (calls of the lane running at once) and a queue limit
+        (calls beyond it are shed; submit returns False). Calls with the same key run one at a time,
+        in submit order, whatever their lane (e.g. a delete never overtakes the create of the same module)
+
+        Arguments
+        ---------
+            workers:
+                number of worker threads
+            concurrency:
+                max calls running at once, by priority (default: workers)
+            queue_sizes:
+                max calls waiting, by priority (default: no limit)
+            name:
+                worker threads name prefix
+    """
+
+    def __init__(self, workers: int, concurrency: Dict[int, int]=None, queue_sizes: Dict[int, int]=None, name: str='control') -> None:
+        self.__concurrency = concurrency or {}
+        self.__queue_sizes = queue_sizes or {}
+        self.__lanes: Dict[int, deque] = {}
+        self.__running: Dict[int, int] = {}
+        self.__keys: Dict[Hashable, deque] = {} # keys with a call queued or running -> calls waiting for it
+        self.__cond = threading.Condition()
+        self.__stopped = False
+        # workers are started with the first call submitted
+        self.__threads = [threading.Thread(target=self.__worker, name=f"{name}_{i}", daemon=True) for i in range(max(1, workers))]
+        self.__started = False
+
+    def submit(self, priority: int, fn: Callable, *args, key: Hashable=None) -> bool:
+        """Queue fn(*args) in the priority lane; returns False if the call was shed (lane queue full, or stopped)"""
+        call = (priority, key, fn, args)
+        with self.__cond:
+            if self.__stopped: return False
+            lane = self.__lanes.setdefault(priority, deque())
+            queue_size = self.__queue_sizes.get(priority)
+            if queue_size is not None and len(lane) >= queue_size: return False
+            if key is not None:
+                waiting = self.__keys.get(key)
+                if waiting is not None:
+                    # a call with the same key is queued or running; this one waits for it
+                    waiting.append(call)
+                    return True
+                self.__keys[key] = deque()
+            lane.append(call)
+            self.__cond.notify()
+            if not self.__started:
+                self.__started = True
+                for thread in self.__threads: thread.start()
+        return True
+
+    def queued(self, priority: int) -> int:
+        """Calls waiting in the lane"""
+        with self.__cond:
+            return len(self.__lanes.get(priority, ()))
+
+    def shutdown(self) -> None:
+        """Drop queued calls and stop workers once they finish the calls they run"""
+        with self.__cond:
+            self.__stopped = True
+            self.__lanes.clear()
+            self.__keys.clear()
+            self.__cond.notify_all()
+
+    def __next_call(self):
+        """Highest priority call whose lane is under its concurrency limit; called with lock held"""
+        for priority in sorted(self.__lanes):
+            lane = self.__lanes[priority]
+            if lane and self.__running.get(priority, 0) < self.__concurrency.get(priority, len(self.__threads)):
+                return lane.popleft()
+        return None
+
+    def __worker(self) -> None:
+        while True:
+            with self.__cond:
+                call = self.__next_call()
+                while call is None and not self.__stopped:
+                    self.__cond.wait()
+                    call = self.__next_call()
+                if call is None: return
+                (priority, key, fn, args) = call
+                self.__running[priority] = self.__running.get(priority, 0) + 1
+
+            try:
+                fn(*args)
+            except Exception as err: # catch all so the worker does not stop
+                logger.error(f"ControlDispatcher: {err}")
+
+            with self.__cond:
+                self.__running[priority] -= 1
+                if key is not None: self.__release(key)
+                # a lane under its concurrency limit again might have calls waiting
+                self.__cond.notify_all()
+
+    def __release(self, key: Hashable) -> None:
+        """The call with key is done; queue the next call waiting for the key. Called with lock held"""
+        waiting = self.__keys.get(key)
+        if not waiting:
+            self.__keys.pop(key, None)
+            return
+        call = waiting.popleft()
+        self.__lanes.setdefault(call[0], deque()).append(call)
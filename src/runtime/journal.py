@@ -0,0 +1,115 @@
+"""
+*TL;DR
+Local journal of the modules running; lets a restarted runtime find (and adopt)
+the containers started by a previous runtime process
+"""
+import json
+import os
+import threading
+from typing import Dict
+from logzero import logger
+
+class ModuleJournal():
+    """
+        Module create specs (the module data received in the create request) and launcher state (e.g. where the
+        program files are) by module uuid, kept in an append-only log: a json line per change ({"add": uuid, "spec",
+        "launcher"} or {"remove": uuid}). The log is compacted (rewritten with one line per module, atomically)
+        when loaded and once it has many more lines than modules
+
+        Arguments
+        ---------
+            path:
+                journal file path
+    """
+
+    _COMPACT_MIN_RECORDS = 64 # lines in the log before it is compacted (if also more than twice the modules)
+
+    def __init__(self, path: str) -> None:
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__records = 0 # lines in the log
+        self.__entries: Dict[str, Dict] = self.__load()
+        with self.__lock:
+            self.__compact()
+
+    def __load(self) -> Dict[str, Dict]:
+        """Replay the log; a missing or unreadable journal is an empty journal (unreadable lines are skipped)"""
+        entries = {}
+        try:
+            with open(self.__path, 'r') as f:
+                for line in f:
+                    if not line.strip(): continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # e.g. the last line, if the process died writing it
+                        logger.warning(f"Ignoring unreadable line in module journal {self.__path}.")
+                        continue
+                    if not isinstance(record, dict): continue
+                    if record.get('add'):
+                        entries[record['add']] = {'spec': record.get('spec') or {}, 'launcher': record.get('launcher') or {}}
+                    elif record.get('remove'):
+                        entries.pop(record['remove'], None)
+        except FileNotFoundError:
+            return {}
+        except OSError as err:
+            logger.warning(f"Ignoring unreadable module journal {self.__path}: {err}")
+            return {}
+        return entries
+
+    @staticmethod
+    def __line(record: Dict) -> str:
+        return json.dumps(record) + '\n'
+
+    def __compact(self) -> None:
+        """Rewrite the log with a line per module (temp file, then replace); called with lock held"""
+        dirname = os.path.dirname(self.__path)
+        if dirname: os.makedirs(dirname, exist_ok=True)
+        tmp_path = f"{self.__path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                for mod_uuid, entry in self.__entries.items():
+                    f.write(ModuleJournal.__line({'add': mod_uuid, **entry}))
+            os.replace(tmp_path, self.__path)
+            self.__records = len(self.__entries)
+        except OSError as err:
+            logger.error(f"Error writing module journal {self.__path}: {err}")
+
+    def __append(self, line: str) -> None:
+        """Append a line to the log, compacting it if it grew too long; called with lock held"""
+        try:
+            with open(self.__path, 'a') as f:
+                f.write(line)
+            self.__records += 1
+        except OSError as err:
+            logger.error(f"Error writing module journal {self.__path}: {err}")
+            return
+        if self.__records >= max(ModuleJournal._COMPACT_MIN_RECORDS, 2 * len(self.__entries)): self.__compact()
+
+    def add(self, mod_uuid: str, spec: Dict, launcher_state: Dict=None) -> None:
+        """Add (or replace) a module create spec and the state of its launcher"""
+        entry = {'spec': spec, 'launcher': launcher_state or {}}
+        line = ModuleJournal.__line({'add': mod_uuid, **entry})
+        with self.__lock:
+            self.__entries[mod_uuid] = entry
+            self.__append(line)
+
+    def remove(self, mod_uuid: str) -> None:
+        """Remove a module; no-op if it is not in the journal"""
+        line = ModuleJournal.__line({'remove': mod_uuid})
+        with self.__lock:
+            if self.__entries.pop(mod_uuid, None) is None: return
+            self.__append(line)
+
+    def entries(self) -> Dict[str, Dict]:
+        """Copy of the entries ({"spec", "launcher"}) by module uuid"""
+        with self.__lock:
+            return dict(self.__entries)
+
+    def __contains__(self, mod_uuid: str) -> bool:
+        with self.__lock:
+            return mod_uuid in self.__entries
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
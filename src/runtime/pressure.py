@@ -0,0 +1,115 @@
+"""
+*TL;DR
+Host pressure; samples pressure stall information (/proc/pressure/{cpu,memory,io}), the load average
+and the memory available on the host, and checks them against thresholds, so creates are held back
+(or turned down) on an overloaded host before the modules already running slow down
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from logzero import logger
+
+class HostPressure():
+    """
+        Samples host pressure and checks it against thresholds; 0 = no threshold
+
+        Arguments
+        ---------
+            max_cpu_psi:
+                max cpu pressure (% of time some tasks stalled on cpu, 10s average)
+            max_memory_psi:
+                max memory pressure (% of time some tasks stalled on memory, 10s average)
+            max_io_psi:
+                max io pressure (% of time some tasks stalled on io, 10s average)
+            max_load_per_cpu:
+                max 1 minute load average per cpu
+            min_mem_available_mb:
+                min memory (MB) available on the host (MemAvailable)
+            proc_path:
+                where procfs is mounted
+    """
+
+    # (threshold, sample key, True if the sample must stay below the threshold)
+    _CHECKS = (
+        ('max_cpu_psi', 'cpu_psi', True),
+        ('max_memory_psi', 'memory_psi', True),
+        ('max_io_psi', 'io_psi', True),
+        ('max_load_per_cpu', 'load_per_cpu', True),
+        ('min_mem_available_mb', 'mem_available_mb', False),
+    )
+
+    def __init__(self, max_cpu_psi: float=0, max_memory_psi: float=0, max_io_psi: float=0, max_load_per_cpu: float=0,
+                 min_mem_available_mb: float=0, proc_path: str='/proc', **kwargs) -> None:
+        self.__thresholds = {
+            'max_cpu_psi': max_cpu_psi or 0,
+            'max_memory_psi': max_memory_psi or 0,
+            'max_io_psi': max_io_psi or 0,
+            'max_load_per_cpu': max_load_per_cpu or 0,
+            'min_mem_available_mb': min_mem_available_mb or 0 }
+        self.__proc_path = proc_path
+        self.__ncpus = os.cpu_count() or 1
+        self.__last: Dict[str, float] = {}
+        self.__lock = threading.Lock()
+        self.__unavailable = set() # readings missing on this host (logged once)
+
+    def sample(self) -> Dict[str, float]:
+        """Read the host pressure; readings not available on this host (e.g. no PSI support) are left out"""
+        sample = {}
+        for resource in ('cpu', 'memory', 'io'):
+            psi = self.__read(f"pressure/{resource}", HostPressure.__parse_psi)
+            if psi is not None: sample[f"{resource}_psi"] = psi
+        load1 = self.__read('loadavg', lambda text: float(text.split()[0]))
+        if load1 is not None:
+            sample['load1'] = load1
+            sample['load_per_cpu'] = round(load1 / self.__ncpus, 2)
+        mem_available_kb = self.__read('meminfo', HostPressure.__parse_mem_available)
+        if mem_available_kb is not None: sample['mem_available_mb'] = mem_available_kb // 1024
+        with self.__lock:
+            self.__last = sample
+        return sample
+
+    def __read(self, name: str, parse) -> Any:
+        try:
+            with open(os.path.join(self.__proc_path, name)) as f:
+                return parse(f.read())
+        except (OSError, ValueError, IndexError) as err:
+            if name not in self.__unavailable:
+                self.__unavailable.add(name)
+                logger.warning(f"Host pressure: {name} not available ({err}).")
+            return None
+
+    @staticmethod
+    def __parse_psi(text: str) -> float:
+        """10s average of the 'some' line (e.g. 'some avg10=1.50 avg60=0.80 avg300=0.20 total=12345')"""
+        for line in text.splitlines():
+            fields = line.split()
+            if fields and fields[0] == 'some':
+                return float(dict(field.split('=') for field in fields[1:])['avg10'])
+        raise ValueError("no 'some' line")
+
+    @staticmethod
+    def __parse_mem_available(text: str) -> int:
+        for line in text.splitlines():
+            if line.startswith('MemAvailable:'): return int(line.split()[1])
+        raise ValueError("no MemAvailable")
+
+    @property
+    def last(self) -> Dict[str, float]:
+        """Last sample"""
+        with self.__lock:
+            return dict(self.__last)
+
+    def violation(self) -> Optional[Dict[str, Any]]:
+        """Details of the first threshold the last sample exceeds; None if within thresholds"""
+        sample = self.last
+        for limit, key, below in HostPressure._CHECKS:
+            threshold = self.__thresholds[limit]
+            value = sample.get(key)
+            if not threshold or value is None: continue
+            if (value > threshold) if below else (value < threshold):
+                return {
+                    "desc": f"host under pressure ({key}={value}, {limit}={threshold})",
+                    "limit": limit,
+                    "pressure": sample }
+        return None
@@ -0,0 +1,164 @@
+"""
+*TL;DR
+Per-program resource profiles; the cpu and memory used by the modules of each program (sampled
+with the keepalive stats) and their startup time, kept in a json file across runtime restarts.
+Profiles give the limits of modules that do not request resources, and the load modules are
+expected to put on the runtime
+"""
+import json
+import math
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from logzero import logger
+
+from model import Module, ModuleStats
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of (unsorted) values"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+class ProgramProfile():
+    """Recent samples of one program: cpus and memory (MB) used by its modules, and their startup time (seconds)"""
+
+    __slots__ = ('runs', 'cpus', 'mem_mb', 'startup_sec')
+
+    def __init__(self, window: int, runs: int=0, cpus: List=None, mem_mb: List=None, startup_sec: List=None) -> None:
+        self.runs = runs
+        self.cpus = deque(cpus or [], maxlen=window)
+        self.mem_mb = deque(mem_mb or [], maxlen=window)
+        self.startup_sec = deque(startup_sec or [], maxlen=window)
+
+    def summary(self) -> Dict[str, float]:
+        """Peak and percentiles (p50, p95) of the samples"""
+        summary = {'runs': self.runs, 'samples': len(self.cpus)}
+        for key, samples in (('cpus', self.cpus), ('mem_mb', self.mem_mb), ('startup_sec', self.startup_sec)):
+            if not samples: continue
+            summary[f"{key}_p50"] = round(_percentile(samples, 50), 3)
+            summary[f"{key}_p95"] = round(_percentile(samples, 95), 3)
+            summary[f"{key}_peak"] = round(max(samples), 3)
+        return summary
+
+    def to_dict(self) -> Dict:
+        return {'runs': self.runs, 'cpus': list(self.cpus), 'mem_mb': list(self.mem_mb), 'startup_sec': list(self.startup_sec)}
+
+class ProgramProfiles():
+    """
+        Profiles by program (the module fileid, or its location and file), kept in a json file;
+        the file is rewritten (atomically) by save(), if profiles changed
+
+        Arguments
+        ---------
+            path:
+                profiles file path
+            window:
+                samples kept per program (the most recent)
+            min_samples:
+                stats samples a program needs before its profile is used
+            limits_headroom:
+                the cpu limit of a module is headroom times the program's p95 cpus, its memory limit headroom
+                times the program's peak memory; 0 = profiles do not set limits
+    """
+
+    # smallest limits set from a profile
+    _MIN_CPUS = 0.05
+    _MIN_MEM_MB = 32
+
+    def __init__(self, path: str, window: int=200, min_samples: int=10, limits_headroom: float=1.5, **kwargs) -> None:
+        self.__path = path
+        self.__window = window or 200
+        self.__min_samples = min_samples or 1
+        self.__limits_headroom = limits_headroom or 0
+        self.__lock = threading.Lock()
+        self.__profiles: Dict[str, ProgramProfile] = self.__load()
+        self.__dirty = False
+
+    @staticmethod
+    def program(module: Module) -> str:
+        """Key of the program a module runs"""
+        if module.fileid: return str(module.fileid)
+        return f"{module.location}/{module.file}"
+
+    def __load(self) -> Dict[str, ProgramProfile]:
+        """Read profiles file; a missing or unreadable file is no profiles"""
+        try:
+            with open(self.__path, 'r') as f:
+                entries = json.load(f)
+            return {program: ProgramProfile(self.__window, **entry) for program, entry in entries.items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, AttributeError) as err:
+            logger.warning(f"Ignoring unreadable program profiles {self.__path}: {err}")
+            return {}
+
+    def save(self) -> None:
+        """Write profiles file, if profiles changed since the last save"""
+        with self.__lock:
+            if not self.__dirty: return
+            entries = {program: profile.to_dict() for program, profile in self.__profiles.items()}
+            self.__dirty = False
+        dirname = os.path.dirname(self.__path)
+        if dirname: os.makedirs(dirname, exist_ok=True)
+        tmp_path = f"{self.__path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.__path)
+        except OSError as err:
+            logger.error(f"Error writing program profiles {self.__path}: {err}")
+
+    def __profile(self, module: Module) -> ProgramProfile:
+        """Profile of the program of module (created if new); called with lock held"""
+        program = ProgramProfiles.program(module)
+        profile = self.__profiles.get(program)
+        if profile is None: profile = self.__profiles[program] = ProgramProfile(self.__window)
+        self.__dirty = True
+        return profile
+
+    def observe(self, module: Module, stats: ModuleStats) -> None:
+        """Add a stats sample of a running module"""
+        cpu_percent, mem_usage = stats.get('cpu_usage_percent'), stats.get('mem_usage')
+        if cpu_percent is None or mem_usage is None: return
+        with self.__lock:
+            profile = self.__profile(module)
+            profile.cpus.append(round(cpu_percent / 100, 3))
+            profile.mem_mb.append(round(mem_usage / 1e6, 1))
+
+    def started(self, module: Module, startup_sec: float) -> None:
+        """A module of the program started (create request to running) in startup_sec"""
+        with self.__lock:
+            profile = self.__profile(module)
+            profile.runs += 1
+            profile.startup_sec.append(round(startup_sec, 3))
+
+    def summary(self, module: Module) -> Optional[Dict[str, float]]:
+        """Profile summary of the program of module; None if it has fewer than min_samples samples"""
+        with self.__lock:
+            profile = self.__profiles.get(ProgramProfiles.program(module))
+            if profile is None or len(profile.cpus) < self.__min_samples: return None
+            return profile.summary()
+
+    def limits(self, module: Module) -> Dict[str, float]:
+        """Limits ('cpus', 'mem_mb') from the program profile for those the module does not request"""
+        if not self.__limits_headroom: return {}
+        summary = self.summary(module)
+        if summary is None: return {}
+        limits = {}
+        if not module.requested_cpus:
+            limits['cpus'] = round(max(ProgramProfiles._MIN_CPUS, summary['cpus_p95'] * self.__limits_headroom), 2)
+        if not module.requested_mem_mb:
+            limits['mem_mb'] = math.ceil(max(ProgramProfiles._MIN_MEM_MB, summary['mem_mb_peak'] * self.__limits_headroom))
+        return limits
+
+    def expected(self, module: Module) -> Dict[str, float]:
+        """Load ('cpus', 'mem_mb') a module is expected to put on the runtime: its program's p95, or what it requests"""
+        summary = self.summary(module)
+        if summary is None: return {'cpus': module.requested_cpus, 'mem_mb': module.requested_mem_mb}
+        return {'cpus': summary['cpus_p95'], 'mem_mb': summary['mem_mb_p95']}
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__profiles)
@@ -0,0 +1,252 @@
+"""
+*TL;DR
+Per-namespace and per-scene quotas for module creates; limits the modules admitted (in-flight, queued
+or running), the cpus and memory they request, and the create request rate (token bucket) of each
+namespace and scene, so one tenant cannot take the whole runtime; optional runtime-wide limits
+cap the cpus and memory of all modules admitted
+"""
+import time
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+class TokenBucket():
+    """
+        Token bucket rate limiter; refills at rate tokens per second, up to burst tokens.
+        Not thread-safe (callers hold a lock)
+
+        Arguments
+        ---------
+            rate:
+                tokens added per second
+            burst:
+                max tokens (requests that can be made at once); defaults to max(1, rate)
+    """
+
+    def __init__(self, rate: float, burst: float=0) -> None:
+        self.__rate = rate
+        self.__burst = burst or max(1, rate)
+        self.__tokens = self.__burst
+        self.__updated_at = time.monotonic()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated_at) * self.__rate)
+        self.__updated_at = now
+
+    def take(self, ntokens: float=1) -> bool:
+        """Take ntokens if available; returns False (and takes nothing) if not"""
+        self.__refill()
+        if self.__tokens < ntokens: return False
+        self.__tokens -= ntokens
+        return True
+
+    def give(self, ntokens: float=1) -> None:
+        """Return tokens taken (e.g. the request was not made after all)"""
+        self.__tokens = min(self.__burst, self.__tokens + ntokens)
+
+    def retry_after(self, ntokens: float=1) -> float:
+        """Seconds until ntokens are available"""
+        self.__refill()
+        return max(0.0, (ntokens - self.__tokens) / self.__rate)
+
+    @property
+    def full(self) -> bool:
+        self.__refill()
+        return self.__tokens >= self.__burst
+
+class QuotaLimits():
+    """
+        Limits of one namespace or scene; 0 = no limit
+
+        Arguments
+        ---------
+            max_modules:
+                max modules admitted (in-flight, queued or running)
+            max_cpus:
+                max cpus requested by the modules admitted
+            max_mem_mb:
+                max memory (MB) requested by the modules admitted
+            create_rate:
+                create requests per second
+            create_burst:
+                create requests that can be made at once; defaults to max(1, create_rate)
+    """
+
+    def __init__(self, max_modules: int=0, max_cpus: float=0, max_mem_mb: float=0, create_rate: float=0, create_burst: float=0, **kwargs) -> None:
+        self.max_modules = max_modules or 0
+        self.max_cpus = max_cpus or 0
+        self.max_mem_mb = max_mem_mb or 0
+        self.create_rate = create_rate or 0
+        self.create_burst = create_burst or 0
+
+    @property
+    def unlimited(self) -> bool:
+        return not (self.max_modules or self.max_cpus or self.max_mem_mb or self.create_rate)
+
+class QuotaViolation():
+    """Why a create is over quota"""
+
+    def __init__(self, scope: str, name: str, limit: str, value: float, retry_after_sec: float=None) -> None:
+        self.scope = scope
+        self.name = name
+        self.limit = limit
+        self.value = value
+        self.retry_after_sec = retry_after_sec
+
+    def details(self) -> Dict[str, Any]:
+        details = {
+            "desc": f"{self.scope} {self.name} over quota ({self.limit}={self.value})" if self.name else f"{self.scope} over quota ({self.limit}={self.value})",
+            "quota": self.scope,
+            "name": self.name,
+            "limit": self.limit }
+        if self.retry_after_sec is not None: details["retry_after_sec"] = self.retry_after_sec
+        return details
+
+class _Usage():
+    """Resources held by the modules of one namespace or scene, and its create rate limiter"""
+
+    __slots__ = ('limits', 'modules', 'cpus', 'mem_mb', 'bucket')
+
+    def __init__(self, limits: QuotaLimits) -> None:
+        self.limits = limits
+        self.modules = 0
+        self.cpus = 0.0
+        self.mem_mb = 0.0
+        self.bucket = TokenBucket(limits.create_rate, limits.create_burst) if limits.create_rate else None
+
+    def over(self, cpus: float, mem_mb: float, modules: int=1) -> Optional[Tuple[str, float]]:
+        """The (limit, value) modules more (one more module, by default) with cpus and mem_mb would exceed; None if within limits"""
+        limits = self.limits
+        if limits.max_modules and modules and self.modules + modules > limits.max_modules: return ('max_modules', limits.max_modules)
+        if limits.max_cpus and cpus > 0 and self.cpus + cpus > limits.max_cpus: return ('max_cpus', limits.max_cpus)
+        if limits.max_mem_mb and mem_mb > 0 and self.mem_mb + mem_mb > limits.max_mem_mb: return ('max_mem_mb', limits.max_mem_mb)
+        return None
+
+    @property
+    def idle(self) -> bool:
+        return self.modules == 0 and (self.bucket is None or self.bucket.full)
+
+class QuotaCharge():
+    """Resources a module holds against its namespace and scene quotas; released once (when the module leaves)"""
+
+    def __init__(self, quotas: 'TenantQuotas', keys: Tuple, cpus: float, mem_mb: float) -> None:
+        self.__quotas = quotas
+        self.keys = keys
+        self.cpus = cpus
+        self.mem_mb = mem_mb
+        self.__released = False
+        self.__lock = threading.Lock()
+
+    def release(self) -> None:
+        with self.__lock:
+            if self.__released: return
+            self.__released = True
+        self.__quotas._release(self)
+
+    def resize(self, cpus: float, mem_mb: float) -> Optional['QuotaViolation']:
+        """Charge the module cpus and mem_mb instead (e.g. its limits were updated); returns the violation if over quota"""
+        with self.__lock:
+            if self.__released: return None
+            violation = self.__quotas._resize(self, cpus, mem_mb)
+            if violation is None: self.cpus, self.mem_mb = cpus, mem_mb
+        return violation
+
+class TenantQuotas():
+    """
+        Keep track of the modules, cpus and memory admitted per namespace and per scene,
+        and check creates against their limits
+
+        Arguments
+        ---------
+            namespace:
+                limits (QuotaLimits arguments) of each namespace
+            scene:
+                limits (QuotaLimits arguments) of each (namespaced) scene
+            overrides:
+                limits of given namespaces ('namespace') or scenes ('namespace/scene');
+                override the namespace/scene limits given
+            runtime:
+                limits (QuotaLimits arguments) of all the modules of the runtime
+    """
+
+    NAMESPACE = 'namespace'
+    SCENE = 'scene'
+    RUNTIME = 'runtime'
+
+    def __init__(self, namespace: Dict=None, scene: Dict=None, overrides: Dict[str, Dict]=None, runtime: Dict=None) -> None:
+        self.__defaults = { TenantQuotas.NAMESPACE: dict(namespace or {}), TenantQuotas.SCENE: dict(scene or {}),
+                            TenantQuotas.RUNTIME: dict(runtime or {}) }
+        self.__runtime_limited = not QuotaLimits(**self.__defaults[TenantQuotas.RUNTIME]).unlimited
+        self.__overrides = dict(overrides or {})
+        self.__usage: Dict[Tuple[str, str], _Usage] = {}
+        self.__lock = threading.Lock()
+
+    def __limits(self, scope: str, name: str) -> QuotaLimits:
+        return QuotaLimits(**{ **self.__defaults[scope], **(self.__overrides.get(name) or {}) })
+
+    def __get_usage(self, key: Tuple[str, str]) -> _Usage:
+        """Usage of a namespace/scene; called with lock held"""
+        usage = self.__usage.get(key)
+        if usage is None:
+            usage = self.__usage[key] = _Usage(self.__limits(*key))
+        return usage
+
+    def charge(self, namespace: str, scene: str, cpus: float=0, mem_mb: float=0, force: bool=False) -> Tuple[Optional[QuotaCharge], Optional[QuotaViolation]]:
+        """
+            Charge a module create to its namespace and scene ('namespace/scene'); returns a tuple with
+            (the charge, None), or (None, the violation) if the create is over quota.
+            force charges even over quota (for modules already running, e.g. adopted)
+        """
+        keys = ((TenantQuotas.NAMESPACE, namespace), (TenantQuotas.SCENE, scene))
+        if self.__runtime_limited: keys += ((TenantQuotas.RUNTIME, ''),)
+        with self.__lock:
+            usages = [self.__get_usage(key) for key in keys]
+            if not force:
+                for key, usage in zip(keys, usages):
+                    over = usage.over(cpus, mem_mb)
+                    if over: return None, QuotaViolation(*key, *over)
+                taken = []
+                for key, usage in zip(keys, usages):
+                    if usage.bucket is None: continue
+                    if not usage.bucket.take():
+                        for bucket in taken: bucket.give()
+                        return None, QuotaViolation(*key, 'create_rate', usage.limits.create_rate,
+                                                    retry_after_sec=round(usage.bucket.retry_after(), 3))
+                    taken.append(usage.bucket)
+            for usage in usages:
+                usage.modules += 1
+                usage.cpus += cpus
+                usage.mem_mb += mem_mb
+        return QuotaCharge(self, keys, cpus, mem_mb), None
+
+    def _release(self, charge: QuotaCharge) -> None:
+        """Called by QuotaCharge.release()"""
+        with self.__lock:
+            for key in charge.keys:
+                usage = self.__usage.get(key)
+                if usage is None: continue
+                usage.modules = max(0, usage.modules - 1)
+                usage.cpus = max(0.0, usage.cpus - charge.cpus)
+                usage.mem_mb = max(0.0, usage.mem_mb - charge.mem_mb)
+                # forget namespaces/scenes with nothing admitted and no recent creates
+                if usage.idle: del self.__usage[key]
+
+    def _resize(self, charge: QuotaCharge, cpus: float, mem_mb: float) -> Optional[QuotaViolation]:
+        """Called by QuotaCharge.resize(); only increases are checked against the limits"""
+        cpus_delta, mem_delta = cpus - charge.cpus, mem_mb - charge.mem_mb
+        with self.__lock:
+            usages = [self.__get_usage(key) for key in charge.keys]
+            for key, usage in zip(charge.keys, usages):
+                over = usage.over(cpus_delta, mem_delta, modules=0)
+                if over: return QuotaViolation(*key, *over)
+            for usage in usages:
+                usage.cpus = max(0.0, usage.cpus + cpus_delta)
+                usage.mem_mb = max(0.0, usage.mem_mb + mem_delta)
+        return None
+
+    def usage(self, scope: str, name: str) -> Dict[str, float]:
+        """Modules, cpus and memory admitted for a namespace or scene (or the runtime: scope RUNTIME, name '')"""
+        with self.__lock:
+            usage = self.__usage.get((scope, name))
+            if usage is None: return {'modules': 0, 'cpus': 0.0, 'mem_mb': 0.0}
+            return {'modules': usage.modules, 'cpus': usage.cpus, 'mem_mb': usage.mem_mb}
@@ -0,0 +1,91 @@
+"""
+*TL;DR
+Module registry (modules by uuid) for high module counts; lookups and snapshots never
+take a lock, writers only lock the shard of the uuid they change
+"""
+import threading
+from typing import Any, Dict, Iterator, List, Tuple
+
+class _Shard():
+    """Entries of one shard; the dict is replaced (copy-on-write) on every change, never changed in place"""
+
+    __slots__ = ('lock', 'entries')
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Any] = {}
+
+class ModuleRegistry():
+    """
+        Dict-like registry of modules by uuid, sharded by uuid hash. Each shard keeps an immutable dict
+        that writers replace with an updated copy under the shard lock, so readers (lookups, keepalive and
+        shutdown snapshots) only read a reference and never block or get blocked by writers.
+        A write copies one shard (about len/nshards entries); snapshots are consistent per shard.
+
+        Arguments
+        ---------
+            nshards:
+                number of shards; writes to different shards do not contend
+    """
+
+    _DFT_NSHARDS = 256
+
+    def __init__(self, nshards: int=_DFT_NSHARDS) -> None:
+        self.__shards = [_Shard() for _ in range(max(1, nshards))]
+
+    def __shard(self, mod_uuid: str) -> _Shard:
+        return self.__shards[hash(mod_uuid) % len(self.__shards)]
+
+    def get(self, mod_uuid: str, default: Any=None) -> Any:
+        return self.__shard(mod_uuid).entries.get(mod_uuid, default)
+
+    def __getitem__(self, mod_uuid: str) -> Any:
+        return self.__shard(mod_uuid).entries[mod_uuid]
+
+    def __contains__(self, mod_uuid: str) -> bool:
+        return mod_uuid in self.__shard(mod_uuid).entries
+
+    def __setitem__(self, mod_uuid: str, module: Any) -> None:
+        shard = self.__shard(mod_uuid)
+        with shard.lock:
+            entries = dict(shard.entries)
+            entries[mod_uuid] = module
+            shard.entries = entries
+
+    def add(self, mod_uuid: str, module: Any) -> bool:
+        """Add a module unless the uuid is taken; returns False if it is"""
+        shard = self.__shard(mod_uuid)
+        with shard.lock:
+            if mod_uuid in shard.entries: return False
+            entries = dict(shard.entries)
+            entries[mod_uuid] = module
+            shard.entries = entries
+        return True
+
+    def pop(self, mod_uuid: str, expected: Any=None) -> Any:
+        """Remove and return the module with the given uuid (only if it is expected, when given); None if not removed"""
+        shard = self.__shard(mod_uuid)
+        with shard.lock:
+            module = shard.entries.get(mod_uuid)
+            if module is None or (expected is not None and module is not expected): return None
+            entries = dict(shard.entries)
+            del entries[mod_uuid]
+            shard.entries = entries
+        return module
+
+    def __delitem__(self, mod_uuid: str) -> None:
+        if self.pop(mod_uuid) is None: raise KeyError(mod_uuid)
+
+    def values(self) -> List[Any]:
+        """Snapshot of the modules"""
+        return [module for shard in self.__shards for module in shard.entries.values()]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot of the (uuid, module) pairs"""
+        return [item for shard in self.__shards for item in shard.entries.items()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([mod_uuid for shard in self.__shards for mod_uuid in shard.entries])
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self.__shards)
@@ -0,0 +1,94 @@
+"""
+*TL;DR
+Cache of the requests recently handled (by request object_id) and the responses they produced;
+retried requests (e.g. the orchestrator did not get our confirm) are answered from the cache
+instead of being handled again
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from model import Result
+from pubsub import PubsubMessage
+
+class _Entry():
+    """A request handled (or being handled) and its last response"""
+
+    __slots__ = ('created_at', 'resp')
+
+    def __init__(self) -> None:
+        self.created_at = time.monotonic()
+        self.resp: Optional[PubsubMessage] = None
+
+class ResponseCache():
+    """
+        Bounded cache of request object_ids and the last response each request produced (a pending ack,
+        then its final confirm); entries expire after ttl_sec, and the oldest are dropped beyond max_entries
+
+        Arguments
+        ---------
+            max_entries:
+                max requests remembered
+            ttl_sec:
+                seconds a request is remembered; 0 = until dropped to make room
+    """
+
+    def __init__(self, max_entries: int, ttl_sec: float=0) -> None:
+        self.__max_entries = max(1, max_entries)
+        self.__ttl_sec = ttl_sec
+        self.__entries: OrderedDict = OrderedDict() # in insertion order (oldest first)
+        self.__lock = threading.Lock()
+
+    def __expire(self) -> None:
+        """Drop expired entries (oldest first); called with lock held"""
+        if not self.__ttl_sec: return
+        now = time.monotonic()
+        while self.__entries:
+            entry = next(iter(self.__entries.values()))
+            if now - entry.created_at <= self.__ttl_sec: break
+            self.__entries.popitem(last=False)
+
+    def claim(self, object_id: str) -> Tuple[bool, Optional[PubsubMessage]]:
+        """
+            Claim a request to handle it; returns a tuple with (True, None) if the request was not seen
+            (or was turned down as busy, to be retried), or (False, the last response it produced) if it was 
+            (the response is None if the request is still being handled and produced no response yet)
+        """
+        with self.__lock:
+            self.__expire()
+            entry = self.__entries.get(object_id)
+            if entry is not None:
+                if ResponseCache.__result(entry.resp) != Result.busy: return False, entry.resp
+                del self.__entries[object_id]
+            self.__entries[object_id] = _Entry()
+            while len(self.__entries) > self.__max_entries: self.__entries.popitem(last=False)
+        return True, None
+
+    def record(self, resp: PubsubMessage) -> None:
+        """Record a response to a request (by the response object_id); a final response is not replaced by a pending one"""
+        payload = resp.payload if isinstance(resp.payload, dict) else {}
+        object_id = payload.get('object_id')
+        if not object_id: return
+        with self.__lock:
+            entry = self.__entries.get(object_id)
+            if entry is None:
+                entry = self.__entries[object_id] = _Entry()
+                while len(self.__entries) > self.__max_entries: self.__entries.popitem(last=False)
+            elif entry.resp is not None and ResponseCache.__result(resp) == Result.pending and ResponseCache.__result(entry.resp) != Result.pending:
+                return
+            entry.resp = resp
+
+    def forget(self, object_id: str) -> None:
+        """Forget a request (e.g. it failed before producing a response, so a retry is handled again)"""
+        with self.__lock:
+            self.__entries.pop(object_id, None)
+
+    @staticmethod
+    def __result(resp: Optional[PubsubMessage]) -> Optional[str]:
+        if resp is None or not isinstance(resp.payload, dict): return None
+        data = resp.payload.get('data')
+        return data.get('result') if isinstance(data, dict) else None
+
+    def __len__(self) -> int:
+        return len(self.__entries)
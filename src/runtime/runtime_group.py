@@ -0,0 +1,163 @@
+"""
+*TL;DR
+Several runtime identities (runtime.identities) hosted in one process; the runtimes share one pubsub
+connection, one scheduler thread (and its workers) and one docker api client, and each registers,
+sends keepalives and enforces its limits (capacity, quotas) independently
+"""
+import copy
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from logzero import logger
+
+from common import RuntimeException
+from pubsub import ErrorReporter, PubsubHandler, PubsubListner, PubsubMessage
+from .scheduler import Scheduler
+from .shards import plain_settings
+
+def identity_settings(settings, overrides: Dict) -> Dict:
+    """
+        Settings (runtime, topics) of one runtime identity: the runtime settings changed by the identity overrides
+        (e.g. name, runtime_type, apis, tags, max_nmodules), with its own uuid (unless given), registration/keepalive
+        topic, journal and program profiles files
+    """
+    base = plain_settings(settings.get('runtime'))
+    base.pop('identities', None)
+    rt = {**base, **plain_settings(overrides)}
+    if not overrides.get('uuid'): rt['uuid'] = str(uuid.uuid4())
+    if rt.get('journal_path') and not overrides.get('journal_path'): rt['journal_path'] = f"{rt['journal_path']}.{rt['uuid']}"
+    profiles = rt.get('profiles') or {}
+    if profiles.get('path') and not (overrides.get('profiles') or {}).get('path'): profiles['path'] = f"{profiles['path']}.{rt['uuid']}"
+
+    # the runtimes topic ends with the runtime namespace and uuid
+    topics = plain_settings(settings.get('topics'))
+    base_suffix = f"/g/{base.get('namespace')}/p/{base.get('uuid')}"
+    if topics['runtimes'].endswith(base_suffix):
+        topics['runtimes'] = f"{topics['runtimes'][:-len(base_suffix)]}/g/{rt.get('namespace')}/p/{rt['uuid']}"
+    else:
+        logger.warning(f"Runtimes topic {topics['runtimes']} does not end with the runtime namespace and uuid; shared by identity {rt['uuid']}.")
+    return {'runtime': rt, 'topics': topics}
+
+class _RuntimeClient(PubsubListner):
+    """Pubsub client of one runtime of a group; subscriptions go through the group connection"""
+
+    def __init__(self, group: 'RuntimeGroup', index: int) -> None:
+        self.__group = group
+        self.index = index
+
+    def last_will_set(self, lastwill_msg: PubsubMessage) -> None:
+        self.__group._last_will_set(self, lastwill_msg)
+
+    def message_handler_add(self, topic: str, handler: Callable[[PubsubMessage], None], decode_json: bool=True) -> None:
+        self.__group._handler_add(self, topic, handler, decode_json)
+
+    def message_handler_remove(self, topic: str) -> None:
+        self.__group._handler_remove(self, topic)
+
+    def message_publish(self, pubsub_msg: PubsubMessage) -> None:
+        self.__group.client.message_publish(pubsub_msg)
+
+    def flush(self, timeout_sec: float) -> bool:
+        return self.__group.client.flush(timeout_sec)
+
+    def disconnect(self) -> None:
+        """The group connection is closed by RuntimeGroup.exit()"""
+        pass
+
+class RuntimeGroup(PubsubHandler):
+    """
+        Pubsub handler of the runtimes hosted in one process; relays connection notifications to every runtime and
+        delivers the messages of a topic to every runtime subscribed to it (topics are subscribed once)
+
+        Arguments
+        ---------
+            error_topic:
+                topic where errors handling messages are sent
+            timer_workers:
+                worker threads of the scheduler shared by the runtimes
+            errors:
+                error aggregation (ErrorReporter window_sec, max_per_window)
+    """
+
+    def __init__(self, error_topic: str, timer_workers: int=2, errors: Dict=None) -> None:
+        self.__errors = ErrorReporter(lambda msg: self.client.message_publish(msg), error_topic, **(errors or {}))
+        self.__rtmngrs = []
+        self.__clients: List[_RuntimeClient] = []
+        self.__handlers: Dict[str, Dict[_RuntimeClient, Callable]] = {} # runtime handlers by topic
+        self.__lock = threading.Lock()
+        self.client: PubsubListner = None
+
+        self.__timer_pool = ThreadPoolExecutor(max_workers=timer_workers, thread_name_prefix='timer')
+        self.scheduler = Scheduler(executor=self.__timer_pool)
+
+    def add(self, rtmngr: PubsubHandler) -> None:
+        """Host a runtime (created with scheduler=group.scheduler); before the group connects"""
+        self.__rtmngrs.append(rtmngr)
+        self.__clients.append(_RuntimeClient(self, len(self.__clients)))
+
+    def wait_init(self, timeout_secs=15) -> None:
+        for rtmngr in self.__rtmngrs: rtmngr.wait_init(timeout_secs)
+
+    def __len__(self) -> int:
+        return len(self.__rtmngrs)
+
+    def pubsub_connected(self, client: PubsubListner, session_present: bool=False):
+        self.client = client
+        for rtmngr, rt_client in zip(self.__rtmngrs, self.__clients):
+            rtmngr.pubsub_connected(rt_client, session_present)
+
+    def pubsub_disconnected(self):
+        for rtmngr in self.__rtmngrs: rtmngr.pubsub_disconnected()
+
+    def pubsub_error(self, desc, data):
+        for rtmngr in self.__rtmngrs: rtmngr.pubsub_error(desc, data)
+
+    def _last_will_set(self, rt_client: _RuntimeClient, lastwill_msg: PubsubMessage) -> None:
+        """A connection has one last will: the first runtime's (the others publish theirs on a clean exit only)"""
+        if rt_client.index == 0: self.client.last_will_set(lastwill_msg)
+        else: logger.debug(f"Last will of runtime {rt_client.index} not set (shared connection).")
+
+    def _handler_add(self, rt_client: _RuntimeClient, topic: str, handler: Callable, decode_json: bool) -> None:
+        with self.__lock:
+            handlers = self.__handlers.setdefault(topic, {})
+            handlers[rt_client] = handler
+        # (re)subscribe; on reconnect without a resumed session runtimes subscribe again
+        self.client.message_handler_add(topic, lambda msg, topic=topic: self.__deliver(topic, msg), decode_json)
+
+    def _handler_remove(self, rt_client: _RuntimeClient, topic: str) -> None:
+        with self.__lock:
+            handlers = self.__handlers.get(topic, {})
+            handlers.pop(rt_client, None)
+            if handlers: return
+            self.__handlers.pop(topic, None)
+        self.client.message_handler_remove(topic)
+
+    def __deliver(self, topic: str, msg: PubsubMessage):
+        """Message on a topic (pubsub network thread); every runtime subscribed gets its own copy and its response is published"""
+        with self.__lock:
+            handlers = list(self.__handlers.get(topic, {}).values())
+        for i, handler in enumerate(handlers):
+            rt_msg = msg if i == len(handlers) - 1 else PubsubMessage(msg.topic, copy.deepcopy(msg.payload))
+            try:
+                resp = handler(rt_msg)
+            except RuntimeException as rte:
+                self.__errors.report(rte.error_msg_payload())
+                continue
+            except Exception as err:
+                logger.warning(traceback.format_exc())
+                self.__errors.report({"desc": "Uncaught exception", "data": str(err)})
+                continue
+            if resp is not None: self.client.message_publish(resp)
+        return None
+
+    def exit(self) -> None:
+        """Exit all runtimes (they stop their modules and publish their delete) and close the connection"""
+        for rtmngr in self.__rtmngrs: rtmngr.exit()
+        self.scheduler.stop()
+        self.__timer_pool.shutdown(wait=False, cancel_futures=True)
+        if self.client is not None:
+            self.__errors.close()
+            self.client.disconnect()
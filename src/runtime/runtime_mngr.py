@@ -9,89 +9,286 @@ from logzero import logger
 import uuid
 import threading
 import time
+import random
 import atexit
-from typing import Dict
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import deque
+from typing import Dict, Callable
 
 from common import settings, InvalidArgument
 from model import Result, RuntimeTopics
-from model import Runtime, Module, MessageType, Action
+from model import Runtime, Module, MessageType, Action, ModuleState, SessionState, ControlPriority, RestartPolicy, InactivityAction, PressureAction
 from pubsub import PubsubHandler
 from launcher import LauncherContext
-from pubsub import PubsubListner, PubsubMessage
-from common.exception import MissingField, RuntimeException, LauncherException
+from pubsub import PubsubListner, PubsubMessage, ErrorReporter
+from common.exception import MissingField, RuntimeException, LauncherException, CreateCancelled
+from program_files import ProgramFilesCache
+from .admission import AdmissionQueue, Admission
+from .batch import BatchRequest
+from .journal import ModuleJournal
+from .pressure import HostPressure
+from .profiles import ProgramProfiles
+from .scheduler import Scheduler
+from .registry import ModuleRegistry
+from .dispatcher import ControlDispatcher
+from .quota import TenantQuotas
+from .response_cache import ResponseCache
+from .shards import ShardLink, ShardSet
 
 class RuntimeMngr(PubsubHandler):
     """Runtime Manager; handles topic messages"""
 
+    # control message priority by action; actions not listed are ControlPriority.control
+    _CONTROL_PRIORITY = {
+        Action.delete: ControlPriority.reclaim,
+        Action.bulk_delete: ControlPriority.reclaim,
+        Action.create: ControlPriority.work,
+        Action.bulk_create: ControlPriority.work,
+        Action.prepare: ControlPriority.work,
+    }
+
+    # bulk actions; in a sharded runtime, every shard handles the modules it owns and the supervisor answers
+    _BULK_ACTIONS = (Action.bulk_create, Action.bulk_delete)
+
+    # queries; answered from cached state (never asking docker), and not remembered for retries. Runtime-wide 
+    # queries are answered by the supervisor of a sharded runtime, module queries by the shard owning the module
+    _QUERY_ACTIONS = (Action.list, Action.status, Action.capacity)
+    _RUNTIME_QUERIES = (Action.list, Action.capacity)
+
+    # module restart backoff (doubles on every restart within the window, up to the max) if not given in the runtime settings
+    _DFT_RESTART_BACKOFF_SEC = 1
+    _DFT_RESTART_BACKOFF_MAX_SEC = 60
+    _DFT_RESTART_WINDOW_SEC = 300
+
+    # shutdown deadline if not given in the runtime settings and max threads stopping modules on shutdown
+    _DFT_SHUTDOWN_TIMEOUT_SEC = 15
+
+    # how often program profiles are saved if not given in the runtime settings
+    _DFT_PROFILES_SAVE_SEC = 60
+    _MAX_SHUTDOWN_WORKERS = 64
+
     def __init__(self, **kwargs):
-        self.__modules: Dict[str, MngrModule] = {} # dictionary of MngrModules by module uuid
-        self.__modules_lock = threading.Lock()
+        self.__modules = ModuleRegistry() # MngrModules by module uuid; lookups and snapshots do not lock
         self.__lastwill_msg = None
-        self.__conn_event = threading.Event()
-        self.__reg_event = threading.Event()
         self.__init_done_event = threading.Event()
-        self.__ka_exit = threading.Event()
-        self.__pending_delete_msgs: Dict[str, PubsubMessage] = {} # dictionary messages waiting module exit notification
+        self.__reg_call = None # next registration attempt, while registering
+        self.__pending_delete_msgs: Dict[str, tuple] = {} # dictionary of ([(delete confirm, reply callable)], timeout call) waiting module exit notification
+        self.__pending_delete_lock = threading.Lock()
+        self.__pubsub_client: PubsubListner = None # set once connected
+        self.__exiting = False # deletes published while exiting are acknowledged (QoS 1) before exit
         self.__exited = False
+        self.__session_state = SessionState.init
+        self.__session_lock = threading.Lock()
+        self.__sweeps = set() # periodic sweeps (keepalive, inactivity checks) running on the sweep pool
+        self.__sweeps_lock = threading.Lock()
+        self.__workers_started = False
 
 
         self.__rt = Runtime(topics=kwargs.get('topics', settings.get('topics')), **kwargs.get('runtime', settings.get('runtime')))
 
+        # sharded runtime: a supervisor (shards: the shard processes; it runs no modules) or a shard (shard: its
+        # link to the supervisor; it runs the modules partitioned to it under the runtime identity of the supervisor)
+        self.__shards: ShardSet = kwargs.get('shards')
+        self.__shard: ShardLink = kwargs.get('shard')
+
+        # bounded worker pool running module create pipelines off the pubsub network thread (worker counts
+        # not in the runtime settings given come from the settings defaults)
+        self.__create_pool = ThreadPoolExecutor(
+            max_workers=self.__rt.create_workers or settings.get('runtime.create_workers'),
+            thread_name_prefix='create')
+
+        # worker pool stopping modules; a stop blocks up to the module stop grace period
+        self.__delete_pool = ThreadPoolExecutor(
+            max_workers=self.__rt.delete_workers or settings.get('runtime.delete_workers'),
+            thread_name_prefix='delete')
+
+        # timed work (keepalives, registration retries, inactivity checks, timeouts) is driven by one scheduler 
+        # thread; due calls run on a small worker pool. They only submit work that blocks on docker: module stats 
+        # sweeps go to their own worker (not queued behind creates), stops to the delete pool. Runtimes hosted in 
+        # one process share the scheduler of their group
+        self.__sweep_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sweep')
+        self.__scheduler: Scheduler = kwargs.get('scheduler')
+        self.__timer_pool = None
+        if self.__scheduler is None:
+            self.__timer_pool = ThreadPoolExecutor(
+                max_workers=self.__rt.timer_workers or settings.get('runtime.timer_workers'),
+                thread_name_prefix='timer')
+            self.__scheduler = Scheduler(executor=self.__timer_pool)
+
+        # control messages are handled off the pubsub network thread, deletes first; creates have a 
+        # concurrency limit (so workers are left for deletes) and are shed when too many are waiting
+        control_workers = self.__rt.control_workers or settings.get('runtime.control_workers')
+        self.__dispatcher = ControlDispatcher(control_workers,
+            concurrency={ControlPriority.work: self.__rt.control_create_concurrency or max(1, control_workers - 1)},
+            queue_sizes={ControlPriority.work: self.__rt.control_queue_size} if self.__rt.control_queue_size else None)
+
+        # admission control; at most max_nmodules admitted (in-flight or running), others wait in a bounded queue
+        self.__admission = AdmissionQueue(
+            capacity=self.__rt.max_nmodules,
+            queue_size=self.__rt.create_queue_size or 0,
+            queue_timeout_sec=self.__rt.create_queue_timeout_sec or 0,
+            retry_after_sec=self.__rt.create_retry_after_sec or 1)
+
+        # per-namespace and per-scene limits on modules admitted, resources they request and create rate
+        quotas = self.__rt.quotas or {}
+        self.__quotas = TenantQuotas(quotas.get('namespace'), quotas.get('scene'), quotas.get('overrides'), quotas.get('runtime'))
+
+        # host pressure (psi, load, available memory), sampled on the scheduler; creates are deferred (admission 
+        # held) or rejected while it is over a threshold
+        host_pressure = self.__rt.host_pressure or {}
+        self.__pressure = None
+        if host_pressure.get('interval_sec'):
+            self.__pressure = HostPressure(**host_pressure)
+            self.__sample_pressure()
+            self.__scheduler.call_every(host_pressure.get('interval_sec'), self.__sample_pressure)
+
+        # requests recently handled and their responses; retried requests are answered from here
+        self.__responses = ResponseCache(self.__rt.response_cache_size, self.__rt.response_cache_ttl_sec or 0) if self.__rt.response_cache_size else None
+
+        # journal of running modules; a restarted runtime adopts their containers
+        self.__journal = ModuleJournal(self.__rt.journal_path) if self.__rt.journal_path and self.__shards is None else None
+
+        # per-program profiles (cpu, memory, startup time) from keepalive stats; they give the limits of modules 
+        # that do not request resources, and the load expected from the modules running
+        profiles = self.__rt.profiles or {}
+        self.__profiles = None
+        if profiles.get('path') and self.__shards is None:
+            self.__profiles = ProgramProfiles(**profiles)
+            self.__scheduler.call_every(profiles.get('save_interval_sec') or RuntimeMngr._DFT_PROFILES_SAVE_SEC, self.__profiles.save)
+
+        # errors handling control messages are published aggregated by kind, like the pubsub listner does
+        self.__errors = ErrorReporter(lambda msg: self.__pubsub_client.message_publish(msg), self.__rt.topics.runtimes,
+                                      **kwargs.get('error_reporting', settings.get('error_reporting')))
+
         # register exit handler to send delete runtime request
         atexit.register(self.__exit_handler)
 
     def __exit_handler(self):
         """ Exit handler; do some cleanup """
         if self.__exited: return
+        self.__exiting = True
                 
-        # try to gracefully stop threads
-        self.__reg_event.set() # in case we are still trying to register
-        self.__ka_exit.set()
+        # drop control messages not handled yet
+        self.__dispatcher.shutdown()
+
+        # stop timed work (registration, keepalive, inactivity checks, timeouts); a shared scheduler is stopped by the group
+        if self.__timer_pool is not None:
+            self.__scheduler.stop()
+            self.__timer_pool.shutdown(wait=False, cancel_futures=True)
+        self.__sweep_pool.shutdown(wait=False, cancel_futures=True)
+
+        deadline = time.time() + (self.__rt.shutdown_timeout_sec or RuntimeMngr._DFT_SHUTDOWN_TIMEOUT_SEC)
+
+        if self.__profiles is not None: self.__profiles.save()
+
+        # drop creates and deletes that did not start yet
+        self.__create_pool.shutdown(wait=False, cancel_futures=True)
+        self.__delete_pool.shutdown(wait=False, cancel_futures=True)
         
         # stop containers
-        with self.__modules_lock:
-            for (_, mod) in self.__modules.items():
-                mod.stop()
+        self.__stop_all(deadline)
         
-        # publish last will before exit
-        if self.__lastwill_msg is not None:
-            self.__pubsub_client.message_publish(self.__lastwill_msg)
-            
-        time.sleep(1) # need time to publish
+        # shards stop their modules
+        if self.__shards is not None: self.__shards.stop(max(0, deadline - time.time()))
+
+        # pending error summaries, then the last will (unless mqtt never connected)
+        if self.__pubsub_client is not None:
+            self.__errors.close()
+            if self.__lastwill_msg is not None:
+                self.__pubsub_client.message_publish(self.__lastwill_msg)
+
+            # wait for outstanding messages to be acknowledged
+            self.__pubsub_client.flush(max(0, deadline - time.time()))
         
         self.__exited = True
 
+    def __stop_all(self, deadline):
+        """Stop all modules concurrently; modules get their grace period, but no more than the time left before deadline"""
+        modules = self.__modules.values()
+        if not modules: return
+
+        logger.info(f"Stopping {len(modules)} modules.")
+        stop_pool = ThreadPoolExecutor(
+            max_workers=min(len(modules), RuntimeMngr._MAX_SHUTDOWN_WORKERS),
+            thread_name_prefix='shutdown')
+        futures = [stop_pool.submit(self.__shutdown_stop, mod, deadline) for mod in modules]
+        (_, not_done) = wait(futures, timeout=max(0, deadline - time.time()))
+        if not_done: logger.warning(f"{len(not_done)} modules did not stop before the shutdown deadline.")
+        stop_pool.shutdown(wait=False, cancel_futures=True)
+
+    def __shutdown_stop(self, mngr_module, deadline):
+        """Shutdown worker; stop a module within the shutdown deadline"""
+        if mngr_module.cancel():
+            # not running yet; in-flight creates stop at their next stage, parked modules are removed here
+            if not mngr_module.in_create: mngr_module.cleanup()
+            return
+
+        if self.__journal is not None and self.__rt.keep_modules_on_exit and mngr_module.state in (ModuleState.running, ModuleState.hibernated):
+            # left running; the next runtime process adopts it
+            try:
+                mngr_module.resume()
+            except LauncherException as err:
+                logger.warning(f"Resuming module {mngr_module.module.uuid} failed: {err}")
+            mngr_module.detach()
+            return
+
+        mngr_module.state = ModuleState.stopping
+        grace_sec = self.__stop_grace_sec(mngr_module)
+        remaining = max(0, deadline - time.time())
+        try:
+            mngr_module.stop(remaining if grace_sec is None else min(grace_sec, remaining))
+        except LauncherException:
+            pass # not running
+        except Exception as err:
+            logger.error(f"Stopping module {mngr_module.module.uuid} failed: {err}")
+
     def exit(self):
         self.__exit_handler()
-        self.__pubsub_client.disconnect()
+        if self.__pubsub_client is not None: self.__pubsub_client.disconnect()
 
-    def pubsub_connected(self, client):
-        """ Once we are connected on pubsub, try to to register 
-            NOTE/TODO: We will register again everytime we lose mqtt connection (we are retrying to connect)
+    def pubsub_connected(self, client, session_present=False):
+        """ Once we are connected on pubsub, try to to register.
+            On reconnect: if the broker resumed our session, nothing to do; otherwise register again 
+            (the listner renewed our subscriptions). Background workers are started only once
         """
-        self.__conn_event.set() # signal event
         self.__pubsub_client = client
-        
-        # set last will; sent if we dont disconnect properly
-        self.__lastwill_msg = self.__rt.delete_runtime_msg()
-        self.__pubsub_client.last_will_set(self.__lastwill_msg)
+
+        with self.__session_lock:
+            state = self.__session_state
+            if state == SessionState.registering:
+                # registration thread still running; it keeps sending registration messages
+                logger.info("Reconnected while registering.")
+                return
+            if state == SessionState.ready:
+                if session_present or self.__rt.reg_attempts < 0:
+                    logger.info("Reconnected; session resumed.")
+                    return
+                logger.info("Reconnected; session not resumed, registering again.")
+            self.__session_state = SessionState.registering
+
+        if state == SessionState.init and self.__shard is None:
+            # set last will; sent if we dont disconnect properly (published at exit otherwise; acknowledged)
+            self.__lastwill_msg = self.__rt.delete_runtime_msg()
+            self.__lastwill_msg.qos = 1
+            self.__pubsub_client.last_will_set(self.__lastwill_msg)
 
         # subscribe to runtimes to receive registration confirmation
         self.__pubsub_client.message_handler_add(self.__rt.topics.runtimes, self.reg)
 
         reg_attempts = self.__rt.reg_attempts
-        if reg_attempts < 0:
-            # skip registration
+        if reg_attempts < 0 or self.__shard is not None:
+            # skip registration (shards run under the runtime registered by the supervisor)
             self.__register_runtime_done()
         else:
-            # start a thread to send registration messages once we are connected
-            self.__reg_thread = threading.Thread(target=self.__register_runtime_send,
-                args=(
-                    self.__rt.create_runtime_msg(),
-                    self.__rt.reg_timeout_seconds,
-                    self.__rt.reg_attempts,
-                    self.__rt.reg_fail_error))
-            self.__reg_thread.start()
+            # send registration messages (on the scheduler) until a registration response arrives
+            with self.__session_lock:
+                self.__reg_call = self.__scheduler.call_later(0, self.__register_runtime_send,
+                    self.__rt.create_runtime_msg(pressure=self.__pressure_sample()), reg_attempts if reg_attempts > 0 else -1)
+
+    def pubsub_disconnected(self):
+        """ Lost pubsub connection; the listner reconnects and we get pubsub_connected again """
+        logger.info("Pubsub connection lost.")
 
     def pubsub_error(self, desc, data):
         logger.error("%s: %s", desc, data)
@@ -101,136 +298,285 @@ class RuntimeMngr(PubsubHandler):
         if not evt_flag:
             raise RuntimeException("timeout waiting for init.", f"Runtime init failed after {timeout_secs} secs")
 
-    def __wait_reg(self, timeout_secs=10):
-        evt_flag = self.__conn_event.wait(timeout_secs)
-        if not evt_flag:
-            raise RuntimeException("timeout waiting for MQTT connection.", "Could not connect.") 
-                 
-        evt_flag = self.__reg_event.wait(timeout_secs)
-        return evt_flag
+    def __module_running(self, mngr_module):
+        """A module is up; schedule its inactivity checks and lifetime expiry"""
+        inactivity_timeout_sec = self.__rt.inactivity_timeout_sec
+        if inactivity_timeout_sec:
+            mngr_module.timers.append(self.__scheduler.call_every(
+                self.__rt.inactivity_check_interval_sec or inactivity_timeout_sec, 
+                self.__sweep, mngr_module, self.__inactivity_check, mngr_module, inactivity_timeout_sec))
 
-    def __inactivity_monitor(self, check_interval_sec, timeout_sec):
-        """Inactivity monitor thread; checks each module for activity and deletes idle ones."""
-        logger.info(f"Starting inactivity monitor (timeout={timeout_sec}s, check_interval={check_interval_sec}s).")
+        # a restarted module keeps the lifetime left since its first start
+        if mngr_module.started_at is None: mngr_module.started_at = time.time()
+        max_lifetime_sec = self.__max_lifetime_sec(mngr_module)
+        if max_lifetime_sec:
+            mngr_module.timers.append(self.__scheduler.call_later(
+                max(0, max_lifetime_sec - (time.time() - mngr_module.started_at)), self.__lifetime_expired, mngr_module))
 
-        while True:
-            exit_flag = self.__ka_exit.wait(check_interval_sec)
-            if exit_flag:
-                break
+    def __submit(self, pool, fn, *args) -> bool:
+        """Hand work to a worker pool from a timer, mqtt or module exit thread; once exiting (pools shut down) 
+           the work is dropped instead of raising there. Returns False if dropped"""
+        if self.__exited:
+            logger.debug(f"Exited; dropping {getattr(fn, '__name__', fn)}.")
+            return False
+        try:
+            pool.submit(fn, *args)
+        except RuntimeError as err:
+            logger.info(f"Dropping {getattr(fn, '__name__', fn)} ({err}).")
+            return False
+        return True
 
-            now = time.time()
-            to_delete = []
+    def __sweep(self, key, fn, *args):
+        """Scheduled; runs fn(*args) (it asks docker) on the sweep pool, unless the previous run for key is still going"""
+        with self.__sweeps_lock:
+            if key in self.__sweeps: return
+            self.__sweeps.add(key)
+        if not self.__submit(self.__sweep_pool, self.__sweep_run, key, fn, *args):
+            with self.__sweeps_lock:
+                self.__sweeps.discard(key)
 
-            with self.__modules_lock:
-                snapshot = list(self.__modules.items())
+    def __sweep_run(self, key, fn, *args):
+        """Sweep worker; runs a sweep submitted by __sweep"""
+        try:
+            fn(*args)
+        except Exception as err:
+            logger.error(f"Sweep ({getattr(fn, '__name__', fn)}): {err}")
+        finally:
+            with self.__sweeps_lock:
+                self.__sweeps.discard(key)
 
-            for mod_uuid, mngr_mod in snapshot:
-                try:
-                    active = mngr_mod.module_launcher.is_active()
-                    with self.__modules_lock:
-                        if mod_uuid not in self.__modules:
-                            continue
-                        if active:
-                            mngr_mod.last_active_at = now
-                        elif now - mngr_mod.last_active_at > timeout_sec:
-                            logger.info(f"Module {mod_uuid} inactive for >{timeout_sec}s; scheduling deletion.")
-                            to_delete.append(mod_uuid)
-                except Exception as err:
-                    logger.error(f"InactivityMonitor ({mod_uuid}): {err}")
-
-            for mod_uuid in to_delete:
-                try:
-                    self.__delete_inactive_module(mod_uuid)
-                except Exception as err:
-                    logger.error(f"InactivityMonitor delete ({mod_uuid}): {err}")
+    def __inactivity_check(self, mngr_module, timeout_sec):
+        """Swept per module; checks the module for activity and deletes it if idle for more than timeout_sec"""
+        mod_uuid = mngr_module.module.uuid
+        # stopping modules are on their way out
+        if mngr_module.state != ModuleState.running: return
+
+        now = time.time()
+        active = mngr_module.module_launcher.is_active()
+        if self.__modules.get(mod_uuid) is not mngr_module: return
+        # sweeps of a module never overlap; last_active_at needs no lock
+        if active:
+            mngr_module.last_active_at = now
+            return
+        if now - mngr_module.last_active_at <= timeout_sec: return
+
+        if self.__rt.inactivity_action == InactivityAction.hibernate:
+            logger.info(f"Module {mod_uuid} inactive for >{timeout_sec}s; hibernating.")
+            self.__hibernate_module(mngr_module)
+            return
+
+        logger.info(f"Module {mod_uuid} inactive for >{timeout_sec}s; scheduling deletion.")
+        self.__delete_inactive_module(mod_uuid)
+
+    def __hibernate_module(self, mngr_module):
+        """Freeze an idle module; it is resumed on stdin input or a resume request"""
+        try:
+            mngr_module.hibernate()
+        except LauncherException as err:
+            logger.warning(f"Hibernating module {mngr_module.module.uuid} failed: {err}")
+
+    def __module_input(self, mngr_module):
+        """Streamer input notification (pubsub network thread); input is activity, and resumes a hibernated module"""
+        mngr_module.last_active_at = time.time()
+        if mngr_module.state != ModuleState.hibernated: return
+        # unpause off the network thread; in order with other requests on the module (e.g. deletes)
+        self.__dispatcher.submit(ControlPriority.control, self.__resume, mngr_module, key=mngr_module.module.uuid)
+
+    def __resume(self, mngr_module):
+        """Resume a hibernated module; returns True if it was hibernated"""
+        if not mngr_module.resume(): return False
+        logger.info(f"Resumed module {mngr_module.module.uuid}.")
+        return True
 
     def __delete_inactive_module(self, mod_uuid):
-        """Stop a module that has been idle too long. The exit callback publishes the delete message."""
-        with self.__modules_lock:
-            mngr_mod = self.__modules.get(mod_uuid)
+        """Stop (on the delete pool) a module that has been idle too long. The exit callback publishes the delete message."""
+        mngr_mod = self.__modules.get(mod_uuid)
         if not mngr_mod:
             return
 
         logger.info(f"Deleting inactive module {mod_uuid}.")
+        mngr_mod.state = ModuleState.stopping
+        self.__submit(self.__delete_pool, self.__stop_expired, mngr_mod)
+
+    def __stop_expired(self, mngr_module):
+        """Delete worker; stops a module deleted by the runtime itself (inactive, or past its max lifetime)"""
         try:
-            mngr_mod.stop()
+            mngr_module.stop(self.__stop_grace_sec(mngr_module))
         except LauncherException:
-            self.__module_exit(mod_uuid)
+            self.__module_exit(mngr_module.module.uuid, mngr_module)
 
-    def __keepalive(self, ka_interval_secs):
-        """Keepalive thread; sends keepalive messages periodically """
-        logger.info("Starting keepalive.")
-        
-        while True:
-            exit_flag = self.__ka_exit.wait(ka_interval_secs)
-            if exit_flag: break # event is set; exit
-            
-            try:
-                with self.__modules_lock:
-                    mngr_mods = list(self.__modules.values())
-                children = [m.module.keepalive_attrs(m.module_launcher.get_stats()) for m in mngr_mods]
-                keepalive_msg = self.__rt.keepalive_msg(children)
-                logger.debug("Sending keepalive.")
-                self.__pubsub_client.message_publish(keepalive_msg) 
-            except Exception as err: # catch all so thread does not stop
-                logger.error(f"KeepAplive: {err}")
+    def __max_lifetime_sec(self, mngr_module):
+        """Seconds a module may run; the module value overrides the runtime default (0/None = no limit)"""
+        max_lifetime_sec = mngr_module.module.max_lifetime_sec
+        return max_lifetime_sec if max_lifetime_sec is not None else self.__rt.module_max_lifetime_sec
+
+    def __lifetime_expired(self, mngr_module):
+        """Scheduled per module; stops (on the delete pool) a module that ran for its max lifetime. The exit callback publishes the delete message."""
+        mod_uuid = mngr_module.module.uuid
+        if self.__modules.get(mod_uuid) is not mngr_module: return
+        if mngr_module.state not in (ModuleState.running, ModuleState.hibernated): return
+
+        logger.info(f"Module {mod_uuid} reached its max lifetime; deleting.")
+        mngr_module.state = ModuleState.stopping
+        self.__submit(self.__delete_pool, self.__stop_expired, mngr_module)
+
+    def __keepalive(self):
+        """Swept every keepalive interval; sends a keepalive message with the module stats
+           (shards hand theirs to the supervisor, which sends them with the modules of all shards)"""
+        if self.__exited: return
+        expected_load = None
+        if self.__shards is not None:
+            children = self.__shards.children()
+        else:
+            children = []
+            for m in self.__modules.values():
+                stats = m.module_launcher.get_stats()
+                ka_attrs = m.module.keepalive_attrs(stats)
+                if ka_attrs is not None and m.state == ModuleState.hibernated: ka_attrs['hibernated'] = True
+                children.append(ka_attrs)
+                # the last stats sampled answer queries
+                if stats is not None: m.stats, m.stats_at = stats, time.time()
+                # hibernated modules use no cpu; their samples would skew the program profile
+                if self.__profiles is not None and stats is not None and m.state == ModuleState.running: 
+                    self.__profiles.observe(m.module, stats)
+            expected_load = self.__expected_load()
+            if self.__shard is not None:
+                self.__shard.children(children)
+                return
+        hosts = LauncherContext.hosts_usage() if self.__shards is None else None
+        keepalive_msg = self.__rt.keepalive_msg(children, pressure=self.__pressure_sample(), expected_load=expected_load, hosts=hosts)
+        logger.debug("Sending keepalive.")
+        self.__pubsub_client.message_publish(keepalive_msg) 
             
-    def __register_runtime_send(self, reg_msg, timeout_secs, reg_attempts, reg_fail_error):
-        """Register thread; sends register messages every timeout interval
-           until register event is set"""
-
-        reg_count = reg_attempts
-        if reg_attempts == 0: reg_count = -1    
-        reg_flag = False
-        while True:
-            logger.info(f"Runtime attempting to register... {reg_count}");
-            self.__pubsub_client.message_publish(reg_msg)
-            reg_flag = self.__wait_reg(timeout_secs)
-            if reg_flag: break # event is set; registration response received
-            if reg_count > 0: reg_count = reg_count - 1
-            if reg_count == 0: break
-
-        if not reg_flag:
-            if reg_fail_error: raise RuntimeException("runtime registration failed.", "Could not register runtime after {} attempts.".format(reg_attempts))
-            else: 
-                logger.info("No registration response after {} attempts.".format(reg_attempts))
-                self.__reg_event.set()
-         
-        self.__register_runtime_done()
+    def __expected_load(self):
+        """Load expected from the modules running, by their program profiles (None if profiles are not kept)"""
+        if self.__profiles is None: return None
+        expected_load = {'cpus': 0.0, 'mem_mb': 0.0}
+        for m in self.__modules.values():
+            for key, value in self.__profiles.expected(m.module).items(): expected_load[key] += value
+        return expected_load
+
+    def __pressure_sample(self):
+        """Last host pressure sample (None if host pressure is not sampled)"""
+        return self.__pressure.last if self.__pressure is not None else None
+
+    def __sample_pressure(self):
+        """Scheduled every host pressure interval; holds admission while the host is over a threshold (pressure_action defer)
+           and starts the creates deferred once it is back under"""
+        self.__pressure.sample()
+        violation = self.__pressure.violation()
+        held = violation is not None and self.__rt.pressure_action != PressureAction.reject
+        if held == self.__admission.held: return
+        if held: logger.warning(f"Deferring creates; {violation['desc']}.")
+        else: logger.info("Host pressure back under thresholds; resuming creates.")
+        self.__handle_admission(*self.__admission.hold(held))
+
+    def __register_runtime_send(self, reg_msg, attempts_left):
+        """Scheduled registration attempt; sends a register message and schedules the next attempt
+           one timeout later (attempts_left < 0 = retry forever), until a registration response arrives"""
+        with self.__session_lock:
+            if self.__reg_call is None: return # registration done
+
+        if attempts_left == 0:
+            if not self.__reg_finish(): return
+            reg_attempts = self.__rt.reg_attempts
+            if self.__rt.reg_fail_error: raise RuntimeException("runtime registration failed.", "Could not register runtime after {} attempts.".format(reg_attempts))
+            logger.info("No registration response after {} attempts.".format(reg_attempts))
+            self.__register_runtime_done()
+            return
+
+        logger.info(f"Runtime attempting to register... {attempts_left}");
+        self.__pubsub_client.message_publish(reg_msg)
+
+        with self.__session_lock:
+            if self.__reg_call is None: return
+            self.__reg_call = self.__scheduler.call_later(self.__rt.reg_timeout_seconds, self.__register_runtime_send, 
+                reg_msg, attempts_left - 1 if attempts_left > 0 else -1)
+
+    def __reg_finish(self) -> bool:
+        """End registration attempts; returns False if registration was already over"""
+        with self.__session_lock:
+            reg_call = self.__reg_call
+            self.__reg_call = None
+        if reg_call is None: return False
+        reg_call.cancel()
+        return True
          
     def __register_runtime_done(self):
-        """Finish registration; subscribes to topics and starts keepalive"""
+        """Finish registration; subscribes to topics and starts background workers (first time only)"""
         
         # remove subscription to reg topic
         self.__pubsub_client.message_handler_remove(self.__rt.topics.runtimes)
 
+        # adopt modules left running by a previous runtime process, before module requests arrive
+        with self.__session_lock:
+            start_workers = not self.__workers_started
+        if start_workers: self.__adopt_modules()
+
         # subscribe to runtime control topic to receive module requests
-        self.__pubsub_client.message_handler_add(self.__rt.topics.modules, self.control)
-                            
-        # start keepalive
-        ka_interval_sec = self.__rt.ka_interval_sec
-        if ka_interval_sec:
-            self.__ka_thread = threading.Thread(target=self.__keepalive,
-                args=(ka_interval_sec,))
-            self.__ka_thread.start()
+        self.__pubsub_client.message_handler_add(self.__rt.topics.modules, self.__control_dispatch)
 
-        # start inactivity monitor
-        inactivity_timeout_sec = self.__rt.inactivity_timeout_sec
-        inactivity_check_interval_sec = self.__rt.inactivity_check_interval_sec
-        if inactivity_timeout_sec:
-            self.__inactivity_thread = threading.Thread(
-                target=self.__inactivity_monitor,
-                args=(inactivity_check_interval_sec, inactivity_timeout_sec))
-            self.__inactivity_thread.start()
+        with self.__session_lock:
+            self.__session_state = SessionState.ready
+            self.__workers_started = True
+        if start_workers: self.__start_workers()
 
         # flag init is done
         logger.info("Runtime registration done (or skiped).")
         self.__init_done_event.set()
+
+    def __start_workers(self):
+        """Schedule runtime-wide periodic work (keepalive); per-module work is scheduled as modules start"""
+        if self.__shards is not None: self.__shards.start()
+        ka_interval_sec = self.__rt.ka_interval_sec
+        if ka_interval_sec:
+            logger.info("Starting keepalive.")
+            self.__scheduler.call_every(ka_interval_sec, self.__sweep, 'keepalive', self.__keepalive)
                 
     def reg(self, decoded_msg):
         msg_data = decoded_msg.get('data')
-        if msg_data.get('result') == Result.ok:
-            self.__reg_event.set()
+        if msg_data.get('result') == Result.ok and self.__reg_finish():
+            # finish registration off the pubsub network thread (it changes subscriptions)
+            self.__scheduler.call_later(0, self.__register_runtime_done)
+
+    def __control_dispatch(self, msg):
+        """Control message handler (pubsub network thread); queues the message in its priority lane. 
+           Messages on the same module are handled in arrival order; shed messages get a busy response"""
+        try:
+            if msg.payload['from'] == self.__rt.uuid: return None # ignore messages from ourselfs
+        except KeyError:
+            pass
+
+        action = msg.get('action')
+        data = msg.get('data')
+        key = data.get('uuid') if isinstance(data, dict) else None
+        # sharded runtime: the supervisor answers bulk requests and runtime queries only, shards the requests on the modules they own
+        supervised = RuntimeMngr._BULK_ACTIONS + RuntimeMngr._RUNTIME_QUERIES
+        if self.__shards is not None and action not in supervised: return None
+        if self.__shard is not None:
+            if action in RuntimeMngr._RUNTIME_QUERIES: return None
+            if action not in RuntimeMngr._BULK_ACTIONS and not self.__shard.owns(key): return None
+
+        priority = RuntimeMngr._CONTROL_PRIORITY.get(action, ControlPriority.control)
+        if self.__dispatcher.submit(priority, self.__control_run, msg, key=key): return None
+
+        logger.info(f"Runtime busy; shedding {action} request.")
+        return self.__rt.confirm_msg(msg, result=Result.busy, details={
+            "desc": "runtime busy; control queue is full",
+            "retry_after_sec": self.__admission.retry_after() })
+
+    def __control_run(self, msg):
+        """Control worker; handles a control message and publishes the response, or reports the error, like the pubsub listner would"""
+        try:
+            resp = self.control(msg)
+        except RuntimeException as rte:
+            self.__errors.report(rte.error_msg_payload())
+            return
+        except Exception as err:
+            logger.warning(traceback.format_exc())
+            self.__errors.report({"desc": "Uncaught exception", "data": str(err)})
+            return
+        if resp is not None: self.__pubsub_client.message_publish(resp)
 
     def control(self, msg):
         """Handle control messages."""
@@ -249,45 +595,222 @@ class RuntimeMngr(PubsubHandler):
         msg_type = msg.get('type')
 
         if msg_type == MessageType.request:
-            action = msg.get('action')
-            if action == Action.create:
-                return self.__create_module(msg)
-            elif action == Action.delete:
-                return self.__delete_module(msg)
-            else:
-                raise InvalidArgument('action', action, msg)
+            # retried requests are answered with the last response they produced (if any yet), and not handled again
+            object_id = msg.get('object_id') if self.__responses is not None and msg.get('action') not in RuntimeMngr._QUERY_ACTIONS else None
+            if object_id:
+                (first, resp) = self.__responses.claim(object_id)
+                if not first:
+                    logger.info(f"Request {object_id} ({msg.get('action')}) already handled; not handling it again.")
+                    return resp
+            try:
+                resp = self.__request(msg)
+            except Exception:
+                # failed without a response; a retry is handled again
+                if object_id: self.__responses.forget(object_id)
+                raise
+            if object_id and resp is not None: self.__responses.record(resp)
+            return resp
         else:
             raise InvalidArgument('type', msg_type, msg)
 
+    def __request(self, msg):
+        """Handle a request message by action"""
+        action = msg.get('action')
+        if self.__shards is not None and action in RuntimeMngr._BULK_ACTIONS:
+            return self.__bulk_sharded(msg)
+        if action == Action.create:
+            return self.__create_module(msg)
+        elif action == Action.delete:
+            return self.__delete_module(msg)
+        elif action == Action.bulk_create:
+            return self.__bulk_create_modules(msg)
+        elif action == Action.bulk_delete:
+            return self.__bulk_delete_modules(msg)
+        elif action == Action.prepare:
+            return self.__prepare_module(msg)
+        elif action == Action.start:
+            return self.__start_module(msg)
+        elif action == Action.resume:
+            return self.__resume_module(msg)
+        elif action == Action.update:
+            return self.__update_module(msg)
+        elif action == Action.list:
+            return self.__list_modules(msg)
+        elif action == Action.status:
+            return self.__module_status(msg)
+        elif action == Action.capacity:
+            return self.__runtime_capacity(msg)
+        else:
+            raise InvalidArgument('action', action, msg)
+
+    def __respond(self, resp: PubsubMessage):
+        """Publish the final response to a request; remembered to answer retries of the request"""
+        if self.__responses is not None: self.__responses.record(resp)
+        self.__pubsub_client.message_publish(resp)
+
     def module_exists(self, mod_uuid):
-        with self.__modules_lock:
-            return mod_uuid in self.__modules
+        return mod_uuid in self.__modules
 
-    def __module_exit(self, mod_uuid):
+    def __module_exit(self, mod_uuid, mngr_module=None):
+        """Module exited; if mngr_module is given, the exit is ignored unless it is the module currently registered with mod_uuid"""
         logger.debug(f"module {mod_uuid} exited")
+
+        # a module that exited on its own might be restarted (according to its restart policy)
+        mngr_mod = self.__modules.get(mod_uuid)
+        if mngr_mod is not None and (mngr_module is None or mngr_mod is mngr_module):
+            if self.__restart_crashed(mngr_mod): return
         
-        module = None
         # remove module from our module list
-        with self.__modules_lock:    
-            try:
-                module = self.__modules.pop(mod_uuid).module
-            except KeyError as ke:
-                raise RuntimeException("Error deleting", "Module {} is not known".format(mod_uuid)) from ke
+        mngr_mod = self.__modules.pop(mod_uuid, expected=mngr_module)
+        if not mngr_mod:
+            # module was already removed (e.g. its create failed or was cancelled after the container started)
+            logger.debug(f"module {mod_uuid} is not known; exit ignored")
+            return
+        if self.__journal is not None: self.__journal.remove(mod_uuid)
+        mngr_mod.cancel_timers()
+        if mngr_mod.quota is not None: mngr_mod.quota.release()
+        module = mngr_mod.module
 
         # check if this is due to a delete request
-        delete_msg = None
-        try:
-            delete_msg = self.__pending_delete_msgs.pop(mod_uuid)
-        except KeyError:
-            delete_msg = module.delete_msg()
+        with self.__pending_delete_lock:
+            pending = self.__pending_delete_msgs.pop(mod_uuid, None)
+        if pending is not None:
+            (confirms, timeout_call) = pending
+            if timeout_call: timeout_call.cancel()
+        else:
+            confirms = [(module.delete_msg(), self.__pubsub_client.message_publish)]
+
+        for delete_msg, reply in confirms:
+            # exiting: the delete must reach the broker before the process exits (flushed)
+            if self.__exiting: delete_msg.qos = 1
+            reply(delete_msg)
 
-        self.__pubsub_client.message_publish(delete_msg)
+        # free the slot once the delete is out, so it goes before the confirm of a create waiting for the slot
+        self.__release_slot()
         
+    def __restart_crashed(self, mngr_module) -> bool:
+        """A running module exited; if it exited on its own (was not being stopped) and its restart policy says so,
+           schedule a restart after an exponential backoff (with jitter) and return True. Modules that failed 
+           restart_max_failures times within restart_window_sec are crash looping and are not restarted"""
+        module = mngr_module.module
+        policy = module.restart_policy or self.__rt.restart_policy or RestartPolicy.never
+        if policy == RestartPolicy.never or mngr_module.state != ModuleState.running: return False
+        if policy == RestartPolicy.on_failure and mngr_module.exit_code() == 0: return False
+
+        # exits of a module are sequential; failures needs no lock
+        now = time.time()
+        failures = mngr_module.failures
+        window_sec = self.__rt.restart_window_sec or RuntimeMngr._DFT_RESTART_WINDOW_SEC
+        while failures and now - failures[0] > window_sec: failures.popleft()
+        max_failures = self.__rt.restart_max_failures
+        if max_failures and len(failures) >= max_failures:
+            logger.warning(f"Module {module.uuid} is crash looping ({len(failures)} restarts in {window_sec}s); not restarting.")
+            return False
+
+        # the module might be stopped meanwhile (delete request)
+        if not mngr_module.crashed(): return False
+        failures.append(now)
+
+        backoff_sec = min(self.__rt.restart_backoff_max_sec or RuntimeMngr._DFT_RESTART_BACKOFF_MAX_SEC,
+                          (self.__rt.restart_backoff_sec or RuntimeMngr._DFT_RESTART_BACKOFF_SEC) * 2 ** (len(failures) - 1))
+        delay_sec = backoff_sec / 2 + random.uniform(0, backoff_sec / 2)
+        logger.info(f"Module {module.uuid} exited (code: {mngr_module.exit_code()}); restarting in {delay_sec:.1f}s.")
+        mngr_module.cancel_timers()
+        mngr_module.timers.append(self.__scheduler.call_later(delay_sec, self.__submit, self.__create_pool, self.__restart_pipeline, mngr_module))
+        return True
+
+    def __restart_pipeline(self, mngr_module):
+        """Create worker; start a new container for a module that exited, with the program files it already has"""
+        module = mngr_module.module
+        try:
+            mngr_module.restart(lambda: self.__module_exit(module.uuid, mngr_module))
+            mngr_module.attach_streamer(lambda: self.__module_input(mngr_module))
+        except CreateCancelled:
+            # deleted while restarting; the delete was confirmed
+            self.__cleanup_module(mngr_module)
+            return
+        except Exception as err:
+            logger.error(f"Restarting module {module.uuid} failed: {err}")
+            if self.__forget_module(mngr_module): self.__release_slot()
+            self.__cleanup_module(mngr_module)
+            self.__pubsub_client.message_publish(module.delete_msg())
+            return
+        logger.info(f"Restarted module {module.uuid}.")
+        self.__module_running(mngr_module)
+
     def __create_module(self, create_msg: PubsubMessage):
         """Handle create message."""
+        create_req = self.__create_request(create_msg.get('data'), create_msg, self.__respond)
+        return self.__admit_create(create_req)
+
+    def __bulk_create_modules(self, bulk_msg: PubsubMessage):
+        """Handle bulk create message; each module goes through admission and the create pipeline like a 
+           single create, modules running the same program share the program files fetched, and the request
+           is answered with one aggregated confirm once all module results are final"""
+        data = bulk_msg.get('data')
+        mod_specs = data.get('modules')
+        if not isinstance(mod_specs, list):
+            if self.__shard is not None: return None # the supervisor answers the error
+            raise InvalidArgument("modules", "Bulk create requires a list of modules", bulk_msg)
+
+        mod_specs = self.__shard_specs(mod_specs)
+        logger.info(f"Bulk create of {len(mod_specs)} modules.")
+
+        batch = BatchRequest(len(mod_specs), lambda results: self.__bulk_done(bulk_msg, results))
+        files_cache = ProgramFilesCache()
+        for mod in mod_specs:
+            mod_uuid = mod.get('uuid') if isinstance(mod, dict) else None
+            try:
+                if not isinstance(mod, dict):
+                    raise InvalidArgument("module", mod)
+                # modules inherit the parent given for the bulk request 
+                if data.get('parent') and not mod.get('parent'): mod['parent'] = data.get('parent')
+                create_req = self.__create_request(mod, bulk_msg, 
+                                lambda resp, mod_uuid=mod_uuid: batch.done(mod_uuid, resp), files_cache)
+                resp = self.__admit_create(create_req)
+                # pending creates will be answered by the create pipeline
+                if resp.payload['data']['result'] != Result.pending: batch.done(mod_uuid, resp)
+            except RuntimeException as rte:
+                batch.add(mod_uuid, Result.err, rte.error_msg_payload())
 
-        mod = create_msg.get('data')
+        results = batch.seal()
+        if results is not None: return self.__bulk_complete(bulk_msg, results)
+        if self.__shard is not None: return None # the supervisor acks the request
+        return self.__rt.confirm_msg(bulk_msg, result=Result.pending, details={'modules': len(mod_specs)})
 
+    def __bulk_done(self, bulk_msg: PubsubMessage, results):
+        """All module results of a bulk request are final; publish the aggregated confirm"""
+        resp = self.__bulk_complete(bulk_msg, results)
+        if resp is not None: self.__respond(resp)
+
+    def __bulk_complete(self, bulk_msg: PubsubMessage, results):
+        """Aggregated confirm of a bulk request; shards hand their results to the supervisor instead (and return None)"""
+        if self.__shard is not None:
+            self.__shard.bulk_done(bulk_msg.get('object_id'), results)
+            return None
+        return self.__rt.confirm_msg(bulk_msg, result=BatchRequest.result(results), details=BatchRequest.summary(results))
+
+    def __shard_specs(self, mod_specs):
+        """Modules (objects or uuids) of a bulk request the runtime handles; a shard handles the modules it owns"""
+        if self.__shard is None: return mod_specs
+        return [mod for mod in mod_specs if self.__shard.owns(mod.get('uuid') if isinstance(mod, dict) else mod)]
+
+    def __bulk_sharded(self, bulk_msg: PubsubMessage):
+        """Supervisor; acks a bulk request (each shard handles the modules it owns) and publishes the aggregated 
+           confirm once all shards handed their module results"""
+        mod_specs = bulk_msg.get('data').get('modules')
+        if not isinstance(mod_specs, list):
+            raise InvalidArgument("modules", "Bulk request requires a list of modules", bulk_msg)
+
+        logger.info(f"Bulk {bulk_msg.get('action')} of {len(mod_specs)} modules across {self.__shards.count} shards.")
+        # ack before the confirm can be published
+        self.__respond(self.__rt.confirm_msg(bulk_msg, result=Result.pending, details={'modules': len(mod_specs)}))
+        mod_uuids = [mod.get('uuid') if isinstance(mod, dict) else mod for mod in mod_specs]
+        self.__shards.collect(bulk_msg.get('object_id'), lambda results: self.__bulk_done(bulk_msg, results), mod_uuids=mod_uuids)
+        return None
+
+    def __create_request(self, mod, create_msg: PubsubMessage, reply, files_cache=None):
+        """Validate module create data and return a create request"""
         # only care about messages with us as parent
         try:
             if mod['parent'] != self.__rt.uuid and mod['parent'] != self.__rt.name:
@@ -298,24 +821,356 @@ class RuntimeMngr(PubsubHandler):
         mod['parent'] = self.__rt.uuid # make sure we use uuid from now on
         mod_uuid = mod.get('uuid')
         if mod_uuid: 
-            with self.__modules_lock:
-                if self.__modules.get(mod_uuid):
-                    raise InvalidArgument("uuid", "Module {} already exists".format(mod_uuid))
+            if mod_uuid in self.__modules or mod_uuid in self.__admission:
+                raise InvalidArgument("uuid", "Module {} already exists".format(mod_uuid))
         else: 
             raise InvalidArgument("uuid", "Module UUID is required")
 
-        logger.info(f"Starting module {mod_uuid}.")
-
         module = Module(self.__rt.topics.mio, **mod)
+        return CreateRequest(module, create_msg, reply, files_cache, spec=dict(mod))
+
+    def __admit_create(self, create_req):
+        """Admit a create request; returns a pending response if the create was admitted or queued, or a busy response"""
+        module = create_req.module
+        create_msg = create_req.msg
+
+        # modules that do not request cpus/memory get limits from their program profile (also charged to quotas)
+        if self.__profiles is not None:
+            limits = self.__profiles.limits(module)
+            if limits:
+                module.update_resources(limits)
+                create_req.spec['resources'] = module.resources
+                logger.debug(f"Module {module.uuid} limits from program profile: {limits}.")
+
+        # creates on a host under pressure are turned down (pressure_action reject; otherwise they are deferred in the queue)
+        if self.__pressure is not None and self.__rt.pressure_action == PressureAction.reject:
+            violation = self.__pressure.violation()
+            if violation is not None:
+                logger.info(f"Rejecting module {module.uuid}; {violation['desc']}.")
+                return module.confirm_msg(create_msg, result=Result.busy, details={ **violation,
+                    "retry_after_sec": max(self.__admission.retry_after(), int(self.__rt.host_pressure.get('interval_sec'))) })
+
+        # over-quota creates are turned down before they take a slot (or any files/container work)
+        charge, violation = self.__quotas.charge(module.namespace, module.tenant_scene, module.requested_cpus, module.requested_mem_mb)
+        if violation is not None:
+            logger.info(f"Rejecting module {module.uuid}; {violation.details()['desc']}.")
+            return module.confirm_msg(create_msg, result=Result.busy, details=violation.details())
+        create_req.quota = charge
+
+        admission = self.__admission.offer(module.uuid, create_req)
+        if admission == Admission.rejected:
+            charge.release()
+            logger.info(f"Runtime busy; rejecting module {module.uuid}.")
+            details = {
+                "desc": "runtime busy; create queue is full",
+                "retry_after_sec": self.__admission.retry_after(),
+                "max_nmodules": self.__admission.capacity,
+                "queued": self.__admission.queued }
+            if self.__admission.held: details["pressure"] = self.__pressure_sample()
+            return module.confirm_msg(create_msg, result=Result.busy, details=details)
+        if admission == Admission.queued:
+            logger.info(f"Module {module.uuid} waiting for a free slot ({self.__admission.queued} queued{', host under pressure' if self.__admission.held else ''}).")
+            create_queue_timeout_sec = self.__rt.create_queue_timeout_sec
+            if create_queue_timeout_sec:
+                self.__scheduler.call_later(create_queue_timeout_sec, self.__admission_expiry)
+            return module.confirm_msg(create_msg, result=Result.pending)
+
+        try:
+            self.__start_create(create_req)
+        except Exception:
+            charge.release()
+            self.__release_slot()
+            raise
+
+        # ack create request right away
+        return module.confirm_msg(create_msg, result=Result.pending)
+
+    def __start_create(self, create_req):
+        """Register an admitted module and hand its create to a create worker"""
+        logger.info(f"Starting module {create_req.module.uuid}.")
 
-        mngr_module = MngrModule(module, self.__pubsub_client)
-        with self.__modules_lock:
-            self.__modules[module.uuid] = mngr_module
+        mngr_module = MngrModule(create_req.module, self.__pubsub_client, prepare_only=create_req.prepare_only, spec=create_req.spec)
+        mngr_module.quota = create_req.quota
+        self.__modules[create_req.module.uuid] = mngr_module
+
+        # files fetch and container start run on a create worker; it sends the final confirm/error
+        try:
+            self.__create_pool.submit(self.__create_pipeline, mngr_module, create_req)
+        except Exception:
+            # e.g. the pool is shut down; the caller frees the slot and answers the create
+            self.__modules.pop(create_req.module.uuid, expected=mngr_module)
+            raise
+
+    def __release_slot(self):
+        """A module left; start creates admitted from the queue and drop expired ones"""
+        admitted, expired = self.__admission.release()
+        self.__handle_admission(admitted, expired)
+
+    def __handle_admission(self, admitted, expired):
+        """Start creates admitted from the admission queue; respond to creates that expired waiting"""
+        for create_req in expired:
+            module = create_req.module
+            if create_req.quota is not None: create_req.quota.release()
+            logger.info(f"Module {module.uuid} expired in the create queue.")
+            create_req.reply(module.confirm_msg(create_req.msg, result=Result.err, details={
+                "desc": "create expired", 
+                "data": f"Module {module.uuid} waited more than {self.__rt.create_queue_timeout_sec}s for a free slot" }))
+
+        for create_req in admitted:
+            try:
+                self.__start_create(create_req)
+            except Exception as err:
+                # e.g. the create pool is shut down (a slot freed while exiting); runs on module exit threads, do not raise
+                if isinstance(err, RuntimeException): err_details = err.error_msg_payload()
+                else: err_details = {"desc": "Uncaught exception", "data": str(err)}
+                if create_req.quota is not None: create_req.quota.release()
+                self.__release_slot()
+                create_req.reply(create_req.module.confirm_msg(create_req.msg, result=Result.err, details=err_details))
+
+    def __admission_expiry(self):
+        """Scheduled when a create is queued, at its deadline; drops queued creates that waited past their deadline"""
+        self.__handle_admission(*self.__admission.expire())
+
+    def __create_pipeline(self, mngr_module, create_req):
+        """Create worker; runs the create stages (fetch files, create container, start container, attach streamer) 
+           and sends the create confirm, or an error response if any stage fails. 
+           Prepare requests stop after creating the container and park the module until a start request"""
+        module = mngr_module.module
+        try:
+            mngr_module.fetch_files(create_req.files_cache)
+            mngr_module.create_container(lambda: self.__module_exit(module.uuid, mngr_module))
+            # prepare: park the module; unless a start request arrived while we were preparing
+            start_req = mngr_module.prepared() if mngr_module.prepare_only else None
+        except Exception as err:
+            err_details = self.__launch_failed(mngr_module, err)
+            create_req.reply(module.confirm_msg(create_req.msg, result=Result.err, details=err_details))
+            if mngr_module.start_request:
+                (start_msg, reply) = mngr_module.start_request
+                reply(module.confirm_msg(start_msg, result=Result.err, details=err_details))
+            return
+
+        if mngr_module.prepare_only:
+            create_req.reply(module.confirm_msg(create_req.msg))
+            if not start_req: return
+            (start_msg, reply) = start_req
+            self.__start_prepared(mngr_module, start_msg, reply)
+        else:
+            self.__start_prepared(mngr_module, create_req.msg, create_req.reply)
+
+    def __start_prepared(self, mngr_module, start_msg: PubsubMessage, reply):
+        """Start a module whose container was created; reply receives the confirm or error response"""
+        module = mngr_module.module
+        try:
+            mngr_module.start_container()
+            mngr_module.attach_streamer(lambda: self.__module_input(mngr_module))
+        except Exception as err:
+            reply(module.confirm_msg(start_msg, result=Result.err, details=self.__launch_failed(mngr_module, err)))
+            return
+        if self.__journal is not None: self.__journal.add(module.uuid, mngr_module.spec, mngr_module.launcher_state())
+        if self.__profiles is not None and not mngr_module.prepare_only:
+            self.__profiles.started(module, time.monotonic() - mngr_module.created_at)
+        self.__module_running(mngr_module)
+        reply(module.confirm_msg(start_msg))
 
-        mngr_module.start(lambda: self.__module_exit(module.uuid))
+    def __launch_failed(self, mngr_module, err: Exception):
+        """A create/prepare/start stage failed or was cancelled; forget the module, remove anything
+           left behind (container, program files) and return the error details"""
+        if isinstance(err, RuntimeException):
+            err_details = err.error_msg_payload()
+        else:
+            logger.warning(traceback.format_exc())
+            err_details = {"desc": "Uncaught exception", "data": str(err)}
+
+        if self.__forget_module(mngr_module): self.__release_slot()
+        # a cancelled module is removed right away (no graceful stop)
+        if not mngr_module.cancelled and mngr_module.state not in (ModuleState.pending, ModuleState.fetching):
+            try:
+                mngr_module.stop()
+            except LauncherException:
+                pass
+        self.__cleanup_module(mngr_module)
+
+        return err_details
+
+    def __forget_module(self, mngr_module) -> bool:
+        """Remove mngr_module from the module list (if it is still the module registered with its uuid); returns True if removed"""
+        mod_uuid = mngr_module.module.uuid
+        if self.__modules.pop(mod_uuid, expected=mngr_module) is None: return False
+        if self.__journal is not None: self.__journal.remove(mod_uuid)
+        mngr_module.cancel_timers()
+        if mngr_module.quota is not None: mngr_module.quota.release()
+        return True
+
+    def __adopt_modules(self):
+        """Register the modules in the journal and hand them to create workers to adopt their containers"""
+        if self.__journal is None: return
+        entries = self.__journal.entries()
+        if not entries: return
+
+        logger.info(f"Adopting {len(entries)} modules from journal.")
+        for mod_uuid, entry in entries.items():
+            try:
+                spec = entry['spec']
+                module = Module(self.__rt.topics.mio, **spec)
+                resources = (module.requested_cpus, module.requested_mem_mb)
+                mngr_module = MngrModule(module, self.__pubsub_client, spec=spec)
+            except Exception as err:
+                logger.warning(f"Invalid journal entry for module {mod_uuid}: {err}")
+                self.__journal.remove(mod_uuid)
+                continue
+            # adopted modules hold a slot and are charged to their quotas, even beyond capacity/limits
+            mngr_module.quota, _ = self.__quotas.charge(module.namespace, module.tenant_scene, *resources, force=True)
+            self.__modules[mod_uuid] = mngr_module
+            self.__admission.acquire()
+            self.__submit(self.__create_pool, self.__adopt_pipeline, mngr_module, entry.get('launcher'))
+
+    def __adopt_pipeline(self, mngr_module, launcher_state):
+        """Create worker; take over the running container (and program files) of a module started by a previous runtime 
+           process. Modules no longer running are forgotten, their program files removed (and a module delete is published)"""
+        module = mngr_module.module
+        adopted = False
+        try:
+            adopted = mngr_module.adopt(lambda: self.__module_exit(module.uuid, mngr_module), launcher_state)
+            if adopted: 
+                mngr_module.attach_streamer(lambda: self.__module_input(mngr_module))
+                self.__module_running(mngr_module)
+                logger.info(f"Adopted module {module.uuid}.")
+                return
+        except Exception as err:
+            logger.error(f"Adopting module {module.uuid} failed: {err}")
+            if adopted:
+                # running, but we cannot manage it
+                try:
+                    mngr_module.stop()
+                except Exception:
+                    pass
+
+        logger.info(f"Module {module.uuid} is no longer running.")
+        if self.__forget_module(mngr_module): self.__release_slot()
+        self.__cleanup_module(mngr_module)
+        self.__pubsub_client.message_publish(module.delete_msg())
+
+    def __cleanup_module(self, mngr_module):
+        """Remove the container and program files of a module that did not start (or was cancelled)"""
+        try:
+            mngr_module.cleanup()
+        except Exception as err:
+            logger.warning(f"Cleanup of module {mngr_module.module.uuid} failed: {err}")
+
+    def __prepare_module(self, prepare_msg: PubsubMessage):
+        """Handle prepare message; like a create, but the module is parked once its container is created"""
+        create_req = self.__create_request(prepare_msg.get('data'), prepare_msg, self.__respond)
+        create_req.prepare_only = True
+        return self.__admit_create(create_req)
+
+    def __start_module(self, start_msg: PubsubMessage):
+        """Handle start message; starts a prepared module (or flags it to start once prepared)"""
+        mod_uuid = start_msg.get('data').get('uuid')
+        if not mod_uuid: 
+            raise MissingField("UUID field missing (trying to start)")
+
+        mngr_module = self.__modules.get(mod_uuid)
+        if not mngr_module:
+            raise InvalidArgument("uuid", "Module {} does not exist (trying to start)".format(mod_uuid))
+
+        if not mngr_module.request_start(start_msg, self.__respond):
+            # still preparing; the create worker starts it when done
+            return mngr_module.module.confirm_msg(start_msg, result=Result.pending)
+
+        logger.info(f"Starting prepared module {mod_uuid}.")
+        self.__start_prepared(mngr_module, start_msg, self.__respond)
+
+    def __resume_module(self, resume_msg: PubsubMessage):
+        """Handle resume message; resumes a hibernated module (confirmed also if the module is not hibernated)"""
+        mod_uuid = resume_msg.get('data').get('uuid')
+        if not mod_uuid: 
+            raise MissingField("UUID field missing (trying to resume)")
+
+        mngr_module = self.__modules.get(mod_uuid)
+        if not mngr_module:
+            raise InvalidArgument("uuid", "Module {} does not exist (trying to resume)".format(mod_uuid))
+
+        resumed = self.__resume(mngr_module)
+        return mngr_module.module.confirm_msg(resume_msg, details={'resumed': resumed, 'state': mngr_module.state})
+
+    def __for_runtime(self, query_msg: PubsubMessage) -> bool:
+        """True if a runtime query is for this runtime (its parent is the runtime uuid or name)"""
+        parent = (query_msg.get('data') or {}).get('parent')
+        if not parent:
+            raise MissingField(f"parent field missing ({query_msg.get('action')} request)")
+        return parent in (self.__rt.uuid, self.__rt.name)
+
+    def __list_modules(self, list_msg: PubsubMessage):
+        """Handle list message; the modules (attributes, state and stats sampled at the last keepalive) of the runtime"""
+        if not self.__for_runtime(list_msg): return None
+        if self.__shards is not None:
+            modules = [child for child in self.__shards.children() if child]
+        else:
+            modules = [m.status() for m in self.__modules.values()]
+        return self.__rt.confirm_msg(list_msg, details={'modules': modules})
+
+    def __module_status(self, status_msg: PubsubMessage):
+        """Handle status message; state and stats sampled at the last keepalive of a module"""
+        mod_uuid = (status_msg.get('data') or {}).get('uuid')
+        if not mod_uuid: 
+            raise MissingField("UUID field missing (trying to get status)")
 
-        # confirm create request
-        return module.confirm_msg(create_msg)
+        mngr_module = self.__modules.get(mod_uuid)
+        if not mngr_module:
+            raise InvalidArgument("uuid", "Module {} does not exist (trying to get status)".format(mod_uuid))
+        return mngr_module.module.confirm_msg(status_msg, details=mngr_module.status())
+
+    def __runtime_capacity(self, capacity_msg: PubsubMessage):
+        """Handle capacity message; capacity, admission and load of the runtime"""
+        if not self.__for_runtime(capacity_msg): return None
+        details = {'max_nmodules': self.__rt.max_nmodules}
+        if self.__shards is not None:
+            details['modules'] = len([child for child in self.__shards.children() if child])
+        else:
+            details.update(modules=len(self.__modules), admitted=self.__admission.active, queued=self.__admission.queued,
+                           free=max(0, self.__admission.capacity - self.__admission.active), admission_held=self.__admission.held,
+                           quota=self.__quotas.usage(TenantQuotas.RUNTIME, ''))
+            expected_load = self.__expected_load()
+            if expected_load is not None: details['expected_load'] = {k: round(v, 3) for k, v in expected_load.items()}
+            hosts = LauncherContext.hosts_usage()
+            if hosts is not None: details['hosts'] = hosts
+        pressure = self.__pressure_sample()
+        if pressure is not None: details['pressure'] = pressure
+        return self.__rt.confirm_msg(capacity_msg, details=details)
+
+    def __update_module(self, update_msg: PubsubMessage):
+        """Handle update message; changes the resource limits of a running module in place and confirms with the limits applied"""
+        data = update_msg.get('data')
+        mod_uuid = data.get('uuid')
+        if not mod_uuid: 
+            raise MissingField("UUID field missing (trying to update)")
+
+        mngr_module = self.__modules.get(mod_uuid)
+        if not mngr_module:
+            raise InvalidArgument("uuid", "Module {} does not exist (trying to update)".format(mod_uuid))
+        limits = Module.check_resource_limits(data.get('resources'))
+        module = mngr_module.module
+
+        # the module quotas are charged the new cpus and memory before the container gets them
+        quota = mngr_module.quota
+        charged = (quota.cpus, quota.mem_mb) if quota is not None else None
+        if quota is not None:
+            violation = quota.resize(limits.get('cpus', quota.cpus), limits.get('mem_mb', quota.mem_mb))
+            if violation:
+                logger.info(f"Update of module {mod_uuid} over quota: {violation.details()}")
+                return module.confirm_msg(update_msg, result=Result.busy, details=violation.details())
+
+        try:
+            applied = mngr_module.update_resources(limits)
+            if applied is None:
+                raise InvalidArgument("uuid", "Module {} is not running (trying to update)".format(mod_uuid))
+        except Exception:
+            if quota is not None: quota.resize(*charged)
+            raise
+
+        if self.__journal is not None: self.__journal.add(mod_uuid, mngr_module.spec, mngr_module.launcher_state())
+        logger.info(f"Updated module {mod_uuid} resources: {applied}")
+        return module.confirm_msg(update_msg, details={'resources': applied})
 
     def __delete_module(self, delete_msg):
         """Handle delete message."""
@@ -323,32 +1178,142 @@ class RuntimeMngr(PubsubHandler):
         mod_uuid = delete_msg.get('data').get('uuid')
         if not mod_uuid: 
             raise MissingField("UUID field missing (trying to delete)")
-        
+
+        self.__stop_module(mod_uuid, delete_msg, self.__respond)
+
+    def __bulk_delete_modules(self, bulk_msg: PubsubMessage):
+        """Handle bulk delete message; answered with one aggregated confirm once all modules exited"""
+        mod_specs = bulk_msg.get('data').get('modules')
+        if not isinstance(mod_specs, list):
+            if self.__shard is not None: return None # the supervisor answers the error
+            raise InvalidArgument("modules", "Bulk delete requires a list of modules", bulk_msg)
+
+        mod_specs = self.__shard_specs(mod_specs)
+        logger.info(f"Bulk delete of {len(mod_specs)} modules.")
+
+        batch = BatchRequest(len(mod_specs), lambda results: self.__bulk_done(bulk_msg, results))
+        for mod in mod_specs:
+            # accept module objects or module uuids
+            mod_uuid = mod.get('uuid') if isinstance(mod, dict) else mod
+            try:
+                self.__stop_module(mod_uuid, bulk_msg, lambda resp, mod_uuid=mod_uuid: batch.done(mod_uuid, resp))
+            except RuntimeException as rte:
+                batch.add(mod_uuid, Result.err, rte.error_msg_payload())
+
+        results = batch.seal()
+        if results is not None: return self.__bulk_complete(bulk_msg, results)
+        if self.__shard is not None: return None # the supervisor acks the request
+        return self.__rt.confirm_msg(bulk_msg, result=Result.pending, details={'modules': len(mod_specs)})
+
+    def __stop_module(self, mod_uuid, delete_msg: PubsubMessage, reply):
+        """Stop a module; reply receives the delete confirm once the module exits 
+           (or right away if the module was not running yet and its create is cancelled)"""
         logger.info(f"Stopping module {mod_uuid}.")
+
+        # a create waiting for a free slot is just dropped
+        create_req = self.__admission.remove(mod_uuid)
+        if create_req:
+            logger.info(f"Module {mod_uuid} removed from the create queue.")
+            if create_req.quota is not None: create_req.quota.release()
+            cancelled = CreateCancelled(f"Module {mod_uuid} deleted while waiting for a free slot")
+            create_req.reply(create_req.module.confirm_msg(create_req.msg, result=Result.err, details=cancelled.error_msg_payload()))
+            reply(create_req.module.confirm_msg(delete_msg))
+            return
         
-        with self.__modules_lock:
-            try:
-                mod_mngr = self.__modules[mod_uuid]
-            except KeyError as ke:
-                raise InvalidArgument("uuid", "Module {} does not exist (trying to delete)".format(mod_uuid)) from ke
+        try:
+            mod_mngr = self.__modules[mod_uuid]
+        except KeyError as ke:
+            raise InvalidArgument("uuid", "Module {} does not exist (trying to delete)".format(mod_uuid)) from ke
+
+        if mod_mngr.cancel():
+            # create in flight (or module prepared); the create worker stops at the next stage and 
+            # cleans up (it answers the create with an error); confirm delete right away
+            logger.info(f"Cancelled create of module {mod_uuid}.")
+            if self.__forget_module(mod_mngr): self.__release_slot()
+            if not mod_mngr.in_create:
+                # parked module; no create worker to clean up after it
+                self.__submit(self.__create_pool, self.__cleanup_module, mod_mngr)
+            reply(mod_mngr.module.confirm_msg(delete_msg))
+            return
+
+        # save pending delete message to be sent later;
+        # will be sent when a module exit notification is received, or on timeout if it does not arrive in time
+        confirm = (mod_mngr.module.confirm_msg(delete_msg), reply)
+        grace_sec = self.__stop_grace_sec(mod_mngr)
+        with self.__pending_delete_lock:
+            pending = self.__pending_delete_msgs.get(mod_uuid)
+            if pending is not None:
+                # already being deleted (e.g. a retried request); keep its deadline and confirm both on exit
+                logger.info(f"Module {mod_uuid} is already being deleted.")
+                pending[0].append(confirm)
+                return
+            mod_mngr.state = ModuleState.stopping
+            timeout_call = None
+            if self.__rt.delete_timeout_sec:
+                timeout_call = self.__scheduler.call_later((grace_sec or 0) + self.__rt.delete_timeout_sec, 
+                    self.__delete_timed_out, mod_uuid, mod_mngr)
+            self.__pending_delete_msgs[mod_uuid] = ([confirm], timeout_call)
+
+        # NOTE: the delete confirm will be sent by module exit handler
+        self.__submit(self.__delete_pool, self.__stop_worker, mod_mngr, grace_sec)
 
-        # NOTE: a delete module will be sent by module exit handler
+    def __stop_grace_sec(self, mngr_module):
+        """Seconds the module has to exit after SIGTERM; the module value overrides the runtime default"""
+        grace_sec = mngr_module.module.stop_grace_sec
+        return grace_sec if grace_sec is not None else self.__rt.stop_grace_sec
+
+    def __stop_worker(self, mngr_module, grace_sec):
+        """Delete worker; stops a module (it is killed if it did not exit after grace_sec)"""
         try:
-            mod_mngr.stop()
+            mngr_module.stop(grace_sec)
         except LauncherException:
             logger.warning("Module not running.")
+            self.__module_exit(mngr_module.module.uuid, mngr_module)
+        except Exception as err:
+            # leave it to the delete timeout to confirm the delete
+            logger.error(f"Stopping module {mngr_module.module.uuid} failed: {err}")
 
-            self.__module_exit(mod_mngr.module.uuid)
+    def __delete_timed_out(self, mod_uuid, mngr_module):
+        """Scheduled per delete; the module did not exit in time. Forget it, confirm the delete and remove its container"""
+        mngr_mod = self.__modules.get(mod_uuid)
+        if mngr_mod is not mngr_module:
+            # module already gone (exit notification cancels this call; we might have raced it)
+            return
 
-        # save pending delete message to be sent later;
-        # will be sent when a module exit notification is received
-        # TODO: add some timeout mechanism
-        self.__pending_delete_msgs[mod_uuid] = mod_mngr.module.confirm_msg(delete_msg)
+        logger.warning(f"Module {mod_uuid} did not exit in time; confirming delete.")
+        self.__module_exit(mod_uuid, mngr_mod)
+        self.__submit(self.__delete_pool, self.__cleanup_module, mngr_mod)
+
+class CreateRequest():
+    """A module create on its way through admission and the create pipeline"""
+
+    def __init__(self, module: Module, msg: PubsubMessage, reply: Callable[[PubsubMessage], None], files_cache: ProgramFilesCache=None, spec: Dict=None):
+        """
+            Arguments
+            ---------
+                module:
+                    module object
+                msg:
+                    the request message (create or bulk create)
+                reply:
+                    a callable receiving the final response (create confirm or error)
+                files_cache:
+                    program files shared with other modules created in the same request
+                spec:
+                    module data received in the request (recorded in the module journal)
+        """
+        self.module = module
+        self.msg = msg
+        self.reply = reply
+        self.files_cache = files_cache
+        self.spec = spec
+        self.prepare_only = False # prepare requests park the module once its container is created
+        self.quota = None # charge against the namespace and scene quotas, once checked
         
 class MngrModule():
     """Keep a module instance and a module laucher for each module started"""        
     
-    def __init__(self, module: Module, pubsubc: PubsubListner):
+    def __init__(self, module: Module, pubsubc: PubsubListner, prepare_only: bool=False, spec: Dict=None):
         """
             Arguments
             ---------
@@ -356,16 +1321,159 @@ class MngrModule():
                     module object
                 pubsubc:
                     a pubsub client object the module streamer uses to publish messages
+                prepare_only:
+                    module is parked once its container is created, until a start request
+                spec:
+                    module data received in the create request
         """
         self.module = module
+        self.spec = spec if spec is not None else dict(module)
+        self.state = ModuleState.pending
+        self.prepare_only = prepare_only
+        self.start_request = None # (start msg, reply) received while preparing
+        self.in_create = True # a create worker is running the module create stages
+        self.cancelled = False
         self.last_active_at = time.time()
+        self.timers = [] # scheduled calls for the module (inactivity checks, lifetime expiry)
+        self.quota = None # charge against the namespace and scene quotas; released when the module leaves
+        self.created_at = time.monotonic() # when the module was admitted (startup time of its program profile)
+        self.started_at = None # when the module first started running
+        self.failures = deque() # times the module exited on its own and was restarted
+        self.stats = None # stats sampled at the last keepalive, and when (answer queries)
+        self.stats_at = None
+        self.__lock = threading.Lock()
 
         # setup launcher, force container name to match module name
         self.module_launcher = LauncherContext.get_launcher_for_module(module, pubsubc=pubsubc)
 
     def start(self, on_module_exit_call):
         return self.module_launcher.start_module(on_module_exit_call)
+
+    def status(self) -> Dict:
+        """Module attributes, state and the stats sampled last; docker is not asked"""
+        status = self.module.keepalive_attrs(self.stats or {})
+        status.update(state=self.state, stats_at=self.stats_at)
+        return status
+
+    def __enter_state(self, state):
+        """Move to the next create stage; raises CreateCancelled if the create was cancelled"""
+        with self.__lock:
+            if self.cancelled:
+                raise CreateCancelled(f"Module {self.module.uuid} deleted while {self.state}")
+            self.state = state
+
+    def cancel(self) -> bool:
+        """Cancel the module create; returns False if the module is already running (or stopping) and has to be stopped"""
+        with self.__lock:
+            if self.state in (ModuleState.running, ModuleState.hibernated, ModuleState.stopping): return False
+            self.cancelled = True
+            self.state = ModuleState.stopping
+        return True
+
+    def fetch_files(self, files_cache: ProgramFilesCache=None):
+        self.__enter_state(ModuleState.fetching)
+        self.module_launcher.fetch_files(files_cache)
+
+    def create_container(self, on_module_exit_call):
+        self.__enter_state(ModuleState.starting)
+        self.module_launcher.create_container(on_module_exit_call)
+
+    def start_container(self):
+        self.__enter_state(ModuleState.starting)
+        self.module_launcher.start_container()
+
+    def update_resources(self, limits: Dict) -> Dict:
+        """Change the resource limits of the running (or hibernated) module; returns the limits applied, None if it is not running"""
+        with self.__lock:
+            if self.state not in (ModuleState.running, ModuleState.hibernated): return None
+            applied = self.module_launcher.update_resources(limits)
+            # restarted (or adopted) containers get the new limits too
+            self.module.update_resources(limits)
+            self.spec['resources'] = self.module.resources
+        return applied
+
+    def hibernate(self) -> bool:
+        """Freeze the running module; returns False if it is not running"""
+        with self.__lock:
+            if self.state != ModuleState.running: return False
+            self.module_launcher.pause_module()
+            self.state = ModuleState.hibernated
+        return True
+
+    def resume(self) -> bool:
+        """Resume the hibernated module; returns False if it is not hibernated"""
+        with self.__lock:
+            if self.state != ModuleState.hibernated: return False
+            self.module_launcher.resume_module()
+            self.state = ModuleState.running
+            self.last_active_at = time.time()
+        return True
+
+    def crashed(self) -> bool:
+        """The running module exited on its own; returns False if it is being stopped (or not running)"""
+        with self.__lock:
+            if self.state != ModuleState.running: return False
+            self.state = ModuleState.restarting
+        return True
+
+    def restart(self, on_module_exit_call):
+        with self.__lock:
+            if self.cancelled:
+                raise CreateCancelled(f"Module {self.module.uuid} deleted while {self.state}")
+            self.state = ModuleState.starting
+            self.in_create = True
+        self.module_launcher.restart_container(on_module_exit_call)
+
+    def exit_code(self):
+        return self.module_launcher.exit_code()
+
+    def adopt(self, on_module_exit_call, launcher_state: Dict=None) -> bool:
+        self.__enter_state(ModuleState.starting)
+        return self.module_launcher.adopt_container(on_module_exit_call, launcher_state)
+
+    def launcher_state(self) -> Dict:
+        """What another runtime process needs to adopt the module (recorded in the module journal)"""
+        return self.module_launcher.launcher_state()
+
+    def prepared(self):
+        """Container created for a prepare request; park the module, or return the (start msg, reply) received meanwhile"""
+        with self.__lock:
+            if self.cancelled:
+                raise CreateCancelled(f"Module {self.module.uuid} deleted while {self.state}")
+            if self.start_request: return self.start_request
+            self.state = ModuleState.prepared
+            self.in_create = False
+        return None
+
+    def request_start(self, start_msg: PubsubMessage, reply) -> bool:
+        """Returns True if the module is prepared and can be started now; 
+           False if it is still preparing (start is done when prepared)"""
+        with self.__lock:
+            if self.state == ModuleState.prepared:
+                self.state = ModuleState.starting
+                self.in_create = True
+                return True
+            if self.prepare_only and not self.start_request and self.state in (ModuleState.pending, ModuleState.fetching, ModuleState.starting):
+                self.start_request = (start_msg, reply)
+                return False
+            state = self.state
+        raise InvalidArgument("uuid", "Module {} is not prepared (state: {})".format(self.module.uuid, state))
+
+    def attach_streamer(self, input_notify: Callable=None):
+        self.module_launcher.attach_streamer(input_notify)
+        self.__enter_state(ModuleState.running)
+        self.in_create = False
     
-    def stop(self):
-        self.module_launcher.stop_module()
+    def stop(self, grace_sec: float=None):
+        self.module_launcher.stop_module(grace_sec)
+
+    def detach(self):
+        self.module_launcher.detach()
+
+    def cancel_timers(self):
+        for timer in self.timers: timer.cancel()
+        self.timers = []
+
+    def cleanup(self):
+        self.module_launcher.cleanup()
 
@@ -0,0 +1,165 @@
+"""
+*TL;DR
+Deadline scheduler; one thread runs all the timed work of the runtime (keepalives, registration
+retries, per-module inactivity checks and lifetime expiry, delete and admission timeouts)
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Callable, List
+from logzero import logger
+
+class ScheduledCall():
+    """A call due at a deadline (repeated every interval, if given); returned by the scheduler so it can be cancelled"""
+
+    __slots__ = ('when', 'seq', 'fn', 'args', 'interval', 'cancelled', 'queued', '__scheduler')
+
+    def __init__(self, scheduler, when: float, seq: int, fn: Callable, args: tuple, interval: float=None) -> None:
+        self.when = when
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+        self.queued = False
+        self.__scheduler = scheduler
+
+    def __lt__(self, other: 'ScheduledCall') -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self) -> None:
+        """Cancel the call; no-op if it already ran (a running periodic call is not repeated)"""
+        self.__scheduler.cancel(self)
+
+class Scheduler():
+    """
+        Deadline heap served by a single thread (started with the first call scheduled); the thread sleeps
+        until the earliest deadline, so the cost is per due call, not per call scheduled.
+        Cancelled calls are dropped lazily (the heap is compacted once they are the majority)
+
+        Arguments
+        ---------
+            executor:
+                where due calls run; calls run on the scheduler thread if not given.
+                A periodic call is rescheduled once it returns, so it never overlaps itself
+            name:
+                scheduler thread name
+    """
+
+    _COMPACT_MIN = 64
+
+    def __init__(self, executor: Executor=None, name: str='scheduler') -> None:
+        self.__executor = executor
+        self.__name = name
+        self.__heap: List[ScheduledCall] = []
+        self.__seq = itertools.count()
+        self.__cancelled = 0
+        self.__cond = threading.Condition()
+        self.__thread = None
+        self.__stopped = False
+
+    def call_later(self, delay_sec: float, fn: Callable, *args) -> ScheduledCall:
+        """Run fn(*args) once, delay_sec from now"""
+        return self.__push(time.monotonic() + max(0, delay_sec), fn, args)
+
+    def call_every(self, interval_sec: float, fn: Callable, *args, first_delay_sec: float=None) -> ScheduledCall:
+        """Run fn(*args) every interval_sec (first run after first_delay_sec; defaults to interval_sec)"""
+        if first_delay_sec is None: first_delay_sec = interval_sec
+        return self.__push(time.monotonic() + max(0, first_delay_sec), fn, args, interval_sec)
+
+    def cancel(self, call: ScheduledCall) -> None:
+        """Cancel a call; see ScheduledCall.cancel()"""
+        with self.__cond:
+            if call.cancelled: return
+            call.cancelled = True
+            if not call.queued: return
+            self.__cancelled += 1
+            if self.__cancelled > Scheduler._COMPACT_MIN and self.__cancelled * 2 > len(self.__heap):
+                self.__compact()
+
+    def stop(self, timeout_sec: float=1) -> None:
+        """Stop the scheduler thread; pending calls are dropped and calls scheduled from now on never run"""
+        with self.__cond:
+            self.__stopped = True
+            self.__heap.clear()
+            self.__cancelled = 0
+            self.__cond.notify()
+            thread = self.__thread
+        if thread and thread is not threading.current_thread(): thread.join(timeout_sec)
+
+    def __len__(self) -> int:
+        """Number of calls pending (not cancelled)"""
+        with self.__cond:
+            return len(self.__heap) - self.__cancelled
+
+    def __push(self, when: float, fn: Callable, args: tuple, interval: float=None) -> ScheduledCall:
+        call = ScheduledCall(self, when, next(self.__seq), fn, args, interval)
+        with self.__cond:
+            if self.__stopped: return call
+            self.__queue(call)
+            if not self.__thread:
+                self.__thread = threading.Thread(target=self.__run, name=self.__name, daemon=True)
+                self.__thread.start()
+        return call
+
+    def __queue(self, call: ScheduledCall) -> None:
+        """Add call to the heap; called with lock held"""
+        call.queued = True
+        heapq.heappush(self.__heap, call)
+        # wake the thread only if the earliest deadline changed
+        if self.__heap[0] is call: self.__cond.notify()
+
+    def __compact(self) -> None:
+        """Drop cancelled calls from the heap; called with lock held"""
+        self.__heap = [call for call in self.__heap if not call.cancelled]
+        heapq.heapify(self.__heap)
+        self.__cancelled = 0
+
+    def __next_due(self) -> ScheduledCall:
+        """Wait for the next due call; returns None once stopped"""
+        with self.__cond:
+            while not self.__stopped:
+                if not self.__heap:
+                    self.__cond.wait()
+                    continue
+                call = self.__heap[0]
+                if call.cancelled:
+                    heapq.heappop(self.__heap)
+                    call.queued = False
+                    self.__cancelled -= 1
+                    continue
+                delay = call.when - time.monotonic()
+                if delay > 0:
+                    self.__cond.wait(delay)
+                    continue
+                heapq.heappop(self.__heap)
+                call.queued = False
+                return call
+        return None
+
+    def __run(self) -> None:
+        """Scheduler thread; hands due calls to the executor (or runs them)"""
+        while True:
+            call = self.__next_due()
+            if call is None: break
+            if self.__executor:
+                try:
+                    self.__executor.submit(self.__run_call, call)
+                except RuntimeError:
+                    break # executor shutdown; we are exiting
+            else:
+                self.__run_call(call)
+
+    def __run_call(self, call: ScheduledCall) -> None:
+        """Run a due call; periodic calls are scheduled again (from when they were due, or now if late)"""
+        try:
+            call.fn(*call.args)
+        except Exception as err: # catch all so the scheduler does not stop
+            logger.error(f"Scheduler ({getattr(call.fn, '__name__', call.fn)}): {err}")
+        if call.interval is None: return
+        with self.__cond:
+            if call.cancelled or self.__stopped: return
+            call.when = max(call.when + call.interval, time.monotonic())
+            self.__queue(call)
@@ -0,0 +1,300 @@
+"""
+*TL;DR
+Sharded runtime (runtime.shards > 1): a supervisor process and N shard processes, each running its own
+runtime manager, launchers and streamers, so the per-module threads (streamers, container waits, stats
+calls) are spread across interpreters. Modules are hash-partitioned across shards by uuid.
+The supervisor registers the runtime (shards share its identity), sends keepalives listing the modules
+of all shards, and answers bulk requests with the results of all shards; shards handle the requests
+on the modules they own
+"""
+import copy
+import math
+import os
+import signal
+import tempfile
+import threading
+import time
+import zlib
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Mapping
+
+import logzero
+from logzero import logger
+
+from model import Result
+
+# messages from shards to the supervisor
+_MSG_CHILDREN = 'children'
+_MSG_BULK = 'bulk'
+
+def shard_of(mod_uuid, count: int) -> int:
+    """Shard (0..count-1) owning a module uuid; the same in every process (unlike hash())"""
+    return zlib.crc32(str(mod_uuid).encode()) % count
+
+def plain_settings(value):
+    """Settings as plain (picklable) dicts and lists"""
+    if isinstance(value, Mapping): return {k: plain_settings(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)): return [plain_settings(v) for v in value]
+    return value
+
+def shard_config(settings) -> Dict:
+    """Settings shard processes need (runtime, topics, mqtt), as plain dicts; the runtime uuid is shared"""
+    return { key: plain_settings(settings.get(key)) for key in ('runtime', 'topics', 'mqtt') }
+
+def _split_limits(limits: Dict, count: int) -> None:
+    """Split quota limits across shards (modules hash to shards evenly, so each gets its share)"""
+    if not limits: return
+    if limits.get('max_modules'): limits['max_modules'] = max(1, math.ceil(limits['max_modules'] / count))
+    for key in ('max_cpus', 'max_mem_mb', 'create_rate'):
+        if limits.get(key): limits[key] = limits[key] / count
+    if limits.get('create_burst'): limits['create_burst'] = max(1, limits['create_burst'] / count)
+
+def shard_settings(cfg: Dict, index: int, count: int) -> Dict:
+    """
+        Settings of shard index: the capacity (max_nmodules) and quotas of the runtime are split evenly
+        across shards, each shard keeps its own journal and program profiles, and connects with its own mqtt client id.
+        Shards always keep a journal (a temp file, if none is set), so a shard restarted after its process died
+        adopts the modules it left running
+    """
+    cfg = copy.deepcopy(cfg)
+    rt = cfg['runtime']
+    rt['shards'] = 0
+    if rt.get('max_nmodules'): rt['max_nmodules'] = max(1, math.ceil(rt['max_nmodules'] / count))
+    quotas = rt.get('quotas') or {}
+    _split_limits(quotas.get('namespace'), count)
+    _split_limits(quotas.get('scene'), count)
+    _split_limits(quotas.get('runtime'), count)
+    for limits in (quotas.get('overrides') or {}).values(): _split_limits(limits, count)
+    if rt.get('journal_path'): rt['journal_path'] = f"{rt['journal_path']}.shard{index}"
+    else: rt['journal_path'] = os.path.join(tempfile.gettempdir(), f"slruntime-{rt.get('uuid')}.journal.shard{index}")
+    profiles = rt.get('profiles') or {}
+    if profiles.get('path'): profiles['path'] = f"{profiles['path']}.shard{index}"
+    mqtt = cfg.get('mqtt') or {}
+    if mqtt.get('cid'): mqtt['cid'] = f"{mqtt['cid']}-shard{index}"
+    return cfg
+
+class ShardLink():
+    """
+        Shard process end of the connection to the supervisor
+
+        Arguments
+        ---------
+            index:
+                shard index (0..count-1)
+            count:
+                number of shards
+            conn:
+                connection to the supervisor
+    """
+
+    def __init__(self, index: int, count: int, conn: Connection) -> None:
+        self.index = index
+        self.count = count
+        self.__conn = conn
+        self.__lock = threading.Lock()
+
+    def owns(self, mod_uuid) -> bool:
+        """True if the module uuid is partitioned to this shard"""
+        return shard_of(mod_uuid, self.count) == self.index
+
+    def children(self, children: List) -> None:
+        """Hand the keepalive attributes of the shard modules to the supervisor"""
+        self.__send((_MSG_CHILDREN, children))
+
+    def bulk_done(self, object_id: str, results: List) -> None:
+        """Hand the module results of a bulk request (for the modules the shard owns) to the supervisor"""
+        self.__send((_MSG_BULK, object_id, results))
+
+    def __send(self, msg) -> None:
+        with self.__lock:
+            try:
+                self.__conn.send(msg)
+            except (OSError, EOFError) as err:
+                logger.warning(f"Shard {self.index}: supervisor connection lost ({err}).")
+
+    def wait_closed(self) -> None:
+        """Block until the supervisor closes the connection (shutdown)"""
+        while True:
+            try:
+                self.__conn.recv()
+            except (OSError, EOFError):
+                return
+
+def run_shard(index: int, count: int, cfg: Dict, conn: Connection) -> None:
+    """Shard process entry point; runs a runtime manager for the modules of the shard until the supervisor closes the connection"""
+    # imported here; runtime_mngr imports this module
+    from common import settings
+    from pubsub.listner import MQTTListner
+    from .runtime_mngr import RuntimeMngr
+
+    # shutdown is driven by the supervisor (ctrl-c reaches the whole process group)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logzero.loglevel(getattr(logzero, settings.loglevel))
+
+    shard = ShardLink(index, count, conn)
+    rtmngr = RuntimeMngr(shard=shard, **cfg)
+    MQTTListner(rtmngr, **cfg['mqtt'], error_topic=cfg['topics']['runtimes'])
+    logger.info(f"Shard {index}/{count} started.")
+
+    shard.wait_closed()
+    logger.info(f"Shard {index}/{count} stopping.")
+    rtmngr.exit()
+
+class _Bulk():
+    """Results of a bulk request from each shard"""
+
+    __slots__ = ('results', 'shards', 'failed', 'mod_uuids', 'on_complete', 'created_at')
+
+    def __init__(self) -> None:
+        self.results = []
+        self.shards = set()
+        self.failed = set() # shards that died before answering, while the modules of the request were not known yet
+        self.mod_uuids = None
+        self.on_complete = None
+        self.created_at = time.monotonic()
+
+class ShardSet():
+    """
+        Supervisor end; starts the shard processes (restarting those that die), keeps the last module
+        list each shard reported, and collects the shard results of bulk requests
+
+        Arguments
+        ---------
+            count:
+                number of shard processes
+            cfg:
+                runtime settings (shard_config()); each shard gets shard_settings()
+            restart_delay_sec:
+                seconds before a shard process that died is started again
+            bulk_ttl_sec:
+                seconds shard results of a bulk request the supervisor did not see are kept
+    """
+
+    def __init__(self, count: int, cfg: Dict, restart_delay_sec: float=1, bulk_ttl_sec: float=600) -> None:
+        self.count = count
+        self.__cfg = cfg
+        self.__restart_delay_sec = restart_delay_sec
+        self.__bulk_ttl_sec = bulk_ttl_sec
+        self.__ctx = multiprocessing.get_context('spawn') # no forking of a threaded process
+        self.__procs: Dict[int, tuple] = {} # (process, connection) by shard index
+        self.__children: Dict[int, List] = {} # last module list reported, by shard index
+        self.__bulks: Dict[str, _Bulk] = {} # by request object_id
+        self.__lock = threading.Lock()
+        self.__stopping = False
+
+    def start(self) -> None:
+        """Start the shard processes"""
+        logger.info(f"Starting {self.count} shards.")
+        for index in range(self.count): self.__start(index)
+
+    def __start(self, index: int) -> None:
+        conn, child_conn = self.__ctx.Pipe()
+        proc = self.__ctx.Process(target=run_shard, name=f"shard{index}",
+                                  args=(index, self.count, shard_settings(self.__cfg, index, self.count), child_conn))
+        proc.start()
+        child_conn.close()
+        with self.__lock:
+            self.__procs[index] = (proc, conn)
+        threading.Thread(target=self.__read, args=(index, proc, conn), name=f"shard{index}-reader", daemon=True).start()
+
+    def __read(self, index: int, proc, conn: Connection) -> None:
+        """Reader thread of a shard connection; restarts the shard if its process dies"""
+        while True:
+            try:
+                msg = conn.recv()
+            except (OSError, EOFError):
+                break
+            self.__received(index, msg)
+
+        if self.__stopping: return
+        proc.join(timeout=1)
+        logger.error(f"Shard {index} exited (exit code {proc.exitcode}); restarting it.")
+        # its containers are still running; the restarted shard adopts them from its journal (and publishes deletes 
+        # for those gone), so its modules are kept as last reported until it reports
+        with self.__lock:
+            completed = self.__fail_bulks(index)
+        for bulk in completed: bulk.on_complete(bulk.results)
+        time.sleep(self.__restart_delay_sec)
+        if not self.__stopping: self.__start(index)
+
+    def __received(self, index: int, msg) -> None:
+        """Message from shard index"""
+        if msg[0] == _MSG_CHILDREN:
+            with self.__lock:
+                self.__children[index] = msg[1]
+        elif msg[0] == _MSG_BULK:
+            self.__bulk_results(index, msg[1], msg[2])
+        else:
+            logger.warning(f"Unknown message from shard {index}: {msg[0]}")
+
+    def children(self) -> List:
+        """Keepalive attributes of the modules of all shards (as last reported)"""
+        with self.__lock:
+            return [child for children in self.__children.values() for child in children]
+
+    def collect(self, object_id: str, on_complete: Callable[[List], None], mod_uuids: List=None) -> None:
+        """Call on_complete with the module results of all shards for bulk request object_id (on modules mod_uuids), once
+           every shard reported; the modules of a shard that died before reporting get an error result"""
+        with self.__lock:
+            bulk = self.__bulk(object_id)
+            bulk.on_complete = on_complete
+            bulk.mod_uuids = list(mod_uuids or [])
+            for index in bulk.failed: self.__failed_results(bulk, index)
+            bulk.failed.clear()
+            complete = self.__complete(object_id, bulk)
+        if complete: on_complete(bulk.results)
+
+    def __bulk_results(self, index: int, object_id: str, results: List) -> None:
+        with self.__lock:
+            bulk = self.__bulk(object_id)
+            if index in bulk.shards: return # a restarted shard answered a retried request
+            bulk.shards.add(index)
+            bulk.results.extend(results)
+            complete = self.__complete(object_id, bulk)
+        if complete: bulk.on_complete(bulk.results)
+
+    def __fail_bulks(self, index: int) -> List[_Bulk]:
+        """Shard index died; it reported the bulk requests it has not answered (a restarted shard does not get them
+           again). Returns the bulk requests completed. Called with lock held"""
+        completed = []
+        for object_id, bulk in list(self.__bulks.items()):
+            if index in bulk.shards: continue
+            bulk.shards.add(index)
+            if bulk.mod_uuids is None: bulk.failed.add(index)
+            else: self.__failed_results(bulk, index)
+            if self.__complete(object_id, bulk): completed.append(bulk)
+        return completed
+
+    def __failed_results(self, bulk: _Bulk, index: int) -> None:
+        """Error results for the modules of a bulk request owned by shard index; called with lock held"""
+        bulk.results.extend({'uuid': mod_uuid, 'result': Result.err, 'details': {'desc': 'Shard exited', 'data': index}}
+                            for mod_uuid in bulk.mod_uuids if shard_of(mod_uuid, self.count) == index)
+
+    def __bulk(self, object_id: str) -> _Bulk:
+        """Results of a bulk request; results of requests never collected expire. Called with lock held"""
+        now = time.monotonic()
+        for stale_id in [oid for oid, b in self.__bulks.items() if now - b.created_at > self.__bulk_ttl_sec]:
+            del self.__bulks[stale_id]
+        bulk = self.__bulks.get(object_id)
+        if bulk is None: bulk = self.__bulks[object_id] = _Bulk()
+        return bulk
+
+    def __complete(self, object_id: str, bulk: _Bulk) -> bool:
+        """Check (and forget) a complete bulk request; called with lock held"""
+        if bulk.on_complete is None or len(bulk.shards) < self.count: return False
+        del self.__bulks[object_id]
+        return True
+
+    def stop(self, timeout_sec: float) -> None:
+        """Ask the shards to stop (they stop their modules) and wait for them up to timeout_sec; kill those still running"""
+        self.__stopping = True
+        with self.__lock:
+            procs = list(self.__procs.values())
+        for _, conn in procs: conn.close()
+        deadline = time.time() + timeout_sec
+        for proc, _ in procs:
+            proc.join(max(0, deadline - time.time()))
+            if proc.is_alive():
+                logger.warning(f"Shard {proc.name} did not stop in time; killing it.")
+                proc.kill()
@@ -0,0 +1,128 @@
+"""
+*TL;DR
+Microbenchmark of the module registry under concurrent create/delete/lookup/keepalive load;
+compares ModuleRegistry with the plain dict + single lock it replaced.
+Not a unit test (not collected by pytest/unittest); run from src/:
+
+    python -m tests.bench_module_registry [--modules 10000] [--seconds 3] [--writers 4] [--readers 4]
+
+Reports, per registry: create/delete and lookup throughput, and lookup and keepalive snapshot latency
+(p50/p99/max); lookup latency under load is where readers blocked behind writers and snapshots show up.
+"""
+import argparse
+import threading
+import time
+import uuid
+
+from runtime.registry import ModuleRegistry
+
+class LockedDict():
+    """The registry ModuleRegistry replaced: a dict with every access under one lock"""
+
+    def __init__(self) -> None:
+        self.__modules = {}
+        self.__lock = threading.Lock()
+
+    def get(self, mod_uuid, default=None):
+        with self.__lock:
+            return self.__modules.get(mod_uuid, default)
+
+    def __contains__(self, mod_uuid):
+        with self.__lock:
+            return mod_uuid in self.__modules
+
+    def __setitem__(self, mod_uuid, module):
+        with self.__lock:
+            self.__modules[mod_uuid] = module
+
+    def pop(self, mod_uuid, expected=None):
+        with self.__lock:
+            module = self.__modules.get(mod_uuid)
+            if module is None or (expected is not None and module is not expected): return None
+            return self.__modules.pop(mod_uuid)
+
+    def values(self):
+        with self.__lock:
+            return list(self.__modules.values())
+
+def _percentiles(samples):
+    if not samples: return (0, 0, 0)
+    samples = sorted(samples)
+    return (samples[len(samples) // 2], samples[int(len(samples) * 0.99)], samples[-1])
+
+def run(registry, nmodules: int, seconds: float, nwriters: int, nreaders: int, ka_interval_sec: float) -> dict:
+    """Prefill nmodules, then run writers (delete a module, create another), readers (lookups) and
+       a keepalive (snapshot and walk all modules) concurrently for seconds"""
+    uuids = [str(uuid.uuid4()) for _ in range(nmodules)]
+    for mod_uuid in uuids: registry[mod_uuid] = object()
+
+    stop = threading.Event()
+    writes = [0] * nwriters
+    reads = [0] * nreaders
+    read_lat = [[] for _ in range(nreaders)]
+    snapshot_lat = []
+
+    def writer(i):
+        # each writer churns its own slice of uuids, so the module count stays at nmodules
+        mine = uuids[i::nwriters]
+        n = 0
+        while not stop.is_set():
+            k = n % len(mine)
+            registry.pop(mine[k])
+            mine[k] = str(uuid.uuid4())
+            registry[mine[k]] = object()
+            n += 1
+        writes[i] = n
+
+    def reader(i):
+        n = 0
+        lat = read_lat[i]
+        while not stop.is_set():
+            t = time.perf_counter()
+            _ = uuids[n % nmodules] in registry
+            if n % 16 == 0: lat.append(time.perf_counter() - t)
+            n += 1
+        reads[i] = n
+
+    def keepalive():
+        while not stop.wait(ka_interval_sec):
+            t = time.perf_counter()
+            modules = registry.values()
+            for _ in modules: pass
+            snapshot_lat.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(nwriters)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(nreaders)]
+    threads.append(threading.Thread(target=keepalive))
+    for t in threads: t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads: t.join()
+
+    return {
+        'writes_per_sec': sum(writes) / seconds,
+        'reads_per_sec': sum(reads) / seconds,
+        'read_lat_us': [v * 1e6 for v in _percentiles([v for lat in read_lat for v in lat])],
+        'snapshot_lat_ms': [v * 1e3 for v in _percentiles(snapshot_lat)],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Module registry contention benchmark")
+    parser.add_argument('--modules', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--ka-interval', type=float, default=0.01, help="seconds between keepalive snapshots")
+    args = parser.parse_args()
+
+    print(f"{args.modules} modules, {args.writers} create/delete threads, {args.readers} lookup threads, "
+          f"keepalive snapshot every {args.ka_interval}s, {args.seconds}s per run")
+    print(f"{'registry':<16}{'create+del/s':>14}{'lookups/s':>12}{'lookup us p50/p99/max':>26}{'snapshot ms p50/p99/max':>28}")
+    for name, registry in [('dict+lock', LockedDict()), ('ModuleRegistry', ModuleRegistry())]:
+        res = run(registry, args.modules, args.seconds, args.writers, args.readers, args.ka_interval)
+        read_lat = "/".join(f"{v:.1f}" for v in res['read_lat_us'])
+        snapshot_lat = "/".join(f"{v:.2f}" for v in res['snapshot_lat_ms'])
+        print(f"{name:<16}{res['writes_per_sec']:>14.0f}{res['reads_per_sec']:>12.0f}{read_lat:>26}{snapshot_lat:>28}")
+
+if __name__ == '__main__':
+    main()
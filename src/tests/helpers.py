@@ -0,0 +1,122 @@
+"""
+Shared test fixtures: runtime settings, request builders and a TestCase base running a
+RuntimeMngr with mock launchers and a mock pubsub client (messages published are recorded)
+"""
+import copy
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from model import SlMsgs
+from runtime.runtime_mngr import RuntimeMngr
+
+RT_UUID = "deadbeef-dead-beef-dead-beefdeadbeef"
+
+RT_CFG = {
+    "runtime": {
+        "uuid": RT_UUID,
+        "name": "unit-test-rt",
+        "runtime_type": "containerized-modules",
+        "max_nmodules": 10,
+        "apis": "python:python3",
+        "realm": "realm",
+        "namespace": "public",
+        "reg_attempts": -1,
+        "reg_timeout_seconds": 5,
+        "reg_fail_error": False,
+        "ka_interval_sec": None,
+        "is_orchestration_runtime": False,
+        "tags": [],
+        "create_workers": 2,
+    },
+    "topics": {
+        "runtimes": "realm/runtimes",
+        "modules": "realm/modules",
+        "mio": "realm/s/{namespaced_scene}/p/{module_uuid}",
+    }
+}
+
+
+def rt_cfg(**runtime):
+    """Runtime settings (a copy) with runtime settings changed"""
+    cfg = copy.deepcopy(RT_CFG)
+    cfg['runtime'].update(runtime)
+    return cfg
+
+
+def req_msg(action, data):
+    """Request as the orchestrator would send it."""
+    return SlMsgs('orchestrator').req('realm/modules', action, data, convert=False)
+
+
+def mod_spec(mod_uuid, **attrs):
+    """Module create attributes"""
+    return {'uuid': mod_uuid, 'name': f"mod-{mod_uuid}", 'file': 'test.py',
+            'filetype': 'PY', 'location': 'arena/test', **attrs}
+
+
+def create_msg(mod_uuid, parent=RT_UUID, **mod_attrs):
+    return req_msg('create', mod_spec(mod_uuid, parent=parent, **mod_attrs))
+
+
+def prepare_msg(mod_uuid):
+    return req_msg('prepare', mod_spec(mod_uuid, parent=RT_UUID))
+
+
+def start_msg(mod_uuid):
+    return req_msg('start', {'uuid': mod_uuid})
+
+
+def delete_msg(mod_uuid):
+    return req_msg('delete', {'uuid': mod_uuid})
+
+
+class RuntimeTestCase(unittest.TestCase):
+    """Runs a RuntimeMngr (start_runtime) without docker or mqtt; self.published has the messages it published"""
+
+    def patch_launcher(self, launcher=None, side_effect=None):
+        """Launchers of modules are launcher (a MagicMock if not given), or made by side_effect(module, ...); self.get_launcher is the mock"""
+        if launcher is None and side_effect is None: launcher = MagicMock()
+        patcher = patch('runtime.runtime_mngr.LauncherContext.get_launcher_for_module',
+                        return_value=launcher, side_effect=side_effect)
+        self.get_launcher = patcher.start()
+        self.addCleanup(patcher.stop)
+        return launcher
+
+    def start_runtime(self, cfg=None, mngr_args=None, **runtime) -> RuntimeMngr:
+        """RuntimeMngr (and mngr_args) with settings cfg (RT_CFG if not given) changed by runtime settings; stopped at cleanup"""
+        cfg = copy.deepcopy(cfg or RT_CFG)
+        cfg['runtime'].update(runtime)
+        self.rtmngr = RuntimeMngr(**(mngr_args or {}), **cfg)
+        self.addCleanup(self.stop_runtime, self.rtmngr)
+        self.published = []
+        self.publish_evt = threading.Event()
+        self.rtmngr._RuntimeMngr__pubsub_client = MagicMock()
+        self.rtmngr._RuntimeMngr__pubsub_client.message_publish.side_effect = self.on_publish
+        return self.rtmngr
+
+    @staticmethod
+    def stop_runtime(rtmngr: RuntimeMngr):
+        rtmngr._RuntimeMngr__scheduler.stop()
+        rtmngr._RuntimeMngr__exited = True
+
+    def on_publish(self, msg):
+        self.published.append(msg)
+        self.publish_evt.set()
+
+    def wait_published(self, count, timeout=2, exact=False):
+        """Wait until count messages were published (exactly count, if exact); returns the last one"""
+        deadline = time.time() + timeout
+        while len(self.published) < count and time.time() < deadline:
+            time.sleep(0.01)
+        if exact: self.assertEqual(len(self.published), count)
+        else: self.assertGreaterEqual(len(self.published), count)
+        return self.published[-1] if self.published else None
+
+    def wait_for(self, cond, timeout=2):
+        """Wait until cond() is true"""
+        deadline = time.time() + timeout
+        while not cond() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(cond())
@@ -0,0 +1,136 @@
+"""
+Unit tests for create admission control:
+  - AdmissionQueue capacity, queue bound, deadlines
+  - RuntimeMngr busy/retry-after responses and queued creates (answered with an error if they cannot start)
+"""
+import time
+import unittest
+
+from model import Result
+from runtime.admission import AdmissionQueue, Admission
+from runtime.quota import TenantQuotas
+from tests.helpers import RuntimeTestCase, create_msg
+
+
+class TestAdmissionQueue(unittest.TestCase):
+
+    def test_admits_up_to_capacity(self):
+        aq = AdmissionQueue(capacity=2, queue_size=1)
+        self.assertEqual(aq.offer('a', 'a'), Admission.admitted)
+        self.assertEqual(aq.offer('b', 'b'), Admission.admitted)
+        self.assertEqual(aq.offer('c', 'c'), Admission.queued)
+        self.assertEqual(aq.active, 2)
+
+    def test_rejects_when_queue_full(self):
+        aq = AdmissionQueue(capacity=1, queue_size=1)
+        aq.offer('a', 'a')
+        aq.offer('b', 'b')
+        self.assertEqual(aq.offer('c', 'c'), Admission.rejected)
+
+    def test_release_admits_next_in_order(self):
+        aq = AdmissionQueue(capacity=1, queue_size=2)
+        aq.offer('a', 'a')
+        aq.offer('b', 'b')
+        aq.offer('c', 'c')
+        admitted, expired = aq.release()
+        self.assertEqual(admitted, ['b'])
+        self.assertEqual(expired, [])
+        self.assertEqual(aq.queued, 1)
+
+    def test_expired_creates_are_dropped_not_admitted(self):
+        aq = AdmissionQueue(capacity=1, queue_size=2, queue_timeout_sec=0.05)
+        aq.offer('a', 'a')
+        aq.offer('b', 'b')
+        time.sleep(0.1)
+        admitted, expired = aq.release()
+        self.assertEqual(admitted, [])
+        self.assertEqual(expired, ['b'])
+        self.assertEqual(aq.active, 0)
+
+    def test_expire_without_release(self):
+        aq = AdmissionQueue(capacity=1, queue_size=2, queue_timeout_sec=0.05)
+        aq.offer('a', 'a')
+        aq.offer('b', 'b')
+        time.sleep(0.1)
+        self.assertEqual(aq.expire(), ([], ['b']))
+
+    def test_contains_queued_key(self):
+        aq = AdmissionQueue(capacity=1, queue_size=1)
+        aq.offer('a', 'a')
+        aq.offer('b', 'b')
+        self.assertIn('b', aq)
+        self.assertNotIn('a', aq)
+
+    def test_retry_after_has_configured_minimum(self):
+        aq = AdmissionQueue(capacity=1, queue_size=0, retry_after_sec=7)
+        self.assertEqual(aq.retry_after(), 7)
+
+    def test_release_never_goes_negative(self):
+        aq = AdmissionQueue(capacity=1)
+        aq.release()
+        self.assertEqual(aq.active, 0)
+        self.assertEqual(aq.offer('a', 'a'), Admission.admitted)
+
+
+class TestRuntimeAdmission(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime(max_nmodules=1, create_queue_size=1, create_queue_timeout_sec=0, create_retry_after_sec=3)
+
+    def test_create_beyond_capacity_is_queued(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        resp = self.rtmngr.control(create_msg('mod-b'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertFalse(self.rtmngr.module_exists('mod-b'))
+
+    def test_busy_response_when_queue_full(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(create_msg('mod-b'))
+        resp = self.rtmngr.control(create_msg('mod-c'))
+        self.assertEqual(resp.payload['data']['result'], Result.busy)
+        self.assertEqual(resp.payload['data']['details']['retry_after_sec'], 3)
+
+    def test_queued_uuid_counts_as_existing(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(create_msg('mod-b'))
+        with self.assertRaises(Exception):
+            self.rtmngr.control(create_msg('mod-b'))
+
+    def test_module_exit_starts_queued_create(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_published(1)
+        self.rtmngr.control(create_msg('mod-b'))
+        self.rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertTrue(self.rtmngr.module_exists('mod-b'))
+        # delete for mod-a, then create confirm for mod-b
+        self.wait_published(3)
+        self.assertEqual(self.published[-1].payload['data']['result'], Result.ok)
+
+    def test_failed_create_frees_slot(self):
+        self.launcher.fetch_files.side_effect = Exception("boom")
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_published(1)
+        self.launcher.fetch_files.side_effect = None
+        resp = self.rtmngr.control(create_msg('mod-b'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertTrue(self.rtmngr.module_exists('mod-b'))
+
+    def test_queued_create_answered_when_pool_shut_down(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_published(1)
+        self.rtmngr.control(create_msg('mod-b'))
+        quotas = self.rtmngr._RuntimeMngr__quotas
+        self.assertEqual(quotas.usage(TenantQuotas.SCENE, 'public/default')['modules'], 2)
+        # exiting; the slot mod-a frees admits mod-b, which cannot be handed to a create worker
+        self.rtmngr._RuntimeMngr__create_pool.shutdown()
+        self.rtmngr._RuntimeMngr__module_exit('mod-a')
+        resp = self.wait_published(3)
+        self.assertEqual((resp.payload['action'], resp.payload['data']['result']), ('create', Result.err))
+        self.assertFalse(self.rtmngr.module_exists('mod-b'))
+        self.assertEqual(quotas.usage(TenantQuotas.SCENE, 'public/default')['modules'], 0)
+        self.assertEqual(self.rtmngr._RuntimeMngr__admission.active, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+"""
+Unit tests for adopting running containers on runtime restart:
+  - running modules are recorded in the module journal (and removed when they exit)
+  - a restarted runtime adopts the journaled modules; modules no longer running are deleted
+  - modules can be left running on exit (keep_modules_on_exit)
+  - an adopted module gets its program files back; it can be restarted, and its files are removed at cleanup
+"""
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import ANY, MagicMock, patch
+
+from model import Module, ModuleState
+from launcher.docker_client import DockerClient
+from launcher.python_launcher import PythonLauncher
+from program_files import ProgramFilesInfo
+from runtime.journal import ModuleJournal
+from tests.helpers import RT_UUID, RuntimeTestCase, create_msg, mod_spec, rt_cfg
+
+
+class TestModuleJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'journal.json')
+
+    def test_entries_persisted(self):
+        journal = ModuleJournal(self.path)
+        journal.add('mod-a', {'uuid': 'mod-a'})
+        journal.add('mod-b', {'uuid': 'mod-b'}, {'files': {'base_path': '/tmp/b'}})
+        journal.remove('mod-a')
+        reloaded = ModuleJournal(self.path)
+        self.assertEqual(reloaded.entries(), {'mod-b': {'spec': {'uuid': 'mod-b'}, 'launcher': {'files': {'base_path': '/tmp/b'}}}})
+        self.assertIn('mod-b', reloaded)
+
+    def test_changes_appended(self):
+        journal = ModuleJournal(self.path)
+        journal.add('mod-a', {'uuid': 'mod-a'})
+        journal.remove('mod-a')
+        journal.add('mod-b', {'uuid': 'mod-b'})
+        with open(self.path) as f: self.assertEqual(len(f.readlines()), 3)
+        # compacted when loaded
+        ModuleJournal(self.path)
+        with open(self.path) as f: self.assertEqual(len(f.readlines()), 1)
+
+    def test_log_compacted(self):
+        journal = ModuleJournal(self.path)
+        for i in range(200):
+            journal.add(f"mod-{i}", {'uuid': f"mod-{i}"})
+            if i % 10: journal.remove(f"mod-{i}")
+        with open(self.path) as f: self.assertLess(len(f.readlines()), ModuleJournal._COMPACT_MIN_RECORDS)
+        self.assertEqual(len(ModuleJournal(self.path)), 20)
+
+    def test_unreadable_lines_skipped(self):
+        journal = ModuleJournal(self.path)
+        journal.add('mod-a', {'uuid': 'mod-a'})
+        with open(self.path, 'a') as f: f.write('{"add": "mod-b", "sp')
+        self.assertEqual(list(ModuleJournal(self.path).entries()), ['mod-a'])
+
+    def test_unreadable_journal_is_empty(self):
+        with open(self.path, 'w') as f: f.write("{not json")
+        self.assertEqual(len(ModuleJournal(self.path)), 0)
+
+
+class TestAdoptModules(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.launcher.launcher_state.return_value = {'files': {'base_path': '/tmp/files'}}
+        self.journal_path = os.path.join(tempfile.mkdtemp(), 'journal.json')
+        self.cfg = rt_cfg(journal_path=self.journal_path)
+
+    def _rtmngr(self, **rt_attrs):
+        self.cfg['runtime'].update(rt_attrs)
+        return self.start_runtime(self.cfg)
+
+    def _journal(self, *mod_uuids):
+        journal = ModuleJournal(self.journal_path)
+        for mod_uuid in mod_uuids:
+            journal.add(mod_uuid, mod_spec(mod_uuid, parent=RT_UUID), {'files': {'base_path': f"/tmp/{mod_uuid}"}})
+
+    def test_journaled_module_is_adopted(self):
+        self._journal('mod-a')
+        self.launcher.adopt_container.return_value = True
+        rtmngr = self._rtmngr()
+        rtmngr._RuntimeMngr__adopt_modules()
+        self.wait_for(lambda: rtmngr._RuntimeMngr__modules['mod-a'].state == ModuleState.running)
+        self.launcher.adopt_container.assert_called_once_with(ANY, {'files': {'base_path': '/tmp/mod-a'}})
+        self.launcher.attach_streamer.assert_called_once()
+        self.launcher.create_container.assert_not_called()
+        self.assertEqual(rtmngr._RuntimeMngr__admission.active, 1)
+        self.assertEqual(self.published, [])
+
+    def test_adopted_beyond_capacity_hold_slots(self):
+        self._journal('mod-a', 'mod-b')
+        self.launcher.adopt_container.return_value = True
+        rtmngr = self._rtmngr(max_nmodules=1)
+        rtmngr._RuntimeMngr__adopt_modules()
+        self.assertEqual(rtmngr._RuntimeMngr__admission.active, 2)
+
+    def test_module_no_longer_running_is_deleted(self):
+        self._journal('mod-a')
+        self.launcher.adopt_container.return_value = False
+        rtmngr = self._rtmngr()
+        rtmngr._RuntimeMngr__adopt_modules()
+        self.wait_for(lambda: len(self.published) == 1)
+        self.assertEqual(self.published[0].payload['action'], 'delete')
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+        # its program files are removed
+        self.launcher.cleanup.assert_called_once()
+        self.assertEqual(rtmngr._RuntimeMngr__admission.active, 0)
+        self.assertEqual(len(ModuleJournal(self.journal_path)), 0)
+
+    def test_invalid_entry_removed(self):
+        ModuleJournal(self.journal_path).add('bad', {'uuid': 'bad'})
+        rtmngr = self._rtmngr()
+        rtmngr._RuntimeMngr__adopt_modules()
+        self.assertFalse(rtmngr.module_exists('bad'))
+        self.assertEqual(len(ModuleJournal(self.journal_path)), 0)
+
+    def test_running_module_journaled_until_exit(self):
+        rtmngr = self._rtmngr()
+        rtmngr.control(create_msg('mod-r'))
+        self.wait_for(lambda: len(self.published) == 1)
+        self.assertEqual(ModuleJournal(self.journal_path).entries()['mod-r']['launcher'], {'files': {'base_path': '/tmp/files'}})
+        rtmngr._RuntimeMngr__module_exit('mod-r')
+        self.assertNotIn('mod-r', ModuleJournal(self.journal_path))
+
+    def test_keep_modules_on_exit_detaches_running_modules(self):
+        rtmngr = self._rtmngr(keep_modules_on_exit=True)
+        rtmngr.control(create_msg('mod-k'))
+        self.wait_for(lambda: len(self.published) == 1)
+        mngr_module = rtmngr._RuntimeMngr__modules['mod-k']
+        rtmngr._RuntimeMngr__shutdown_stop(mngr_module, time.time() + 1)
+        self.launcher.detach.assert_called_once()
+        self.launcher.stop_module.assert_not_called()
+        self.assertIn('mod-k', ModuleJournal(self.journal_path))
+
+
+class TestDockerClientAdopt(unittest.TestCase):
+
+    def _client(self, *containers):
+        client = DockerClient.__new__(DockerClient)
+        client._container = None
+        client._client = MagicMock()
+        client._client.containers.list.return_value = list(containers)
+        # keep __del__ from stopping the mock container
+        self.addCleanup(setattr, client, '_container', None)
+        return client
+
+    def test_adopt_attaches_to_labeled_container(self):
+        container = MagicMock()
+        client = self._client(container)
+        sock = client.adopt({DockerClient.LABEL_MODULE: 'mod-a'})
+        self.assertIs(sock, container.attach_socket.return_value)
+        self.assertIs(client._container, container)
+        client._client.containers.list.assert_called_once_with(filters={'label': [f"{DockerClient.LABEL_MODULE}=mod-a"]})
+
+    def test_adopt_without_container(self):
+        client = self._client()
+        self.assertIsNone(client.adopt({DockerClient.LABEL_MODULE: 'mod-a'}))
+        self.assertIsNone(client._container)
+
+
+class TestPythonLauncherAdopt(unittest.TestCase):
+
+    def setUp(self):
+        self.files_info = ProgramFilesInfo(do_cleanup=False)
+        self.addCleanup(self.files_info.cleanup)
+
+    def _launcher(self):
+        module = Module('realm/s/{namespaced_scene}/p/{module_uuid}', uuid='mod-a', name='mod', file='test.py',
+                        filetype='PY', parent=RT_UUID)
+        with patch('launcher.docker_client.docker'), patch('common.utils.ClassUtils.class_instance_from_settings_class_path'):
+            launcher = PythonLauncher({'cmd': '/entrypoint.sh', 'docker': {}}, module)
+        launcher._docker_client = MagicMock()
+        return launcher
+
+    def test_state_of_program_files(self):
+        launcher = self._launcher()
+        self.assertEqual(launcher.launcher_state(), {})
+        launcher._files_info = self.files_info
+        self.assertEqual(launcher.launcher_state()['files']['base_path'], str(self.files_info._base_path))
+
+    def test_adopted_module_restarted_on_its_files(self):
+        state = {'files': self.files_info.state()}
+        launcher = self._launcher()
+        self.assertTrue(launcher.adopt_container(None, state))
+        # crashed; restarted
+        launcher.restart_container()
+        self.assertEqual(launcher._docker_client.create.call_args.kwargs['workdir_mount_source'], str(self.files_info.path))
+        self.assertEqual(launcher.launcher_state(), state)
+        launcher.cleanup()
+        self.assertFalse(Path(state['files']['base_path']).exists())
+
+    def test_files_removed_when_container_is_gone(self):
+        launcher = self._launcher()
+        launcher._docker_client.adopt.return_value = None
+        self.assertFalse(launcher.adopt_container(None, {'files': self.files_info.state()}))
+        launcher.cleanup()
+        self.assertFalse(self.files_info.path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
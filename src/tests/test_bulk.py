@@ -0,0 +1,157 @@
+"""
+Unit tests for bulk create/delete requests:
+  - one aggregated confirm per bulk request
+  - program files fetched once per program (ProgramFilesCache)
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from model import Result, SlMsgs
+from program_files import ProgramFilesCache, FileStoreBuilder
+from tests.helpers import RT_UUID, RuntimeTestCase, mod_spec
+
+
+def _bulk_msg(action, modules, **data):
+    return SlMsgs('orchestrator').req('realm/modules', action, {'modules': modules, **data}, convert=False)
+
+
+class TestBulkRequests(RuntimeTestCase):
+
+    def setUp(self):
+        # launchers block file fetching until released, so bulk requests are acked before creates finish
+        self.release = threading.Event()
+        self.patch_launcher(side_effect=self._launcher)
+        self.start_runtime()
+
+    def tearDown(self):
+        self.release.set()
+
+    def _launcher(self, module, **kwargs):
+        launcher = MagicMock()
+        launcher.fetch_files.side_effect = lambda files_cache: self.release.wait(2)
+        return launcher
+
+    def _control(self, msg):
+        resp = self.rtmngr.control(msg)
+        self.release.set()
+        return resp
+
+    def test_bulk_create_acks_pending(self):
+        specs = [mod_spec(f"m{i}") for i in range(3)]
+        resp = self._control(_bulk_msg('bulk_create', specs, parent=RT_UUID))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertEqual(resp.payload['data']['details']['modules'], 3)
+
+    def test_bulk_create_single_aggregated_confirm(self):
+        specs = [mod_spec(f"m{i}") for i in range(5)]
+        msg = _bulk_msg('bulk_create', specs, parent=RT_UUID)
+        self._control(msg)
+        confirm = self.wait_published(1, exact=True)
+        self.assertEqual(confirm.payload['object_id'], msg.payload['object_id'])
+        self.assertEqual(confirm.payload['data']['result'], Result.ok)
+        details = confirm.payload['data']['details']
+        self.assertEqual(details['counts'], {Result.ok: 5})
+        self.assertEqual(sorted(m['uuid'] for m in details['modules']), [f"m{i}" for i in range(5)])
+        time.sleep(0.1)
+        self.assertEqual(len(self.published), 1)
+
+    def test_bulk_create_invalid_spec_reported_in_results(self):
+        specs = [mod_spec('good'), {'uuid': 'bad', 'parent': RT_UUID}]
+        self._control(_bulk_msg('bulk_create', specs, parent=RT_UUID))
+        confirm = self.wait_published(1, exact=True)
+        self.assertEqual(confirm.payload['data']['result'], Result.err)
+        results = {m['uuid']: m for m in confirm.payload['data']['details']['modules']}
+        self.assertEqual(results['good']['result'], Result.ok)
+        self.assertEqual(results['bad']['result'], Result.err)
+        self.assertIn('details', results['bad'])
+
+    def test_bulk_create_all_invalid_answers_directly(self):
+        resp = self.rtmngr.control(_bulk_msg('bulk_create', [{'uuid': 'x'}], parent='other-rt'))
+        self.assertEqual(resp.payload['data']['result'], Result.err)
+        self.assertEqual(self.published, [])
+
+    def test_bulk_create_modules_share_files_cache(self):
+        specs = [mod_spec(f"m{i}") for i in range(3)]
+        self._control(_bulk_msg('bulk_create', specs, parent=RT_UUID))
+        self.wait_published(1, exact=True)
+        caches = {id(self.rtmngr._RuntimeMngr__modules[f"m{i}"].module_launcher.fetch_files.call_args[0][0])
+                  for i in range(3)}
+        self.assertEqual(len(caches), 1)
+
+    def test_bulk_create_requires_module_list(self):
+        with self.assertRaises(Exception):
+            self.rtmngr.control(_bulk_msg('bulk_create', 'not-a-list', parent=RT_UUID))
+
+    def test_bulk_delete_confirms_after_all_exit(self):
+        specs = [mod_spec(f"m{i}") for i in range(3)]
+        self._control(_bulk_msg('bulk_create', specs, parent=RT_UUID))
+        self.wait_published(1, exact=True)
+
+        msg = _bulk_msg('bulk_delete', ['m0', {'uuid': 'm1'}, 'm2'])
+        resp = self.rtmngr.control(msg)
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        for mod_uuid in ['m0', 'm1']:
+            self.rtmngr._RuntimeMngr__module_exit(mod_uuid)
+        self.assertEqual(len(self.published), 1)
+        self.rtmngr._RuntimeMngr__module_exit('m2')
+        confirm = self.wait_published(2, exact=True)
+        self.assertEqual(confirm.payload['action'], 'bulk_delete')
+        self.assertEqual(confirm.payload['data']['details']['counts'], {Result.ok: 3})
+
+    def test_bulk_delete_unknown_module_reported(self):
+        resp = self.rtmngr.control(_bulk_msg('bulk_delete', ['ghost']))
+        self.assertEqual(resp.payload['data']['result'], Result.err)
+        self.assertEqual(resp.payload['data']['details']['modules'][0]['uuid'], 'ghost')
+
+
+class TestProgramFilesCache(unittest.TestCase):
+
+    def test_fetch_called_once_for_concurrent_requests(self):
+        cache = ProgramFilesCache()
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(2)
+            return 'files'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('prog', fetch))) for _ in range(5)]
+        for t in threads: t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads: t.join(2)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['files'] * 5)
+
+    def test_failed_fetch_raises_and_can_be_retried(self):
+        cache = ProgramFilesCache()
+        with self.assertRaises(ValueError):
+            cache.get('prog', MagicMock(side_effect=ValueError("no files")))
+        self.assertEqual(cache.get('prog', lambda: 'files'), 'files')
+
+    def test_builder_copies_files_from_shared_program_files(self):
+        src_dir = tempfile.mkdtemp()
+        shared = FileStoreBuilder()
+        os.makedirs(os.path.join(src_dir, 'sub'))
+        for rel in ['main.py', 'sub/util.py']:
+            with open(os.path.join(src_dir, rel), 'w') as f: f.write(rel)
+        shared.copy_file(src_dir, 'main.py')
+        shared.copy_file(os.path.join(src_dir, 'sub'), 'util.py', 'sub')
+        shared_files = shared.get_files()
+
+        builder = FileStoreBuilder()
+        builder.from_program_files(shared_files)
+        files_info = builder.get_files()
+        self.assertTrue(Path(files_info.path).joinpath('main.py').exists())
+        self.assertEqual(Path(files_info.path).joinpath('sub', 'util.py').read_text(), 'sub/util.py')
+
+
+if __name__ == '__main__':
+    unittest.main()
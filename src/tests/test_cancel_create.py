@@ -0,0 +1,110 @@
+"""
+Unit tests for deletes of modules whose create is still in flight:
+  - delete confirms right away and the create is answered with an error
+  - the create worker stops at the next stage and cleans up
+  - queued creates are dropped from the admission queue
+"""
+import os
+import threading
+import time
+import unittest
+
+from model import Result, ModuleState
+from program_files import FileStoreBuilder
+from tests.helpers import RuntimeTestCase, create_msg, delete_msg, prepare_msg
+
+
+class TestCancelCreate(RuntimeTestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.launcher = self.patch_launcher()
+        self.launcher.fetch_files.side_effect = lambda files_cache: self.release.wait(2)
+        self.start_runtime(max_nmodules=1, create_queue_size=1)
+
+    def tearDown(self):
+        self.release.set()
+
+    def _results(self):
+        return [(m.payload['action'], m.payload['data']['result']) for m in self.published]
+
+    def test_delete_while_fetching_confirms_right_away(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(delete_msg('mod-a'))
+        self.assertEqual(self._results(), [('delete', Result.ok)])
+        self.assertFalse(self.rtmngr.module_exists('mod-a'))
+
+    def test_cancelled_create_stops_and_cleans_up(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(delete_msg('mod-a'))
+        self.release.set()
+        self.wait_published(2, exact=True)
+        self.assertEqual(self._results()[1], ('create', Result.err))
+        self.launcher.create_container.assert_not_called()
+        self.launcher.start_container.assert_not_called()
+        self.launcher.cleanup.assert_called_once()
+
+    def test_cancelled_create_frees_slot(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(delete_msg('mod-a'))
+        resp = self.rtmngr.control(create_msg('mod-b'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertTrue(self.rtmngr.module_exists('mod-b'))
+
+    def test_recreated_uuid_not_affected_by_cancelled_create(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        old = self.rtmngr._RuntimeMngr__modules['mod-a']
+        self.rtmngr.control(delete_msg('mod-a'))
+        self.rtmngr.control(create_msg('mod-a'))
+        self.release.set()
+        self.wait_published(3, exact=True)
+        new = self.rtmngr._RuntimeMngr__modules['mod-a']
+        self.assertIsNot(old, new)
+        self.assertEqual(new.state, ModuleState.running)
+
+    def test_delete_queued_create(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(create_msg('mod-b'))
+        self.rtmngr.control(delete_msg('mod-b'))
+        self.assertEqual(self._results(), [('create', Result.err), ('delete', Result.ok)])
+        self.assertNotIn('mod-b', self.rtmngr._RuntimeMngr__admission)
+
+    def test_delete_prepared_module_cleans_up(self):
+        self.release.set()
+        self.rtmngr.control(prepare_msg('mod-p'))
+        self.wait_published(1, exact=True)
+        self.rtmngr.control(delete_msg('mod-p'))
+        self.assertEqual(self._results()[-1], ('delete', Result.ok))
+        deadline = time.time() + 2
+        while not self.launcher.cleanup.called and time.time() < deadline:
+            time.sleep(0.01)
+        self.launcher.cleanup.assert_called_once()
+        self.launcher.stop_module.assert_not_called()
+
+    def test_delete_running_module_stops_it(self):
+        self.release.set()
+        self.rtmngr.control(create_msg('mod-r'))
+        self.wait_published(1, exact=True)
+        self.rtmngr.control(delete_msg('mod-r'))
+        deadline = time.time() + 2
+        while not self.launcher.stop_module.called and time.time() < deadline:
+            time.sleep(0.01)
+        self.launcher.stop_module.assert_called_once()
+        self.assertEqual(self.rtmngr._RuntimeMngr__modules['mod-r'].state, ModuleState.stopping)
+        # confirm is sent on exit
+        self.assertEqual(len(self.published), 1)
+
+
+class TestDiscardFiles(unittest.TestCase):
+
+    def test_discard_removes_partial_files(self):
+        builder = FileStoreBuilder(do_cleanup=False)
+        builder.file_from_string_contents("token", '.auth')
+        base_path = builder._files_info._base_path
+        self.assertTrue(os.path.exists(base_path))
+        builder.discard()
+        self.assertFalse(os.path.exists(base_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unit tests for the asynchronous module create pipeline:
+  - RuntimeMngr acks creates with a pending response
+  - create stages run on a worker and publish the final confirm/error
+  - a create that could not be handed to a worker leaves no module behind
+"""
+import threading
+import unittest
+
+from common import ProgramFileException
+from model import Result, ModuleState
+from tests.helpers import RuntimeTestCase, create_msg
+
+
+class TestCreatePipeline(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime()
+
+    def _wait_publish(self, timeout=2):
+        self.assertTrue(self.publish_evt.wait(timeout), "no message published")
+        return self.published[-1]
+
+    # --- ack ---
+
+    def test_create_returns_pending_ack(self):
+        resp = self.rtmngr.control(create_msg('mod-a'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertEqual(resp.payload['action'], 'create')
+
+    def test_create_ack_does_not_wait_for_file_fetch(self):
+        release = threading.Event()
+        self.launcher.fetch_files.side_effect = lambda *args: release.wait(5)
+        resp = self.rtmngr.control(create_msg('mod-slow'))
+        # control returned while fetch is still blocked
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertFalse(self.publish_evt.is_set())
+        release.set()
+        self._wait_publish()
+
+    def test_pending_module_is_registered(self):
+        release = threading.Event()
+        self.launcher.fetch_files.side_effect = lambda *args: release.wait(5)
+        self.rtmngr.control(create_msg('mod-reg'))
+        self.assertTrue(self.rtmngr.module_exists('mod-reg'))
+        release.set()
+        self._wait_publish()
+
+    # --- final confirm ---
+
+    def test_stages_run_in_order_and_confirm_published(self):
+        self.rtmngr.control(create_msg('mod-b'))
+        confirm = self._wait_publish()
+        self.assertEqual(confirm.payload['data']['result'], Result.ok)
+        names = [c[0] for c in self.launcher.method_calls]
+        self.assertEqual(names, ['fetch_files', 'create_container', 'start_container', 'attach_streamer'])
+
+    def test_module_running_after_confirm(self):
+        self.rtmngr.control(create_msg('mod-c'))
+        self._wait_publish()
+        mngr_mod = self.rtmngr._RuntimeMngr__modules['mod-c']
+        self.assertEqual(mngr_mod.state, ModuleState.running)
+
+    # --- failures ---
+
+    def test_fetch_failure_publishes_error_and_forgets_module(self):
+        self.launcher.fetch_files.side_effect = ProgramFileException("no files")
+        self.rtmngr.control(create_msg('mod-d'))
+        resp = self._wait_publish()
+        self.assertEqual(resp.payload['data']['result'], Result.err)
+        self.assertFalse(self.rtmngr.module_exists('mod-d'))
+        self.launcher.stop_module.assert_not_called()
+
+    def test_streamer_failure_stops_started_container(self):
+        self.launcher.attach_streamer.side_effect = Exception("unexpected!")
+        self.rtmngr.control(create_msg('mod-e'))
+        resp = self._wait_publish()
+        self.assertEqual(resp.payload['data']['result'], Result.err)
+        self.launcher.stop_module.assert_called_once()
+        self.assertFalse(self.rtmngr.module_exists('mod-e'))
+
+    def test_create_not_handed_to_worker_is_forgotten(self):
+        self.rtmngr._RuntimeMngr__create_pool.shutdown()
+        with self.assertRaises(RuntimeError):
+            self.rtmngr._RuntimeMngr__create_module(create_msg('mod-f'))
+        self.assertFalse(self.rtmngr.module_exists('mod-f'))
+        self.assertEqual(self.rtmngr._RuntimeMngr__admission.active, 0)
+
+    def test_worker_counts_default_to_settings(self):
+        self.start_runtime(create_workers=None)
+        self.assertEqual(self.rtmngr._RuntimeMngr__create_pool._max_workers, 4)
+
+    def test_exit_of_forgotten_module_is_ignored(self):
+        self.rtmngr._RuntimeMngr__module_exit('ghost-uuid')
+        self.rtmngr._RuntimeMngr__pubsub_client.message_publish.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Unit tests for the delete pipeline:
+  - modules are stopped on delete workers with a per-module grace period
+  - deletes whose exit notification never arrives are confirmed on timeout
+  - a duplicate delete keeps the first deadline and both deletes are confirmed
+  - DockerClient escalates to kill when a stop fails
+"""
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import docker
+
+from model import Result
+from launcher.docker_client import DockerClient
+from tests.helpers import RuntimeTestCase, create_msg, delete_msg
+
+
+class TestDeletePipeline(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime(stop_grace_sec=2, delete_timeout_sec=0.1)
+
+    def _running_module(self, mod_uuid, **attrs):
+        self.rtmngr.control(create_msg(mod_uuid, **attrs))
+        self.wait_for(lambda: len(self.published) == 1)
+
+    def test_stop_runs_off_control_thread(self):
+        self._running_module('mod-a')
+        release = threading.Event()
+        self.launcher.stop_module.side_effect = lambda grace_sec: release.wait(2)
+        self.rtmngr.control(delete_msg('mod-a'))
+        # control returned while the stop is still blocked
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.assertTrue(self.rtmngr.module_exists('mod-a'))
+        self.assertEqual(len(self.published), 1)
+        release.set()
+
+    def test_runtime_default_grace(self):
+        self._running_module('mod-b')
+        self.rtmngr.control(delete_msg('mod-b'))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.launcher.stop_module.assert_called_once_with(2)
+
+    def test_module_grace_overrides_default(self):
+        self._running_module('mod-c', stop_grace_sec=0)
+        self.rtmngr.control(delete_msg('mod-c'))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.launcher.stop_module.assert_called_once_with(0)
+
+    def test_delete_confirmed_on_exit(self):
+        self._running_module('mod-d')
+        self.rtmngr.control(delete_msg('mod-d'))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.rtmngr._RuntimeMngr__module_exit('mod-d')
+        self.assertEqual(self.published[-1].payload['action'], 'delete')
+        self.assertEqual(self.rtmngr._RuntimeMngr__pending_delete_msgs, {})
+
+    def test_timed_out_delete_is_confirmed(self):
+        self.rtmngr._RuntimeMngr__rt.stop_grace_sec = 0
+        self._running_module('mod-e')
+        self.rtmngr.control(delete_msg('mod-e'))
+        self.wait_for(lambda: len(self.published) == 2)
+        self.assertEqual(self.published[-1].payload['action'], 'delete')
+        self.assertEqual(self.published[-1].payload['data']['result'], Result.ok)
+        self.assertFalse(self.rtmngr.module_exists('mod-e'))
+        self.assertEqual(self.rtmngr._RuntimeMngr__pending_delete_msgs, {})
+        self.wait_for(lambda: self.launcher.cleanup.called)
+
+    def test_late_exit_after_timeout_is_ignored(self):
+        self.rtmngr._RuntimeMngr__rt.stop_grace_sec = 0
+        self._running_module('mod-f')
+        mngr_mod = self.rtmngr._RuntimeMngr__modules['mod-f']
+        self.rtmngr.control(delete_msg('mod-f'))
+        self.wait_for(lambda: len(self.published) == 2)
+        self.rtmngr._RuntimeMngr__module_exit('mod-f', mngr_mod)
+        self.assertEqual(len(self.published), 2)
+
+    def test_exit_cancels_delete_timeout(self):
+        self._running_module('mod-g')
+        self.rtmngr.control(delete_msg('mod-g'))
+        (_, timeout_call) = self.rtmngr._RuntimeMngr__pending_delete_msgs['mod-g']
+        self.rtmngr._RuntimeMngr__module_exit('mod-g')
+        self.assertTrue(timeout_call.cancelled)
+
+    def test_duplicate_delete_coalesced(self):
+        self._running_module('mod-h')
+        first, second = delete_msg('mod-h'), delete_msg('mod-h')
+        self.rtmngr.control(first)
+        (_, timeout_call) = self.rtmngr._RuntimeMngr__pending_delete_msgs['mod-h']
+        self.rtmngr.control(second)
+        # the first deadline is kept; the module is stopped once
+        self.assertIs(self.rtmngr._RuntimeMngr__pending_delete_msgs['mod-h'][1], timeout_call)
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.rtmngr._RuntimeMngr__module_exit('mod-h')
+        self.assertTrue(timeout_call.cancelled)
+        self.launcher.stop_module.assert_called_once()
+        # both deletes confirmed
+        confirms = self.published[1:]
+        self.assertEqual([msg.payload['object_id'] for msg in confirms], [first.payload['object_id'], second.payload['object_id']])
+        self.assertTrue(all(msg.payload['data']['result'] == Result.ok for msg in confirms))
+
+
+class TestDockerClientStop(unittest.TestCase):
+
+    def _client(self):
+        client = DockerClient.__new__(DockerClient)
+        client._container = MagicMock()
+        client._started = True
+        client._paused = False
+        # keep __del__ from stopping the mock container
+        self.addCleanup(setattr, client, '_container', None)
+        return client
+
+    def test_paused_container_unpaused_before_stop(self):
+        client = self._client()
+        client.pause()
+        client.stop(5)
+        client._container.unpause.assert_called_once()
+        client._container.stop.assert_called_once_with(timeout=5)
+
+    def test_grace_passed_as_stop_timeout(self):
+        client = self._client()
+        client.stop(5)
+        client._container.stop.assert_called_once_with(timeout=5)
+
+    def test_fractional_grace_rounded_up(self):
+        client = self._client()
+        client.stop(0.5)
+        client._container.stop.assert_called_once_with(timeout=1)
+
+    def test_failed_stop_escalates_to_kill(self):
+        client = self._client()
+        client._container.stop.side_effect = docker.errors.APIError("stop failed")
+        client.stop(1)
+        client._container.kill.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Unit tests for control message dispatch:
+  - higher priority lanes first, per-lane concurrency limits, shedding of full lanes
+  - calls on the same key run in submit order
+  - RuntimeMngr handles deletes ahead of creates and sheds creates under overload
+"""
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from model import ControlPriority, Result
+from runtime.dispatcher import ControlDispatcher
+from tests.helpers import RuntimeTestCase, create_msg, delete_msg
+
+
+class TestControlDispatcher(RuntimeTestCase):
+
+    def setUp(self):
+        self.done = []
+        self.release = threading.Event()
+
+    def _dispatcher(self, workers=1, **kwargs):
+        dispatcher = ControlDispatcher(workers, **kwargs)
+        self.addCleanup(dispatcher.shutdown)
+        self.addCleanup(self.release.set)
+        return dispatcher
+
+    def _block(self, dispatcher, priority=ControlPriority.control):
+        started = threading.Event()
+        dispatcher.submit(priority, lambda: (started.set(), self.release.wait(2)))
+        started.wait(2)
+
+    def test_higher_priority_first(self):
+        dispatcher = self._dispatcher()
+        self._block(dispatcher)
+        dispatcher.submit(ControlPriority.work, self.done.append, 'create')
+        dispatcher.submit(ControlPriority.reclaim, self.done.append, 'delete')
+        self.release.set()
+        self.wait_for(lambda: len(self.done) == 2)
+        self.assertEqual(self.done, ['delete', 'create'])
+
+    def test_lane_concurrency_limit_leaves_workers(self):
+        dispatcher = self._dispatcher(workers=2, concurrency={ControlPriority.work: 1})
+        self._block(dispatcher, ControlPriority.work)
+        dispatcher.submit(ControlPriority.work, self.done.append, 'create')
+        dispatcher.submit(ControlPriority.reclaim, self.done.append, 'delete')
+        self.wait_for(lambda: self.done == ['delete'])
+        time.sleep(0.05)
+        self.assertEqual(self.done, ['delete'])
+        self.release.set()
+        self.wait_for(lambda: self.done == ['delete', 'create'])
+
+    def test_full_lane_is_shed(self):
+        dispatcher = self._dispatcher(queue_sizes={ControlPriority.work: 1})
+        self._block(dispatcher)
+        self.assertTrue(dispatcher.submit(ControlPriority.work, self.done.append, 'a'))
+        self.assertFalse(dispatcher.submit(ControlPriority.work, self.done.append, 'b'))
+        self.assertTrue(dispatcher.submit(ControlPriority.reclaim, self.done.append, 'delete'))
+
+    def test_same_key_in_submit_order(self):
+        dispatcher = self._dispatcher(workers=2)
+        self._block(dispatcher)
+        dispatcher.submit(ControlPriority.work, self.done.append, 'create-a', key='a')
+        dispatcher.submit(ControlPriority.reclaim, self.done.append, 'delete-a', key='a')
+        dispatcher.submit(ControlPriority.reclaim, self.done.append, 'delete-b', key='b')
+        self.release.set()
+        self.wait_for(lambda: len(self.done) == 3)
+        self.assertEqual(self.done[0], 'delete-b')
+        self.assertLess(self.done.index('create-a'), self.done.index('delete-a'))
+
+    def test_failing_call_does_not_stop_worker(self):
+        dispatcher = self._dispatcher()
+        dispatcher.submit(ControlPriority.control, MagicMock(side_effect=Exception("boom")))
+        dispatcher.submit(ControlPriority.control, self.done.append, 'x')
+        self.wait_for(lambda: self.done == ['x'])
+
+
+class TestRuntimeControlDispatch(RuntimeTestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.launcher = self.patch_launcher()
+        self.start_runtime(control_workers=2, control_create_concurrency=1, control_queue_size=1)
+
+    def tearDown(self):
+        self.release.set()
+        self.rtmngr._RuntimeMngr__dispatcher.shutdown()
+
+    def _dispatch(self, msg):
+        return self.rtmngr._RuntimeMngr__control_dispatch(msg)
+
+    def _block_creates(self):
+        """Keep the one create lane worker busy"""
+        started = threading.Event()
+        self.rtmngr._RuntimeMngr__dispatcher.submit(ControlPriority.work, lambda: (started.set(), self.release.wait(2)))
+        started.wait(2)
+
+    def _actions(self):
+        return [(m.payload.get('action'), m.payload.get('data', {}).get('result')) for m in self.published]
+
+    def test_messages_handled_off_network_thread(self):
+        self.assertIsNone(self._dispatch(create_msg('mod-a')))
+        self.wait_for(lambda: ('create', Result.pending) in self._actions())
+
+    def test_delete_not_stuck_behind_creates(self):
+        # the create lane is blocked (its one worker is busy validating a create)
+        self._block_creates()
+        self._dispatch(create_msg('mod-b'))
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_for(lambda: ('create', Result.ok) in self._actions())
+        self._dispatch(delete_msg('mod-a'))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.assertFalse(self.rtmngr.module_exists('mod-b'))
+
+    def test_creates_shed_when_queue_full(self):
+        self._block_creates()
+        self.assertIsNone(self._dispatch(create_msg('mod-a')))
+        resp = self._dispatch(create_msg('mod-b'))
+        self.assertEqual(resp.payload['data']['result'], Result.busy)
+        self.assertIn('retry_after_sec', resp.payload['data']['details'])
+
+    def test_errors_published(self):
+        self._dispatch(delete_msg('ghost'))
+        self.wait_for(lambda: len(self.published) == 1)
+        self.assertIn('desc', self.published[0].payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+Unit tests for placing modules on several docker endpoints (dockerd stand-ins):
+  - the least loaded endpoint (requested resources, then stats) gets the module; endpoints down or full are skipped
+  - DockerClient creates containers on the endpoint chosen, mounting program files from its host path
+  - adopted containers are found on any endpoint; per-host usage
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+
+import docker
+
+from common import LauncherException
+from launcher.docker_client import DockerClient
+from launcher.docker_pool import DockerPool
+
+_GB = 2**30
+
+
+class _Dockerd():
+    """dockerd stand-ins by url; each has a host size and a mock api"""
+
+    def __init__(self, hosts):
+        self.hosts = hosts # (ncpus, mem GB) by url; None = down
+        self.apis = {}
+
+    def client(self, base_url, **kwargs):
+        api = self.apis.get(base_url)
+        if api is None:
+            api = self.apis[base_url] = MagicMock(name=base_url)
+            api.containers.list.return_value = []
+            api.info.side_effect = lambda: self.__info(base_url)
+        return api
+
+    def __info(self, base_url):
+        host = self.hosts.get(base_url)
+        if host is None: raise docker.errors.DockerException(f"{base_url} down")
+        return {'NCPU': host[0], 'MemTotal': host[1] * _GB}
+
+
+class _PoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dockerd = _Dockerd({'tcp://a:2375': (4, 8), 'tcp://b:2375': (8, 8)})
+        patcher = patch('launcher.docker_pool.docker.DockerClient', side_effect=self.dockerd.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(DockerPool._DockerPool__pools.clear)
+
+    def _endpoints(self, **extra):
+        return [{'name': 'a', 'url': 'tcp://a:2375', **extra}, {'name': 'b', 'url': 'tcp://b:2375'}]
+
+
+class TestDockerPool(_PoolTest):
+
+    def test_least_loaded_by_requested_cpus(self):
+        pool = DockerPool(self._endpoints())
+        # b has twice the cpus of a
+        names = [pool.place(f"mod-{i}", cpus=1).name for i in range(3)]
+        self.assertEqual(names, ['a', 'b', 'b'])
+
+    def test_stats_replace_requested(self):
+        pool = DockerPool(self._endpoints())
+        a = pool.place('mod-1', cpus=2)
+        b = pool.place('mod-2', cpus=2)
+        self.assertEqual((a.name, b.name), ('a', 'b'))
+        # mod-1 turns out idle; a is now the least loaded
+        a.observe('mod-1', 0.1, 50)
+        self.assertEqual(pool.place('mod-3', cpus=1).name, 'a')
+
+    def test_memory_counts(self):
+        pool = DockerPool(self._endpoints())
+        pool.place('mod-1', mem_mb=6 * 1024)
+        self.assertEqual(pool.place('mod-2').name, 'b')
+
+    def test_modules_spread_without_requests(self):
+        pool = DockerPool(self._endpoints())
+        names = [pool.place(f"mod-{i}").name for i in range(4)]
+        self.assertEqual(sorted(names), ['a', 'a', 'b', 'b'])
+
+    def test_release(self):
+        pool = DockerPool(self._endpoints(max_modules=1))
+        a = pool.place('mod-1', cpus=0.1)
+        self.assertTrue(a.full)
+        a.release('mod-1')
+        self.assertFalse(a.full)
+
+    def test_full_and_down_endpoints_skipped(self):
+        self.dockerd.hosts['tcp://b:2375'] = None
+        pool = DockerPool(self._endpoints(max_modules=1), refresh_sec=0)
+        self.assertEqual(pool.place('mod-1').name, 'a')
+        with self.assertRaises(LauncherException):
+            pool.place('mod-2')
+        # b comes up; retried at the next placement
+        self.dockerd.hosts['tcp://b:2375'] = (8, 8)
+        self.assertEqual(pool.place('mod-2').name, 'b')
+
+    def test_path_map(self):
+        pool = DockerPool([{'url': 'tcp://a:2375', 'path_map': {'/tmp/files': '/mnt/node1/files'}}])
+        endpoint = pool.endpoints[0]
+        self.assertEqual(endpoint.name, 'tcp://a:2375')
+        self.assertEqual(endpoint.host_path('/tmp/files/mod-1'), '/mnt/node1/files/mod-1')
+        self.assertEqual(endpoint.host_path('/var/other'), '/var/other')
+
+    def test_pools_shared_and_usage(self):
+        self.assertIsNone(DockerPool.usage_all())
+        pool = DockerPool.get(self._endpoints())
+        self.assertIs(DockerPool.get(self._endpoints()), pool)
+        pool.place('mod-1', cpus=1, mem_mb=512)
+        usage = {host['name']: host for host in DockerPool.usage_all()}
+        self.assertEqual(usage['a']['modules'], 1)
+        self.assertEqual(usage['a']['cpus'], 1)
+        self.assertEqual(usage['a']['ncpus'], 4)
+        self.assertEqual(usage['b']['modules'], 0)
+        self.assertTrue(usage['b']['healthy'])
+
+
+class TestDockerClientPool(_PoolTest):
+
+    def _client(self):
+        return DockerClient(endpoints=self._endpoints(path_map={'/tmp/files': '/mnt/files'}), workdir='/usr/src/app')
+
+    def test_create_on_placed_endpoint(self):
+        client = self._client()
+        client.create('run', id='mod-1', workdir_mount_source='/tmp/files/mod-1', cpu_period=100000, cpu_quota=200000, mem_limit='512m')
+        api = self.dockerd.apis['tcp://a:2375']
+        api.containers.create.assert_called_once()
+        self.assertEqual(api.containers.create.call_args.kwargs['volumes'], ['/mnt/files/mod-1:/usr/src/app'])
+        self.assertEqual(DockerPool.usage_all()[0]['cpus'], 2)
+        self.assertEqual(DockerPool.usage_all()[0]['mem_mb'], 512)
+
+        # the next module goes to the other (now less loaded) endpoint
+        other = self._client()
+        other.create('run', id='mod-2')
+        self.dockerd.apis['tcp://b:2375'].containers.create.assert_called_once()
+
+        client.remove()
+        self.assertEqual(DockerPool.usage_all()[0]['modules'], 0)
+
+    def test_failed_create_released(self):
+        client = self._client()
+        self.dockerd.client('tcp://a:2375').containers.create.side_effect = docker.errors.APIError('no image')
+        with self.assertRaises(docker.errors.APIError):
+            client.create('run', id='mod-1')
+        self.assertEqual([host['modules'] for host in DockerPool.usage_all()], [0, 0])
+
+    def test_adopt_on_any_endpoint(self):
+        client = self._client()
+        container = MagicMock(id='ctn-1', attrs={'HostConfig': {'CpuQuota': 50000, 'CpuPeriod': 100000}})
+        self.dockerd.client('tcp://b:2375').containers.list.return_value = [container]
+        self.assertIsNotNone(client.adopt({DockerClient.LABEL_MODULE: 'mod-1'}))
+        self.assertIs(client._client, self.dockerd.apis['tcp://b:2375'])
+        usage = {host['name']: host for host in DockerPool.usage_all()}
+        self.assertEqual(usage['b']['cpus'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Unit tests for aggregated error reporting:
+  - the first errors of a kind in a window are published, identical ones once; the others end up in one summary
+  - kinds are limited independently; windows start over
+  - MQTTListner reports invalid topics, invalid json and failing handlers through the reporter
+  - RuntimeMngr reports failing control requests through the reporter
+"""
+import time
+import types
+import unittest
+from unittest.mock import MagicMock
+
+from common import InvalidArgument
+from pubsub import ErrorReporter, MQTTListner
+from tests.helpers import RuntimeTestCase, create_msg
+
+
+class TestErrorReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.published = []
+
+    def _reporter(self, **kwargs):
+        reporter = ErrorReporter(self.published.append, 'realm/errors', **kwargs)
+        self.addCleanup(reporter.close)
+        return reporter
+
+    def _payloads(self):
+        return [msg.payload for msg in self.published]
+
+    def test_storm_summarized(self):
+        reporter = self._reporter(window_sec=60, max_per_window=3)
+        results = [reporter.report({'desc': 'Invalid topic', 'data': f"t/{i}"}) for i in range(100)]
+        self.assertEqual(results.count(True), 3)
+        self.assertEqual(len(self.published), 3)
+        reporter.flush()
+        summary = self._payloads()[-1]
+        self.assertEqual(summary['desc'], 'Invalid topic')
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['suppressed'], 97)
+        self.assertEqual(summary['data'], 't/99')
+        self.assertEqual(self.published[-1].topic, 'realm/errors')
+        # summarized once
+        reporter.flush()
+        self.assertEqual(len(self.published), 4)
+
+    def test_identical_errors_published_once(self):
+        reporter = self._reporter(window_sec=60, max_per_window=5)
+        for _ in range(3): reporter.report({'desc': 'Invalid JSON', 'data': 'x'})
+        reporter.report({'desc': 'Invalid JSON', 'data': 'y'})
+        self.assertEqual([p['data'] for p in self._payloads()], ['x', 'y'])
+
+    def test_kinds_limited_independently(self):
+        reporter = self._reporter(window_sec=60, max_per_window=1)
+        reporter.report({'desc': 'a', 'data': 1})
+        reporter.report({'desc': 'a', 'data': 2})
+        reporter.report({'desc': 'b', 'data': 1})
+        self.assertEqual([p['desc'] for p in self._payloads()], ['a', 'b'])
+
+    def test_summary_at_window_end(self):
+        reporter = self._reporter(window_sec=0.1, max_per_window=1)
+        for i in range(5): reporter.report({'desc': 'a', 'data': i})
+        deadline = time.time() + 2
+        while len(self.published) < 2 and time.time() < deadline: time.sleep(0.01)
+        self.assertEqual(self._payloads()[-1]['suppressed'], 4)
+        # a new window
+        self.assertTrue(reporter.report({'desc': 'a', 'data': 9}))
+
+    def test_no_limit(self):
+        reporter = self._reporter(max_per_window=0)
+        for _ in range(10): reporter.report({'desc': 'a', 'data': 1})
+        self.assertEqual(len(self.published), 10)
+
+
+class TestListnerErrors(unittest.TestCase):
+
+    def _listner(self):
+        # only the state message callbacks use; no mqtt client
+        self.published = []
+        listner = types.SimpleNamespace(
+            _error_topic='realm/errors',
+            _MQTTListner__pubsub_handler=MagicMock(),
+            _MQTTListner__errors=ErrorReporter(self.published.append, 'realm/errors', window_sec=60, max_per_window=2),
+            message_publish=self.published.append)
+        for name in ['on_message', 'on_message_callback', '_MQTTListner__on_message_callback',
+                     '_MQTTListner__decode_msg', '_MQTTListner__pubsub_handler_call']:
+            setattr(listner, name, types.MethodType(getattr(MQTTListner, name), listner))
+        return listner
+
+    def test_invalid_topics_aggregated(self):
+        listner = self._listner()
+        for i in range(50): listner.on_message(None, None, types.SimpleNamespace(topic=f"t/{i}", payload=b'{}'))
+        self.assertEqual(len(self.published), 2)
+        listner._MQTTListner__errors.flush()
+        self.assertEqual(self.published[-1].payload['count'], 50)
+
+    def test_handler_errors_aggregated(self):
+        listner = self._listner()
+        def fail(pubsub_handler, msg): raise InvalidArgument('uuid', msg.payload['n'])
+        for i in range(10): listner.on_message_callback(types.SimpleNamespace(topic='t', payload=f'{{"n": {i}}}'.encode()), True, fail)
+        for _ in range(10): listner.on_message_callback(types.SimpleNamespace(topic='t', payload=b'{bad'), True, fail)
+        self.assertEqual([msg.payload['desc'] for msg in self.published],
+                         ['Runtime exception: invalid uuid'] * 2 + ['Invalid JSON'])
+
+    def test_responses_not_limited(self):
+        listner = self._listner()
+        handler = lambda pubsub_handler, msg: msg
+        for _ in range(10): listner.on_message_callback(types.SimpleNamespace(topic='t', payload=b'{}'), True, handler)
+        self.assertEqual(len(self.published), 10)
+
+
+class TestRuntimeErrors(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime(mngr_args={'error_reporting': {'window_sec': 60, 'max_per_window': 2}})
+
+    def test_failing_creates_summarized(self):
+        for i in range(20): self.rtmngr._RuntimeMngr__control_dispatch(create_msg(f"mod-{i}", parent='other'))
+        errors = self.rtmngr._RuntimeMngr__errors
+        reported = lambda: getattr(errors._ErrorReporter__kinds.get('Runtime exception: invalid parent'), 'count', 0)
+        self.wait_for(lambda: reported() == 20)
+        # identical errors; published once
+        self.assertEqual(len(self.published), 1)
+        errors.flush()
+        self.assertEqual(len(self.published), 2)
+        summary = self.published[-1].payload
+        self.assertEqual((summary['count'], summary['suppressed']), (20, 19))
+        self.assertEqual(self.published[-1].topic, 'realm/runtimes')
+        self.launcher.start_module.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Unit tests for hibernating idle modules:
+  - idle modules are paused (instead of deleted) when the inactivity action is hibernate; keepalives flag them
+  - stdin input and resume requests unpause them
+  - deletes and lifetime expiry stop hibernated modules
+"""
+import unittest
+from unittest.mock import patch
+
+from common import InvalidArgument
+from model import ModuleState, InactivityAction
+from tests.helpers import RuntimeTestCase, create_msg, delete_msg, req_msg
+
+
+def _resume_msg(mod_uuid):
+    return req_msg('resume', {'uuid': mod_uuid})
+
+
+class TestHibernate(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.launcher.is_active.return_value = False
+
+    def _rtmngr(self, **rt_attrs):
+        return self.start_runtime(**{'inactivity_timeout_sec': 0.05, 'inactivity_check_interval_sec': 0.02,
+                                     'inactivity_action': InactivityAction.hibernate, **rt_attrs})
+
+    def _hibernated(self, mod_uuid='mod-a'):
+        self.rtmngr.control(create_msg(mod_uuid))
+        self.wait_for(lambda: len(self.published) == 1)
+        mngr_module = self.rtmngr._RuntimeMngr__modules[mod_uuid]
+        self.wait_for(lambda: mngr_module.state == ModuleState.hibernated)
+        return mngr_module
+
+    def _actions(self):
+        return [m.payload['action'] for m in self.published]
+
+    def test_idle_module_hibernated(self):
+        rtmngr = self._rtmngr()
+        self._hibernated()
+        self.launcher.pause_module.assert_called_once()
+        self.launcher.stop_module.assert_not_called()
+        self.assertTrue(rtmngr.module_exists('mod-a'))
+        self.assertEqual(self._actions(), ['create'])
+
+    def test_delete_is_default_action(self):
+        rtmngr = self._rtmngr(inactivity_action=InactivityAction.delete)
+        rtmngr.control(create_msg('mod-a'))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.launcher.pause_module.assert_not_called()
+
+    def test_keepalive_flags_hibernated(self):
+        self.launcher.get_stats.return_value = None
+        rtmngr = self._rtmngr()
+        self._hibernated()
+        with patch('model.module.Module.keepalive_attrs', return_value={'uuid': 'mod-a'}):
+            rtmngr._RuntimeMngr__keepalive()
+        children = self.published[-1].payload['data']['children']
+        self.assertEqual(children, [{'uuid': 'mod-a', 'hibernated': True}])
+
+    def test_input_resumes(self):
+        rtmngr = self._rtmngr(inactivity_timeout_sec=10)
+        rtmngr.control(create_msg('mod-a'))
+        self.wait_for(lambda: len(self.published) == 1)
+        mngr_module = rtmngr._RuntimeMngr__modules['mod-a']
+        rtmngr._RuntimeMngr__hibernate_module(mngr_module)
+        self.assertEqual(mngr_module.state, ModuleState.hibernated)
+        rtmngr._RuntimeMngr__module_input(mngr_module)
+        self.wait_for(lambda: mngr_module.state == ModuleState.running)
+        self.launcher.resume_module.assert_called_once()
+
+    def test_resume_request(self):
+        rtmngr = self._rtmngr(inactivity_timeout_sec=10)
+        rtmngr.control(create_msg('mod-a'))
+        self.wait_for(lambda: len(self.published) == 1)
+        mngr_module = rtmngr._RuntimeMngr__modules['mod-a']
+        rtmngr._RuntimeMngr__hibernate_module(mngr_module)
+        resp = rtmngr._RuntimeMngr__request(_resume_msg('mod-a'))
+        self.assertEqual(resp.payload['data']['details'], {'resumed': True, 'state': ModuleState.running})
+        resp = rtmngr._RuntimeMngr__request(_resume_msg('mod-a'))
+        self.assertFalse(resp.payload['data']['details']['resumed'])
+        with self.assertRaises(InvalidArgument):
+            rtmngr._RuntimeMngr__request(_resume_msg('ghost'))
+
+    def test_delete_stops_hibernated(self):
+        rtmngr = self._rtmngr()
+        self._hibernated()
+        rtmngr.control(delete_msg('mod-a'))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+        self.wait_for(lambda: self._actions() == ['create', 'delete'])
+
+    def test_lifetime_applies_to_hibernated(self):
+        rtmngr = self._rtmngr(module_max_lifetime_sec=0.3)
+        self._hibernated()
+        self.wait_for(lambda: self.launcher.stop_module.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,16 @@
 """
 Unit tests for inactivity detection:
   - PythonLauncher.is_active() stat-based logic
-  - RuntimeMngr inactivity monitor thread behaviour
+  - RuntimeMngr per-module inactivity checks
 """
 import time
-import threading
 import unittest
 from unittest.mock import MagicMock, patch
 
 from common import LauncherException
+from model import ModuleState
 from runtime.runtime_mngr import RuntimeMngr
+from tests.helpers import RuntimeTestCase, rt_cfg
 
 
 # ---------------------------------------------------------------------------
@@ -30,30 +31,6 @@ _LAUNCHER_SETTINGS = {
     'inactivity_blkio_threshold_bytes': 0,
 }
 
-_RT_CFG = {
-    "runtime": {
-        "uuid": "deadbeef-dead-beef-dead-beefdeadbeef",
-        "name": "unit-test-rt",
-        "runtime_type": "containerized-modules",
-        "max_nmodules": 10,
-        "apis": "python:python3",
-        "realm": "realm",
-        "namespace": "public",
-        "reg_attempts": -1,
-        "reg_timeout_seconds": 5,
-        "reg_fail_error": False,
-        "ka_interval_sec": None,
-        "is_orchestration_runtime": False,
-        "tags": [],
-    },
-    "topics": {
-        "runtimes": "realm/runtimes",
-        "modules": "realm/modules",
-        "mio": "realm/s/{namespaced_scene}/p/{module_uuid}",
-    }
-}
-
-
 def _make_launcher(settings_overrides=None):
     """Return a PythonLauncher with all external I/O mocked."""
     from launcher.python_launcher import PythonLauncher
@@ -251,22 +228,21 @@ class TestIsActive(unittest.TestCase):
 # RuntimeMngr inactivity monitor
 # ---------------------------------------------------------------------------
 
-class TestInactivityMonitor(unittest.TestCase):
+class TestInactivityMonitor(RuntimeTestCase):
     """
-    Tests for RuntimeMngr's inactivity monitor.
-    The RuntimeMngr is constructed without pubsub connectivity; the monitor
-    thread is started manually, and modules are injected directly into the
-    private __modules dict so no Docker or MQTT is required.
+    Tests for RuntimeMngr's per-module inactivity checks.
+    The RuntimeMngr is constructed without pubsub connectivity; checks are
+    run directly (the scheduler has them swept every check interval; stops run on
+    the delete pool), and modules are injected into the private __modules dict so no Docker or MQTT is required.
     """
 
     def setUp(self):
-        self.rtmngr = RuntimeMngr(**_RT_CFG)
+        self.rtmngr = RuntimeMngr(**rt_cfg())
         # Provide a mock pubsub client so __module_exit can publish
         self.rtmngr._RuntimeMngr__pubsub_client = MagicMock()
 
     def tearDown(self):
-        # Signal any running monitor/keepalive threads to exit
-        self.rtmngr._RuntimeMngr__ka_exit.set()
+        self.rtmngr._RuntimeMngr__scheduler.stop()
         self.rtmngr._RuntimeMngr__exited = True
 
     def _add_module(self, mod_uuid, *, idle_secs=0, is_active=True,
@@ -280,6 +256,7 @@ class TestInactivityMonitor(unittest.TestCase):
         mod.module_launcher = launcher
         mod.module.uuid = mod_uuid
         mod.module.delete_msg.return_value = MagicMock()
+        mod.state = ModuleState.running
         mod.last_active_at = time.time() - idle_secs
 
         if stop_raises:
@@ -290,18 +267,10 @@ class TestInactivityMonitor(unittest.TestCase):
         self.rtmngr._RuntimeMngr__modules[mod_uuid] = mod
         return mod
 
-    def _run_monitor_cycle(self, check_interval=0.05, timeout_sec=30,
-                           run_for=0.2):
-        """Run the inactivity monitor in a daemon thread for `run_for` seconds."""
-        t = threading.Thread(
-            target=self.rtmngr._RuntimeMngr__inactivity_monitor,
-            args=(check_interval, timeout_sec),
-            daemon=True,
-        )
-        t.start()
-        time.sleep(run_for)
-        self.rtmngr._RuntimeMngr__ka_exit.set()
-        t.join(timeout=3)
+    def _check(self, *mods, timeout_sec=30):
+        """Run one inactivity check for each module."""
+        for mod in mods:
+            self.rtmngr._RuntimeMngr__inactivity_check(mod, timeout_sec)
 
     # --- module_exists (thread-safe lookup) ---
 
@@ -332,74 +301,93 @@ class TestInactivityMonitor(unittest.TestCase):
         """When stop() raises, __module_exit must remove the module."""
         self._add_module('mod-b', stop_raises=True)
         self.rtmngr._RuntimeMngr__delete_inactive_module('mod-b')
-        self.assertNotIn('mod-b', self.rtmngr._RuntimeMngr__modules)
+        self.wait_for(lambda: 'mod-b' not in self.rtmngr._RuntimeMngr__modules)
 
     def test_delete_inactive_stop_raises_publishes_delete_msg(self):
         self._add_module('mod-c', stop_raises=True)
         self.rtmngr._RuntimeMngr__delete_inactive_module('mod-c')
+        self.wait_for(lambda: self.rtmngr._RuntimeMngr__pubsub_client.message_publish.called)
         self.rtmngr._RuntimeMngr__pubsub_client.message_publish.assert_called_once()
 
-    # --- monitor thread: deletion ---
+    # --- inactivity check: deletion ---
 
-    def test_monitor_deletes_module_idle_beyond_timeout(self):
-        self._add_module('mod-long-idle', idle_secs=120, is_active=False,
-                         stop_raises=True)
-        self._run_monitor_cycle(timeout_sec=30)
-        self.assertNotIn('mod-long-idle', self.rtmngr._RuntimeMngr__modules)
+    def test_check_deletes_module_idle_beyond_timeout(self):
+        mod = self._add_module('mod-long-idle', idle_secs=120, is_active=False,
+                               stop_raises=True)
+        self._check(mod, timeout_sec=30)
+        self.wait_for(lambda: 'mod-long-idle' not in self.rtmngr._RuntimeMngr__modules)
 
-    def test_monitor_keeps_module_idle_within_timeout(self):
-        self._add_module('mod-recent-idle', idle_secs=5, is_active=False)
-        self._run_monitor_cycle(timeout_sec=30)
+    def test_check_keeps_module_idle_within_timeout(self):
+        mod = self._add_module('mod-recent-idle', idle_secs=5, is_active=False)
+        self._check(mod, timeout_sec=30)
         self.assertIn('mod-recent-idle', self.rtmngr._RuntimeMngr__modules)
 
-    def test_monitor_keeps_active_module_regardless_of_idle_time(self):
-        self._add_module('mod-active', idle_secs=120, is_active=True)
-        self._run_monitor_cycle(timeout_sec=30)
+    def test_check_keeps_active_module_regardless_of_idle_time(self):
+        mod = self._add_module('mod-active', idle_secs=120, is_active=True)
+        self._check(mod, timeout_sec=30)
         self.assertIn('mod-active', self.rtmngr._RuntimeMngr__modules)
 
-    # --- monitor thread: timestamp updates ---
+    def test_check_skips_stopping_module(self):
+        mod = self._add_module('mod-stopping', idle_secs=120, is_active=False)
+        mod.state = ModuleState.stopping
+        self._check(mod, timeout_sec=30)
+        mod.module_launcher.is_active.assert_not_called()
+        mod.stop.assert_not_called()
+
+    def test_check_ignores_replaced_module(self):
+        """A check scheduled for a module whose uuid was reused does not touch the new module."""
+        old = self._add_module('mod-reused', idle_secs=120, is_active=False)
+        new = self._add_module('mod-reused', idle_secs=120, is_active=False)
+        self._check(old, timeout_sec=30)
+        new.stop.assert_not_called()
 
-    def test_monitor_updates_last_active_at_for_active_module(self):
+    # --- inactivity check: timestamp updates ---
+
+    def test_check_updates_last_active_at_for_active_module(self):
         mod = self._add_module('mod-ts', idle_secs=60, is_active=True)
         old_ts = mod.last_active_at
-        self._run_monitor_cycle(timeout_sec=30)
+        self._check(mod, timeout_sec=30)
         self.assertGreater(mod.last_active_at, old_ts)
 
-    def test_monitor_does_not_update_last_active_at_for_idle_module(self):
+    def test_check_does_not_update_last_active_at_for_idle_module(self):
         mod = self._add_module('mod-idle-ts', idle_secs=5, is_active=False)
         expected_ts = mod.last_active_at
-        self._run_monitor_cycle(timeout_sec=30)
+        self._check(mod, timeout_sec=30)
         self.assertAlmostEqual(mod.last_active_at, expected_ts, delta=0.5)
 
-    # --- monitor thread: mixed modules ---
+    # --- inactivity check: mixed modules ---
 
-    def test_monitor_deletes_only_idle_modules_among_mixed(self):
-        self._add_module('idle-mod', idle_secs=120, is_active=False,
-                         stop_raises=True)
-        self._add_module('active-mod', idle_secs=0, is_active=True)
-        self._run_monitor_cycle(timeout_sec=30)
-        self.assertNotIn('idle-mod', self.rtmngr._RuntimeMngr__modules)
+    def test_check_deletes_only_idle_modules_among_mixed(self):
+        idle = self._add_module('idle-mod', idle_secs=120, is_active=False,
+                                stop_raises=True)
+        active = self._add_module('active-mod', idle_secs=0, is_active=True)
+        self._check(idle, active, timeout_sec=30)
+        self.wait_for(lambda: 'idle-mod' not in self.rtmngr._RuntimeMngr__modules)
         self.assertIn('active-mod', self.rtmngr._RuntimeMngr__modules)
 
-    def test_monitor_handles_is_active_exception_without_crashing(self):
-        """Exceptions from is_active() must not kill the monitor thread."""
+    # --- scheduling ---
+
+    def test_running_module_checked_every_interval(self):
+        self.rtmngr._RuntimeMngr__rt.inactivity_timeout_sec = 30
+        self.rtmngr._RuntimeMngr__rt.inactivity_check_interval_sec = 0.05
+        mod = self._add_module('mod-sched', is_active=True)
+        mod.timers = []
+        mod.module.max_lifetime_sec = None
+        self.rtmngr._RuntimeMngr__module_running(mod)
+        time.sleep(0.3)
+        self.assertGreaterEqual(mod.module_launcher.is_active.call_count, 2)
+
+    def test_check_exception_does_not_stop_checks(self):
+        """Exceptions from is_active() must not stop the module checks."""
+        self.rtmngr._RuntimeMngr__rt.inactivity_timeout_sec = 30
+        self.rtmngr._RuntimeMngr__rt.inactivity_check_interval_sec = 0.05
         mod = self._add_module('mod-exc')
+        mod.timers = []
+        mod.module.max_lifetime_sec = None
         mod.module_launcher.is_active.side_effect = Exception("unexpected!")
-        # monitor must survive the cycle
-        self._run_monitor_cycle(timeout_sec=30)
-
-    # --- monitor thread: exits cleanly ---
-
-    def test_monitor_exits_when_ka_exit_set(self):
-        t = threading.Thread(
-            target=self.rtmngr._RuntimeMngr__inactivity_monitor,
-            args=(0.05, 30),
-            daemon=True,
-        )
-        t.start()
-        self.rtmngr._RuntimeMngr__ka_exit.set()
-        t.join(timeout=2)
-        self.assertFalse(t.is_alive())
+        self.rtmngr._RuntimeMngr__module_running(mod)
+        time.sleep(0.3)
+        self.assertGreaterEqual(mod.module_launcher.is_active.call_count, 2)
 
 
 if __name__ == '__main__':
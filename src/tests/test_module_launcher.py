@@ -37,11 +37,14 @@ class TestLauncher(unittest.TestCase):
         # kill test container just in case
         popen_result = str(subprocess.Popen(f"docker kill {self._MOD_NAME} 2>/dev/null", shell=True, stdout=subprocess.PIPE).stdout.read())
 
-    def pubsub_connected(self, listner):
+    def pubsub_connected(self, listner, session_present=False):
         # subscribe output topic to check container output
         self.mqttc.message_handler_add(self.module.topics.get('stdout'), self.ctn_output)
         self.pubsub_connected_evt.set()
 
+    def pubsub_disconnected(self):
+        pass
+
     def pubsub_error(self, desc: str, data: str):
         raise Exception(f"Pubsub error: {str}; {data}")
 
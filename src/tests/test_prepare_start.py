@@ -0,0 +1,78 @@
+"""
+Unit tests for the prepare/start split:
+  - prepare fetches files and creates the container, but does not start it
+  - start runs a prepared module, or starts it once a prepare in progress is done
+"""
+import threading
+import unittest
+
+from common import InvalidArgument
+from model import Result, ModuleState
+from tests.helpers import RuntimeTestCase, prepare_msg, start_msg
+
+
+class TestPrepareStart(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime()
+
+    def _mngr_module(self, mod_uuid):
+        return self.rtmngr._RuntimeMngr__modules[mod_uuid]
+
+    def test_prepare_creates_container_without_starting(self):
+        resp = self.rtmngr.control(prepare_msg('mod-a'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        confirm = self.wait_published(1, exact=True)
+        self.assertEqual(confirm.payload['action'], 'prepare')
+        self.assertEqual(confirm.payload['data']['result'], Result.ok)
+        names = [c[0] for c in self.launcher.method_calls]
+        self.assertEqual(names, ['fetch_files', 'create_container'])
+        self.assertEqual(self._mngr_module('mod-a').state, ModuleState.prepared)
+
+    def test_start_prepared_module(self):
+        self.rtmngr.control(prepare_msg('mod-b'))
+        self.wait_published(1, exact=True)
+        self.rtmngr.control(start_msg('mod-b'))
+        confirm = self.wait_published(2, exact=True)
+        self.assertEqual(confirm.payload['action'], 'start')
+        self.assertEqual(confirm.payload['data']['result'], Result.ok)
+        self.launcher.start_container.assert_called_once()
+        self.assertEqual(self._mngr_module('mod-b').state, ModuleState.running)
+
+    def test_start_while_preparing_starts_when_prepared(self):
+        release = threading.Event()
+        self.launcher.fetch_files.side_effect = lambda files_cache: release.wait(2)
+        self.rtmngr.control(prepare_msg('mod-c'))
+        resp = self.rtmngr.control(start_msg('mod-c'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        release.set()
+        self.wait_published(2, exact=True)
+        self.assertEqual([m.payload['action'] for m in self.published], ['prepare', 'start'])
+        self.assertEqual(self._mngr_module('mod-c').state, ModuleState.running)
+
+    def test_start_unknown_module(self):
+        with self.assertRaises(InvalidArgument):
+            self.rtmngr.control(start_msg('ghost'))
+
+    def test_start_running_module_is_rejected(self):
+        self.rtmngr.control(prepare_msg('mod-d'))
+        self.wait_published(1, exact=True)
+        self.rtmngr.control(start_msg('mod-d'))
+        self.wait_published(2, exact=True)
+        with self.assertRaises(InvalidArgument):
+            self.rtmngr.control(start_msg('mod-d'))
+
+    def test_start_failure_forgets_module(self):
+        self.launcher.start_container.side_effect = Exception("cannot start")
+        self.rtmngr.control(prepare_msg('mod-e'))
+        self.wait_published(1, exact=True)
+        self.rtmngr.control(start_msg('mod-e'))
+        resp = self.wait_published(2, exact=True)
+        self.assertEqual(resp.payload['data']['result'], Result.err)
+        self.assertFalse(self.rtmngr.module_exists('mod-e'))
+        self.launcher.stop_module.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
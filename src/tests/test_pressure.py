@@ -0,0 +1,147 @@
+"""
+Unit tests for host-pressure-aware admission:
+  - HostPressure reads psi, loadavg and meminfo, and checks them against thresholds
+  - AdmissionQueue hold/let go
+  - RuntimeMngr defers (or rejects) creates while the host is under pressure, and reports it in keepalives
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from model import Result
+from runtime.admission import Admission, AdmissionQueue
+from runtime.pressure import HostPressure
+from tests.helpers import RuntimeTestCase, create_msg
+
+_PSI = "some avg10={} avg60=0.00 avg300=0.00 total=100\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+
+
+class _ProcDir():
+    """Fake procfs with pressure, loadavg and meminfo files"""
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, 'pressure'))
+        self.set()
+
+    def set(self, cpu=0.0, memory=0.0, io=0.0, load1=0.1, mem_available_kb=4194304):
+        for resource, value in (('cpu', cpu), ('memory', memory), ('io', io)):
+            self.__write(f"pressure/{resource}", _PSI.format(value))
+        self.__write('loadavg', f"{load1} 0.50 0.40 1/200 1234\n")
+        self.__write('meminfo', f"MemTotal:       8388608 kB\nMemFree:         100 kB\nMemAvailable:   {mem_available_kb} kB\n")
+
+    def __write(self, name, text):
+        with open(os.path.join(self.path, name), 'w') as f: f.write(text)
+
+    def cleanup(self):
+        shutil.rmtree(self.path)
+
+
+class TestHostPressure(unittest.TestCase):
+
+    def setUp(self):
+        self.proc = _ProcDir()
+        self.addCleanup(self.proc.cleanup)
+
+    @patch('runtime.pressure.os.cpu_count', return_value=4)
+    def test_sample(self, _):
+        self.proc.set(cpu=12.5, memory=1.5, io=0.25, load1=2.0)
+        sample = HostPressure(proc_path=self.proc.path).sample()
+        self.assertEqual(sample, {'cpu_psi': 12.5, 'memory_psi': 1.5, 'io_psi': 0.25,
+                                  'load1': 2.0, 'load_per_cpu': 0.5, 'mem_available_mb': 4096})
+
+    def test_missing_readings_left_out(self):
+        shutil.rmtree(os.path.join(self.proc.path, 'pressure'))
+        pressure = HostPressure(max_cpu_psi=10, proc_path=self.proc.path)
+        sample = pressure.sample()
+        self.assertNotIn('cpu_psi', sample)
+        self.assertIn('mem_available_mb', sample)
+        self.assertIsNone(pressure.violation())
+
+    def test_violation(self):
+        pressure = HostPressure(max_cpu_psi=50, min_mem_available_mb=1024, proc_path=self.proc.path)
+        pressure.sample()
+        self.assertIsNone(pressure.violation())
+        self.proc.set(cpu=60)
+        pressure.sample()
+        self.assertEqual(pressure.violation()['limit'], 'max_cpu_psi')
+        self.proc.set(mem_available_kb=512 * 1024)
+        pressure.sample()
+        violation = pressure.violation()
+        self.assertEqual(violation['limit'], 'min_mem_available_mb')
+        self.assertEqual(violation['pressure']['mem_available_mb'], 512)
+
+    def test_no_thresholds(self):
+        self.proc.set(cpu=99, memory=99, io=99, load1=100)
+        pressure = HostPressure(proc_path=self.proc.path)
+        pressure.sample()
+        self.assertIsNone(pressure.violation())
+
+
+class TestAdmissionHold(unittest.TestCase):
+
+    def test_held_creates_queued_then_admitted(self):
+        aq = AdmissionQueue(capacity=2, queue_size=2)
+        aq.hold(True)
+        self.assertEqual(aq.offer('a', 'a'), Admission.queued)
+        self.assertEqual(aq.release(), ([], []))
+        self.assertEqual(aq.hold(False), (['a'], []))
+        self.assertEqual(aq.offer('b', 'b'), Admission.admitted)
+
+    def test_held_queue_full(self):
+        aq = AdmissionQueue(capacity=2, queue_size=1)
+        aq.hold(True)
+        aq.offer('a', 'a')
+        self.assertEqual(aq.offer('b', 'b'), Admission.rejected)
+
+
+class TestRuntimePressure(RuntimeTestCase):
+
+    def setUp(self):
+        self.proc = _ProcDir()
+        self.addCleanup(self.proc.cleanup)
+        self.launcher = self.patch_launcher()
+
+    def _rtmngr(self, action='defer'):
+        return self.start_runtime(max_nmodules=5, create_queue_size=5, create_queue_timeout_sec=0, create_retry_after_sec=1,
+                                  pressure_action=action,
+                                  host_pressure={'interval_sec': 3600, 'max_cpu_psi': 50, 'proc_path': self.proc.path})
+
+    def test_creates_deferred_under_pressure(self):
+        rtmngr = self._rtmngr()
+        self.proc.set(cpu=80)
+        rtmngr._RuntimeMngr__sample_pressure()
+        resp = rtmngr.control(create_msg('mod-a'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+
+        self.proc.set(cpu=10)
+        rtmngr._RuntimeMngr__sample_pressure()
+        self.assertTrue(rtmngr.module_exists('mod-a'))
+        self.wait_published(1)
+        self.assertEqual(self.published[-1].payload['data']['result'], Result.ok)
+
+    def test_creates_rejected_under_pressure(self):
+        rtmngr = self._rtmngr(action='reject')
+        self.proc.set(cpu=80)
+        rtmngr._RuntimeMngr__sample_pressure()
+        resp = rtmngr.control(create_msg('mod-a'))
+        details = resp.payload['data']['details']
+        self.assertEqual(resp.payload['data']['result'], Result.busy)
+        self.assertEqual(details['limit'], 'max_cpu_psi')
+        self.assertEqual(details['pressure']['cpu_psi'], 80)
+        self.assertEqual(details['retry_after_sec'], 3600)
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+
+    def test_keepalive_reports_pressure(self):
+        rtmngr = self._rtmngr()
+        self.proc.set(io=7.5)
+        rtmngr._RuntimeMngr__sample_pressure()
+        rtmngr._RuntimeMngr__keepalive()
+        self.assertEqual(self.published[-1].payload['data']['pressure']['io_psi'], 7.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Unit tests for per-program resource profiles:
+  - ProgramProfiles samples, percentiles, limits and persistence
+  - runtime-wide quota limits
+  - RuntimeMngr applies profile limits to creates, records startup times and reports the expected load
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from model import Module, ModuleStats, Result
+from runtime.profiles import ProgramProfiles
+from runtime.quota import TenantQuotas
+from tests.helpers import RT_UUID, RuntimeTestCase, create_msg
+
+
+def _module(**attrs):
+    mod = {'uuid': 'mod-a', 'name': 'mod', 'file': 'test.py', 'filetype': 'PY', 'location': 'arena/test', 'parent': RT_UUID, **attrs}
+    return Module('realm/s/', **mod)
+
+
+def _stats(cpu_percent, mem_mb):
+    return ModuleStats(cpu_usage_percent=cpu_percent, mem_usage=mem_mb * 1e6)
+
+
+class TestProgramProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'profiles.json')
+
+    def _profiles(self, **kwargs):
+        return ProgramProfiles(self.path, **{'min_samples': 4, **kwargs})
+
+    def test_program_key(self):
+        self.assertEqual(ProgramProfiles.program(_module()), 'arena/test/test.py')
+        self.assertEqual(ProgramProfiles.program(_module(fileid='f-1')), 'f-1')
+
+    def test_summary_needs_min_samples(self):
+        profiles = self._profiles()
+        for _ in range(3): profiles.observe(_module(), _stats(50, 100))
+        self.assertIsNone(profiles.summary(_module()))
+        profiles.observe(_module(), _stats(50, 100))
+        self.assertEqual(profiles.summary(_module())['samples'], 4)
+
+    def test_percentiles_and_peak(self):
+        profiles = self._profiles()
+        for cpu in range(1, 101): profiles.observe(_module(), _stats(cpu, cpu * 10))
+        profiles.started(_module(), 2.5)
+        summary = profiles.summary(_module())
+        self.assertEqual(summary['cpus_p50'], 0.5)
+        self.assertEqual(summary['cpus_p95'], 0.95)
+        self.assertEqual(summary['cpus_peak'], 1.0)
+        self.assertEqual(summary['mem_mb_peak'], 1000)
+        self.assertEqual(summary['startup_sec_p50'], 2.5)
+        self.assertEqual(summary['runs'], 1)
+
+    def test_window_keeps_recent_samples(self):
+        profiles = self._profiles(window=4)
+        for cpu in (90, 90, 10, 10, 10, 10): profiles.observe(_module(), _stats(cpu, 100))
+        self.assertEqual(profiles.summary(_module())['cpus_peak'], 0.1)
+
+    def test_samples_without_stats_ignored(self):
+        profiles = self._profiles(min_samples=1)
+        profiles.observe(_module(), ModuleStats(cpu_usage_percent=None, mem_usage=None))
+        self.assertIsNone(profiles.summary(_module()))
+
+    def test_limits_for_unrequested_resources(self):
+        profiles = self._profiles(limits_headroom=2)
+        for _ in range(4): profiles.observe(_module(), _stats(25, 100))
+        self.assertEqual(profiles.limits(_module()), {'cpus': 0.5, 'mem_mb': 200})
+        self.assertEqual(profiles.limits(_module(resources=[{'cpus': 1}])), {'mem_mb': 200})
+        self.assertEqual(profiles.limits(_module(resources=[{'cpus': 1, 'mem_mb': 64}])), {})
+        self.assertEqual(self._profiles(limits_headroom=0).limits(_module()), {})
+
+    def test_expected_load(self):
+        profiles = self._profiles()
+        self.assertEqual(profiles.expected(_module(resources=[{'cpus': 2}])), {'cpus': 2, 'mem_mb': 0})
+        for _ in range(4): profiles.observe(_module(), _stats(25, 100))
+        self.assertEqual(profiles.expected(_module()), {'cpus': 0.25, 'mem_mb': 100})
+
+    def test_saved_and_loaded(self):
+        profiles = self._profiles()
+        for _ in range(4): profiles.observe(_module(), _stats(25, 100))
+        profiles.save()
+        self.assertEqual(self._profiles().summary(_module()), profiles.summary(_module()))
+
+    def test_unreadable_file_ignored(self):
+        with open(self.path, 'w') as f: f.write('not json')
+        self.assertEqual(len(self._profiles()), 0)
+
+
+class TestRuntimeQuota(unittest.TestCase):
+
+    def test_runtime_limits_all_modules(self):
+        quotas = TenantQuotas(runtime={'max_cpus': 1})
+        self.assertIsNotNone(quotas.charge('a', 'a/x', cpus=0.5)[0])
+        self.assertIsNotNone(quotas.charge('b', 'b/y', cpus=0.5)[0])
+        violation = quotas.charge('c', 'c/z', cpus=0.5)[1]
+        self.assertEqual(violation.details()['quota'], TenantQuotas.RUNTIME)
+        self.assertEqual(quotas.usage(TenantQuotas.RUNTIME, '')['cpus'], 1)
+
+
+class TestRuntimeProfiles(RuntimeTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.launcher = self.patch_launcher()
+        self.launcher.get_stats.return_value = _stats(40, 200)
+
+        self.start_runtime(profiles={'path': os.path.join(self.dir, 'profiles.json'), 'min_samples': 2, 'limits_headroom': 1.5},
+                              quotas={'runtime': {'max_cpus': 1}})
+        self.profiles = self.rtmngr._RuntimeMngr__profiles
+
+    def test_create_gets_profile_limits(self):
+        for _ in range(2): self.profiles.observe(_module(), _stats(40, 200))
+        self.rtmngr.control(create_msg('mod-a'))
+        mngr_module = self.rtmngr._RuntimeMngr__modules['mod-a']
+        self.assertEqual(mngr_module.module.requested_cpus, 0.6)
+        self.assertEqual(mngr_module.module.requested_mem_mb, 300)
+        self.assertEqual(mngr_module.spec['resources'], mngr_module.module.resources)
+
+        # the profile limits count against the runtime quota
+        resp = self.rtmngr.control(create_msg('mod-b'))
+        self.assertEqual(resp.payload['data']['result'], Result.busy)
+        self.assertEqual(resp.payload['data']['details']['quota'], TenantQuotas.RUNTIME)
+
+    def test_startup_recorded(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_published(1)
+        self.profiles.observe(_module(), _stats(40, 200))
+        self.profiles.observe(_module(), _stats(40, 200))
+        summary = self.profiles.summary(_module())
+        self.assertEqual(summary['runs'], 1)
+        self.assertIn('startup_sec_p95', summary)
+
+    def test_keepalive_samples_and_expected_load(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_published(1)
+        for _ in range(2): self.rtmngr._RuntimeMngr__keepalive()
+        keepalive = self.published[-1].payload['data']
+        self.assertEqual(keepalive['expected_load'], {'cpus': 0.4, 'mem_mb': 200})
+        self.assertEqual(self.profiles.summary(_module())['samples'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
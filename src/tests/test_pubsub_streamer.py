@@ -40,11 +40,14 @@ class TestStreamer(unittest.TestCase, PubsubHandler):
         self.pubsub_connected_evt = threading.Event()
         self.pubsub_out_received_evt = threading.Event()
 
-    def pubsub_connected(self, listner):
+    def pubsub_connected(self, listner, session_present=False):
         # subscribe output topic to check container output
         self.mqttc.message_handler_add(self._TOPICS['stdout'], self.ctn_output)
         self.pubsub_connected_evt.set()
 
+    def pubsub_disconnected(self):
+        pass
+
     def pubsub_error(self, desc: str, data: str):
         raise Exception(f"Pubsub error: {str}; {data}")
         
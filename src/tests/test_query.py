@@ -0,0 +1,95 @@
+"""
+Unit tests for the list, status and capacity queries:
+  - answered from the state and the stats sampled at the last keepalive (docker is not asked)
+  - queries are not remembered by the response cache
+  - runtime queries for other runtimes are ignored; unknown modules are answered with an error
+"""
+import time
+import unittest
+
+from common.exception import MissingField
+from common import InvalidArgument
+from model import ModuleState, ModuleStats, Result
+from tests.helpers import RT_UUID, RuntimeTestCase, create_msg, req_msg
+
+
+def _query_msg(action, object_id=None, **data):
+    msg = req_msg(action, data)
+    if object_id: msg.payload['object_id'] = object_id
+    return msg
+
+
+class TestQueries(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.launcher.get_stats.return_value = ModuleStats(cpu_usage_percent=25, mem_usage=100e6)
+
+        self.start_runtime(response_cache_size=16, response_cache_ttl_sec=60)
+
+    def _create(self, mod_uuid):
+        count = len(self.published) + 1
+        self.rtmngr.control(create_msg(mod_uuid))
+        deadline = time.time() + 2
+        while len(self.published) < count and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.published[-1].payload['data']['result'], Result.ok)
+
+    def test_list_before_and_after_keepalive(self):
+        self._create('mod-a')
+        resp = self.rtmngr.control(_query_msg('list', parent=RT_UUID))
+        modules = resp.payload['data']['details']['modules']
+        self.assertEqual([m['uuid'] for m in modules], ['mod-a'])
+        self.assertEqual(modules[0]['state'], ModuleState.running)
+        self.assertIsNone(modules[0]['stats_at'])
+        self.launcher.get_stats.assert_not_called()
+
+        self.rtmngr._RuntimeMngr__keepalive()
+        self.launcher.get_stats.reset_mock()
+        resp = self.rtmngr.control(_query_msg('list', parent='unit-test-rt'))
+        module = resp.payload['data']['details']['modules'][0]
+        self.assertEqual(module['cpu_usage_percent'], 25)
+        self.assertIsNotNone(module['stats_at'])
+        self.launcher.get_stats.assert_not_called()
+
+    def test_status(self):
+        self._create('mod-a')
+        self.rtmngr._RuntimeMngr__keepalive()
+        resp = self.rtmngr.control(_query_msg('status', uuid='mod-a'))
+        details = resp.payload['data']['details']
+        self.assertEqual(resp.payload['data']['result'], Result.ok)
+        self.assertEqual(details['state'], ModuleState.running)
+        self.assertEqual(details['mem_usage'], 100e6)
+
+    def test_status_errors(self):
+        with self.assertRaises(MissingField):
+            self.rtmngr.control(_query_msg('status'))
+        with self.assertRaises(InvalidArgument):
+            self.rtmngr.control(_query_msg('status', uuid='mod-x'))
+
+    def test_capacity(self):
+        self._create('mod-a')
+        resp = self.rtmngr.control(_query_msg('capacity', parent=RT_UUID))
+        details = resp.payload['data']['details']
+        self.assertEqual(details['max_nmodules'], 10)
+        self.assertEqual(details['modules'], 1)
+        self.assertEqual(details['admitted'], 1)
+        self.assertEqual(details['free'], 9)
+        self.assertFalse(details['admission_held'])
+        self.assertEqual(details['quota']['modules'], 0)
+        self.assertNotIn('pressure', details)
+
+    def test_other_runtime_ignored(self):
+        self.assertIsNone(self.rtmngr.control(_query_msg('list', parent='other-rt')))
+        with self.assertRaises(MissingField):
+            self.rtmngr.control(_query_msg('capacity'))
+
+    def test_queries_not_cached(self):
+        self.rtmngr.control(_query_msg('list', object_id='q-1', parent=RT_UUID))
+        self._create('mod-a')
+        resp = self.rtmngr.control(_query_msg('list', object_id='q-1', parent=RT_UUID))
+        self.assertEqual(len(resp.payload['data']['details']['modules']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Unit tests for namespace and scene quotas:
+  - token bucket create rate limits
+  - module count, cpu and memory limits per namespace and scene; overrides; charges released once
+  - RuntimeMngr turns down over-quota creates before any launcher work, and releases quota when modules leave
+"""
+import time
+import unittest
+
+from common import InvalidArgument
+from model import Result
+from runtime.quota import TenantQuotas, TokenBucket
+from tests.helpers import RuntimeTestCase, create_msg, delete_msg
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_limited(self):
+        bucket = TokenBucket(rate=1, burst=2)
+        self.assertTrue(bucket.take())
+        self.assertTrue(bucket.take())
+        self.assertFalse(bucket.take())
+        self.assertGreater(bucket.retry_after(), 0)
+
+    def test_refills_over_time(self):
+        bucket = TokenBucket(rate=50)
+        while bucket.take(): pass
+        time.sleep(0.05)
+        self.assertTrue(bucket.take())
+
+
+class TestTenantQuotas(unittest.TestCase):
+
+    def test_namespace_max_modules(self):
+        quotas = TenantQuotas(namespace={'max_modules': 2})
+        self.assertIsNotNone(quotas.charge('ns', 'ns/a')[0])
+        self.assertIsNotNone(quotas.charge('ns', 'ns/b')[0])
+        charge, violation = quotas.charge('ns', 'ns/c')
+        self.assertIsNone(charge)
+        self.assertEqual((violation.scope, violation.name, violation.limit), ('namespace', 'ns', 'max_modules'))
+        # other namespaces are not affected
+        self.assertIsNotNone(quotas.charge('other', 'other/a')[0])
+
+    def test_scene_cpu_and_memory(self):
+        quotas = TenantQuotas(scene={'max_cpus': 1, 'max_mem_mb': 512})
+        self.assertIsNotNone(quotas.charge('ns', 'ns/a', cpus=0.75, mem_mb=256)[0])
+        self.assertEqual(quotas.charge('ns', 'ns/a', cpus=0.5)[1].limit, 'max_cpus')
+        self.assertEqual(quotas.charge('ns', 'ns/a', mem_mb=512)[1].limit, 'max_mem_mb')
+        self.assertIsNotNone(quotas.charge('ns', 'ns/a', cpus=0.25, mem_mb=256)[0])
+
+    def test_override(self):
+        quotas = TenantQuotas(scene={'max_modules': 1}, overrides={'ns/big': {'max_modules': 3}})
+        for _ in range(3): self.assertIsNotNone(quotas.charge('ns', 'ns/big')[0])
+        self.assertIsNotNone(quotas.charge('ns', 'ns/small')[0])
+        self.assertIsNotNone(quotas.charge('ns', 'ns/small')[1])
+
+    def test_release_once(self):
+        quotas = TenantQuotas(namespace={'max_modules': 1})
+        charge, _ = quotas.charge('ns', 'ns/a', cpus=1)
+        charge.release()
+        charge.release()
+        self.assertEqual(quotas.usage(TenantQuotas.NAMESPACE, 'ns')['modules'], 0)
+        self.assertIsNotNone(quotas.charge('ns', 'ns/a')[0])
+
+    def test_create_rate(self):
+        quotas = TenantQuotas(namespace={'create_rate': 1, 'create_burst': 1}, scene={'create_rate': 10})
+        self.assertIsNotNone(quotas.charge('ns', 'ns/a')[0])
+        charge, violation = quotas.charge('ns', 'ns/a')
+        self.assertIsNone(charge)
+        self.assertEqual(violation.limit, 'create_rate')
+        self.assertIn('retry_after_sec', violation.details())
+
+    def test_rate_limited_create_does_not_take_scene_token(self):
+        quotas = TenantQuotas(namespace={'create_rate': 1, 'create_burst': 1}, scene={'create_rate': 1, 'create_burst': 2})
+        quotas.charge('ns', 'ns/a')
+        quotas.charge('ns', 'ns/a')
+        # the namespace was out of tokens; the scene still has one
+        self.assertIsNotNone(quotas.charge('other', 'ns/a')[0])
+
+    def test_force_charges_over_quota(self):
+        quotas = TenantQuotas(namespace={'max_modules': 1})
+        quotas.charge('ns', 'ns/a')
+        self.assertIsNotNone(quotas.charge('ns', 'ns/a', force=True)[0])
+        self.assertEqual(quotas.usage(TenantQuotas.NAMESPACE, 'ns')['modules'], 2)
+
+
+class TestRuntimeQuotas(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime(max_nmodules=1, create_queue_size=10,
+                           quotas={'scene': {'max_modules': 2, 'max_cpus': 1}})
+
+    def _usage(self, scene='public/default'):
+        return self.rtmngr._RuntimeMngr__quotas.usage(TenantQuotas.SCENE, scene)['modules']
+
+    def test_over_quota_create_rejected_before_launch(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(create_msg('mod-b'))
+        self.get_launcher.reset_mock()
+        resp = self.rtmngr.control(create_msg('mod-c'))
+        self.assertEqual(resp.payload['data']['result'], Result.busy)
+        self.assertEqual(resp.payload['data']['details']['limit'], 'max_modules')
+        self.get_launcher.assert_not_called()
+        # other scenes are not affected
+        resp = self.rtmngr.control(create_msg('mod-d', scene='other/scene'))
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+
+    def test_namespace_of_requested_scene(self):
+        self.rtmngr._RuntimeMngr__quotas = TenantQuotas(namespace={'max_modules': 5}, overrides={'team': {'max_modules': 1}})
+        self.rtmngr.control(create_msg('mod-a', scene='team/lab'))
+        resp = self.rtmngr.control(create_msg('mod-b', scene='team/other'))
+        self.assertEqual(resp.payload['data']['details']['name'], 'team')
+        # other namespaces (and bare scenes, in the default namespace) are not affected
+        for mod_uuid, scene in [('mod-c', 'other/lab'), ('mod-d', 'lab')]:
+            resp = self.rtmngr.control(create_msg(mod_uuid, scene=scene))
+            self.assertEqual(resp.payload['data']['result'], Result.pending)
+        # the module scene attribute is unchanged
+        self.assertEqual(self.rtmngr._RuntimeMngr__modules['mod-a'].module['scene'], 'public/team/lab')
+
+    def test_cpu_quota(self):
+        resp = self.rtmngr.control(create_msg('mod-a', resources=[{'cpus': 2}]))
+        self.assertEqual(resp.payload['data']['details']['limit'], 'max_cpus')
+
+    def test_invalid_resources(self):
+        with self.assertRaises(InvalidArgument):
+            self.rtmngr.control(create_msg('mod-a', resources=[{'cpus': 'lots'}]))
+        self.assertEqual(self._usage(), 0)
+
+    def test_module_exit_releases_quota(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_for(lambda: len(self.published) == 1)
+        self.assertEqual(self._usage(), 1)
+        self.rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertEqual(self._usage(), 0)
+
+    def test_queued_create_deleted_releases_quota(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.rtmngr.control(create_msg('mod-b'))
+        self.assertEqual(self._usage(), 2)
+        self.rtmngr.control(delete_msg('mod-b'))
+        self.assertEqual(self._usage(), 1)
+
+    def test_failed_create_releases_quota(self):
+        self.launcher.start_module.side_effect = Exception("no docker")
+        self.launcher.create_container.side_effect = Exception("no docker")
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_for(lambda: len(self.published) == 1)
+        self.assertEqual(self._usage(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
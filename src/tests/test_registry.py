@@ -0,0 +1,61 @@
+"""
+Unit tests for the module registry:
+  - dict-like access, identity-checked removal
+  - snapshots are not affected by later changes; concurrent writers do not lose modules
+"""
+import threading
+import unittest
+
+from runtime.registry import ModuleRegistry
+
+
+class TestModuleRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ModuleRegistry(nshards=4)
+
+    def test_dict_like_access(self):
+        mod = object()
+        self.registry['mod-a'] = mod
+        self.assertIs(self.registry['mod-a'], mod)
+        self.assertIs(self.registry.get('mod-a'), mod)
+        self.assertIn('mod-a', self.registry)
+        self.assertEqual(len(self.registry), 1)
+        del self.registry['mod-a']
+        self.assertNotIn('mod-a', self.registry)
+        with self.assertRaises(KeyError):
+            self.registry['mod-a']
+
+    def test_add_does_not_replace(self):
+        first = object()
+        self.assertTrue(self.registry.add('mod-a', first))
+        self.assertFalse(self.registry.add('mod-a', object()))
+        self.assertIs(self.registry['mod-a'], first)
+
+    def test_pop_only_expected_module(self):
+        old, new = object(), object()
+        self.registry['mod-a'] = new
+        self.assertIsNone(self.registry.pop('mod-a', expected=old))
+        self.assertIs(self.registry.pop('mod-a', expected=new), new)
+        self.assertIsNone(self.registry.pop('mod-a'))
+
+    def test_snapshot_not_affected_by_later_changes(self):
+        for i in range(10): self.registry[f"m{i}"] = i
+        snapshot = self.registry.values()
+        self.registry.pop('m0')
+        self.registry['m10'] = 10
+        self.assertEqual(sorted(snapshot), list(range(10)))
+        self.assertEqual(sorted(self.registry), sorted(f"m{i}" for i in range(1, 11)))
+
+    def test_concurrent_writers(self):
+        def add(prefix):
+            for i in range(500): self.registry[f"{prefix}-{i}"] = i
+
+        threads = [threading.Thread(target=add, args=(p,)) for p in 'abcd']
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(len(self.registry), 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Unit tests for retried requests:
+  - the response cache remembers requests and their last response (final responses win), bounded and with a ttl
+  - RuntimeMngr answers retried creates and deletes from the cache without handling them again
+"""
+import time
+import unittest
+
+from common import InvalidArgument
+from model import Result, SlMsgs
+from runtime.response_cache import ResponseCache
+from tests.helpers import RuntimeTestCase, create_msg, delete_msg
+
+_SL_MSGS = SlMsgs('runtime')
+
+
+def _resp(object_id, result):
+    return _SL_MSGS.resp('realm/modules', object_id, 'create', {}, result=result)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_claim_once(self):
+        cache = ResponseCache(10)
+        self.assertEqual(cache.claim('req-a'), (True, None))
+        self.assertEqual(cache.claim('req-a'), (False, None))
+
+    def test_last_response_returned(self):
+        cache = ResponseCache(10)
+        cache.claim('req-a')
+        pending = _resp('req-a', Result.pending)
+        cache.record(pending)
+        self.assertIs(cache.claim('req-a')[1], pending)
+        confirm = _resp('req-a', Result.ok)
+        cache.record(confirm)
+        self.assertIs(cache.claim('req-a')[1], confirm)
+
+    def test_final_response_not_replaced_by_pending(self):
+        cache = ResponseCache(10)
+        cache.claim('req-a')
+        confirm = _resp('req-a', Result.ok)
+        cache.record(confirm)
+        cache.record(_resp('req-a', Result.pending))
+        self.assertIs(cache.claim('req-a')[1], confirm)
+
+    def test_busy_request_handled_again(self):
+        cache = ResponseCache(10)
+        cache.claim('req-a')
+        cache.record(_resp('req-a', Result.busy))
+        self.assertEqual(cache.claim('req-a'), (True, None))
+
+    def test_forget(self):
+        cache = ResponseCache(10)
+        cache.claim('req-a')
+        cache.forget('req-a')
+        self.assertEqual(cache.claim('req-a'), (True, None))
+
+    def test_oldest_dropped_beyond_max_entries(self):
+        cache = ResponseCache(2)
+        for object_id in ('req-a', 'req-b', 'req-c'): cache.claim(object_id)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.claim('req-a')[0])
+
+    def test_entries_expire(self):
+        cache = ResponseCache(10, ttl_sec=0.05)
+        cache.claim('req-a')
+        time.sleep(0.1)
+        self.assertTrue(cache.claim('req-a')[0])
+
+
+class TestRetriedRequests(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime(response_cache_size=100, response_cache_ttl_sec=60)
+
+    def test_retried_create_gets_final_confirm(self):
+        create_req = create_msg('mod-a')
+        self.rtmngr.control(create_req)
+        self.wait_for(lambda: len(self.published) == 1)
+        resp = self.rtmngr.control(create_req)
+        self.assertIs(resp, self.published[0])
+        self.assertEqual(resp.payload['data']['result'], Result.ok)
+        self.assertEqual(self.get_launcher.call_count, 1)
+
+    def test_retried_create_in_flight_gets_pending(self):
+        self.launcher.fetch_files.side_effect = lambda *args: time.sleep(0.2)
+        create_req = create_msg('mod-a')
+        self.rtmngr.control(create_req)
+        resp = self.rtmngr.control(create_req)
+        self.assertEqual(resp.payload['data']['result'], Result.pending)
+        self.assertEqual(self.get_launcher.call_count, 1)
+
+    def test_retried_delete_gets_confirm(self):
+        self.rtmngr.control(create_msg('mod-a'))
+        self.wait_for(lambda: len(self.published) == 1)
+        delete_req = delete_msg('mod-a')
+        self.rtmngr.control(delete_req)
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.rtmngr._RuntimeMngr__module_exit('mod-a')
+        resp = self.rtmngr.control(delete_req)
+        self.assertEqual(resp.payload['action'], 'delete')
+        self.assertEqual(self.launcher.stop_module.call_count, 1)
+
+    def test_failed_request_handled_again(self):
+        delete_req = delete_msg('ghost')
+        for _ in range(2):
+            with self.assertRaises(InvalidArgument):
+                self.rtmngr.control(delete_req)
+
+
+if __name__ == '__main__':
+    unittest.main()
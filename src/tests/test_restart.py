@@ -0,0 +1,114 @@
+"""
+Unit tests for module restart policies:
+  - modules exiting on their own are restarted (never, on-failure, always) without fetching files again
+  - modules being stopped (deletes) are not restarted; deletes of restarting modules cancel the restart
+  - crash looping modules are deleted instead of restarted
+"""
+import unittest
+
+from model import ModuleState, RestartPolicy
+from tests.helpers import RuntimeTestCase, create_msg, delete_msg
+
+
+class TestRestartPolicy(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.launcher.exit_code.return_value = 1
+
+    def _rtmngr(self, **rt_attrs):
+        return self.start_runtime(**{'restart_backoff_sec': 0.01, 'restart_backoff_max_sec': 0.05, **rt_attrs})
+
+    def _start(self, mod_uuid='mod-a', **mod_attrs):
+        self.rtmngr.control(create_msg(mod_uuid, **mod_attrs))
+        self.wait_for(lambda: len(self.published) == 1)
+        return self.rtmngr._RuntimeMngr__modules[mod_uuid]
+
+    def _actions(self):
+        return [m.payload['action'] for m in self.published]
+
+    def test_never_restarts_by_default(self):
+        rtmngr = self._rtmngr()
+        self._start()
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+        self.assertEqual(self._actions(), ['create', 'delete'])
+
+    def test_crashed_module_restarted_with_its_files(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.on_failure)
+        mngr_module = self._start()
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertEqual(mngr_module.state, ModuleState.restarting)
+        self.wait_for(lambda: self.launcher.restart_container.called and mngr_module.state == ModuleState.running)
+        self.launcher.fetch_files.assert_called_once()
+        self.assertEqual(self._actions(), ['create'])
+        self.assertEqual(rtmngr._RuntimeMngr__admission.active, 1)
+
+    def test_on_failure_clean_exit_not_restarted(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.on_failure)
+        self.launcher.exit_code.return_value = 0
+        self._start()
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+
+    def test_module_policy_overrides_runtime(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.never)
+        self.launcher.exit_code.return_value = 0
+        mngr_module = self._start(restart_policy=RestartPolicy.always)
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertEqual(mngr_module.state, ModuleState.restarting)
+
+    def test_deleted_module_not_restarted(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.always)
+        self._start()
+        rtmngr.control(delete_msg('mod-a'))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+        self.launcher.restart_container.assert_not_called()
+
+    def test_delete_while_restarting_cancels_restart(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.always, restart_backoff_sec=10, restart_backoff_max_sec=10)
+        self._start()
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        rtmngr.control(delete_msg('mod-a'))
+        self.assertEqual(self._actions(), ['create', 'delete'])
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+        self.assertEqual(len(rtmngr._RuntimeMngr__scheduler), 0)
+        self.wait_for(lambda: self.launcher.cleanup.called)
+        self.assertEqual(rtmngr._RuntimeMngr__admission.active, 0)
+
+    def test_restart_due_after_exit_dropped(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.on_failure, restart_backoff_sec=0.2, restart_backoff_max_sec=0.2)
+        mngr_module = self._start()
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertEqual(mngr_module.state, ModuleState.restarting)
+        # the create pool is shut down on exit; the timer call does not raise, the restart is dropped
+        rtmngr._RuntimeMngr__create_pool.shutdown()
+        self.assertFalse(rtmngr._RuntimeMngr__submit(rtmngr._RuntimeMngr__create_pool, rtmngr._RuntimeMngr__restart_pipeline, mngr_module))
+        rtmngr._RuntimeMngr__exited = True
+        self.assertFalse(rtmngr._RuntimeMngr__submit(rtmngr._RuntimeMngr__delete_pool, rtmngr._RuntimeMngr__restart_pipeline, mngr_module))
+        self.launcher.restart_container.assert_not_called()
+
+    def test_crash_loop_gives_up(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.always, restart_max_failures=2)
+        mngr_module = self._start()
+        for restarts in (1, 2):
+            rtmngr._RuntimeMngr__module_exit('mod-a')
+            self.wait_for(lambda: self.launcher.restart_container.call_count == restarts and mngr_module.state == ModuleState.running)
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.assertFalse(rtmngr.module_exists('mod-a'))
+        self.assertEqual(self._actions(), ['create', 'delete'])
+
+    def test_failed_restart_deletes_module(self):
+        rtmngr = self._rtmngr(restart_policy=RestartPolicy.always)
+        self.launcher.restart_container.side_effect = Exception("no docker")
+        self._start()
+        rtmngr._RuntimeMngr__module_exit('mod-a')
+        self.wait_for(lambda: not rtmngr.module_exists('mod-a'))
+        self.wait_for(lambda: self._actions() == ['create', 'delete'])
+        self.assertEqual(rtmngr._RuntimeMngr__admission.active, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for several runtime identities hosted in one process:
+  - each identity gets its own uuid, runtimes topic and journal
+  - topics are subscribed once on the shared connection; messages are delivered to every runtime subscribed
+  - only the first runtime sets the (single) last will of the connection
+  - one docker api client is shared by all containers
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pubsub import PubsubMessage
+from runtime.runtime_group import RuntimeGroup, identity_settings
+
+
+class _Settings(dict):
+    """Settings stand-in (dict with get, like dynaconf)"""
+
+
+def _settings(**runtime):
+    return _Settings({
+        'runtime': {'uuid': 'base-uuid', 'namespace': 'public', 'name': 'rt', 'max_nmodules': 10,
+                    'journal_path': '/tmp/journal.json', 'identities': [{'name': 'a'}], **runtime},
+        'topics': {'runtimes': 'realm/proc/reg/g/public/p/base-uuid', 'modules': 'realm/s/'},
+    })
+
+
+class TestIdentitySettings(unittest.TestCase):
+
+    def test_identity_overrides(self):
+        identity = identity_settings(_settings(), {'name': 'rt-gpu', 'max_nmodules': 2})
+        rt = identity['runtime']
+        self.assertEqual(rt['name'], 'rt-gpu')
+        self.assertEqual(rt['max_nmodules'], 2)
+        self.assertNotIn('identities', rt)
+        self.assertNotEqual(rt['uuid'], 'base-uuid')
+        self.assertEqual(rt['journal_path'], f"/tmp/journal.json.{rt['uuid']}")
+        self.assertEqual(identity['topics']['runtimes'], f"realm/proc/reg/g/public/p/{rt['uuid']}")
+        self.assertEqual(identity['topics']['modules'], 'realm/s/')
+
+    def test_identity_fixed_uuid_and_namespace(self):
+        identity = identity_settings(_settings(), {'uuid': 'fixed', 'namespace': 'ns'})
+        self.assertEqual(identity['runtime']['uuid'], 'fixed')
+        self.assertEqual(identity['topics']['runtimes'], 'realm/proc/reg/g/ns/p/fixed')
+
+    def test_identities_distinct(self):
+        uuids = {identity_settings(_settings(), {})['runtime']['uuid'] for _ in range(3)}
+        self.assertEqual(len(uuids), 3)
+
+
+class TestRuntimeGroup(unittest.TestCase):
+
+    def setUp(self):
+        self.group = RuntimeGroup('realm/proc/reg/g/public/p/a')
+        self.rtmngrs = [MagicMock(), MagicMock()]
+        for rtmngr in self.rtmngrs: self.group.add(rtmngr)
+        self.conn = MagicMock()
+        self.group.pubsub_connected(self.conn)
+        # the pubsub client each runtime was given
+        self.clients = [rtmngr.pubsub_connected.call_args[0][0] for rtmngr in self.rtmngrs]
+
+    def tearDown(self):
+        self.group.exit()
+
+    def test_connected_relayed(self):
+        self.assertEqual(len(self.group), 2)
+        self.assertIsNot(self.clients[0], self.clients[1])
+        self.group.pubsub_disconnected()
+        for rtmngr in self.rtmngrs: rtmngr.pubsub_disconnected.assert_called_once()
+
+    def test_messages_delivered_to_each_runtime(self):
+        handlers = [MagicMock(return_value=None), MagicMock(return_value=PubsubMessage('out', {'ok': 1}))]
+        for client, handler in zip(self.clients, handlers): client.message_handler_add('realm/s/', handler)
+        self.assertEqual(self.conn.message_handler_add.call_count, 2)
+        deliver = self.conn.message_handler_add.call_args[0][1]
+
+        msg = PubsubMessage('realm/s/', {'data': {'uuid': 'x'}})
+        deliver(msg)
+        msgs = [handler.call_args[0][0] for handler in handlers]
+        for rt_msg in msgs: self.assertEqual(rt_msg.payload, {'data': {'uuid': 'x'}})
+        # each runtime gets its own copy
+        self.assertIsNot(msgs[0].payload, msgs[1].payload)
+        self.conn.message_publish.assert_called_once()
+
+    def test_handler_error_published(self):
+        self.clients[0].message_handler_add('realm/s/', MagicMock(side_effect=ValueError('bad')))
+        deliver = self.conn.message_handler_add.call_args[0][1]
+        deliver(PubsubMessage('realm/s/', {}))
+        resp = self.conn.message_publish.call_args[0][0]
+        self.assertEqual(resp.topic, 'realm/proc/reg/g/public/p/a')
+
+    def test_unsubscribe_with_last_runtime(self):
+        for client in self.clients: client.message_handler_add('realm/s/', MagicMock())
+        self.clients[0].message_handler_remove('realm/s/')
+        self.conn.message_handler_remove.assert_not_called()
+        self.clients[1].message_handler_remove('realm/s/')
+        self.conn.message_handler_remove.assert_called_once_with('realm/s/')
+
+    def test_last_will_of_first_runtime(self):
+        self.clients[1].last_will_set(PubsubMessage('b', {}))
+        self.conn.last_will_set.assert_not_called()
+        self.clients[0].last_will_set(PubsubMessage('a', {}))
+        self.conn.last_will_set.assert_called_once()
+
+    def test_runtime_disconnect_keeps_connection(self):
+        self.clients[0].disconnect()
+        self.conn.disconnect.assert_not_called()
+        self.group.exit()
+        for rtmngr in self.rtmngrs: rtmngr.exit.assert_called()
+        self.conn.disconnect.assert_called()
+
+
+class TestSharedDockerApi(unittest.TestCase):
+
+    @patch('launcher.docker_client.docker.from_env')
+    def test_one_api_client(self, from_env):
+        from launcher.docker_client import DockerClient
+        DockerClient._DockerClient__docker_api_client = None
+        try:
+            first, second = DockerClient(), DockerClient()
+            self.assertIs(first._client, second._client)
+            from_env.assert_called_once()
+        finally:
+            DockerClient._DockerClient__docker_api_client = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Unit tests for the runtime scheduler:
+  - calls run at their deadline, in deadline order; periodic calls repeat
+  - cancelled calls never run; stop drops pending calls
+  - modules are deleted once they reach their max lifetime
+"""
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from common import LauncherException
+from model import ModuleState
+from runtime.scheduler import Scheduler
+from tests.helpers import RuntimeTestCase, create_msg
+
+
+class TestScheduler(RuntimeTestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.addCleanup(self.scheduler.stop)
+        self.calls = []
+
+    def test_calls_run_in_deadline_order(self):
+        self.scheduler.call_later(0.1, self.calls.append, 'late')
+        self.scheduler.call_later(0.02, self.calls.append, 'early')
+        self.wait_for(lambda: len(self.calls) == 2)
+        self.assertEqual(self.calls, ['early', 'late'])
+
+    def test_call_not_run_before_deadline(self):
+        self.scheduler.call_later(0.3, self.calls.append, 'x')
+        time.sleep(0.1)
+        self.assertEqual(self.calls, [])
+
+    def test_periodic_call_repeats_until_cancelled(self):
+        call = self.scheduler.call_every(0.02, self.calls.append, 'tick')
+        self.wait_for(lambda: len(self.calls) >= 3)
+        call.cancel()
+        time.sleep(0.05)
+        count = len(self.calls)
+        time.sleep(0.1)
+        self.assertEqual(len(self.calls), count)
+
+    def test_cancelled_call_never_runs(self):
+        call = self.scheduler.call_later(0.05, self.calls.append, 'x')
+        call.cancel()
+        time.sleep(0.1)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_failing_call_does_not_stop_scheduler(self):
+        self.scheduler.call_later(0, MagicMock(side_effect=Exception("boom"), __name__='boom'))
+        self.scheduler.call_later(0.02, self.calls.append, 'x')
+        self.wait_for(lambda: self.calls == ['x'])
+
+    def test_cancelled_calls_compacted(self):
+        calls = [self.scheduler.call_later(60, self.calls.append, i) for i in range(200)]
+        for call in calls[:150]: call.cancel()
+        self.assertEqual(len(self.scheduler), 50)
+        self.assertLess(len(self.scheduler._Scheduler__heap), 200)
+
+    def test_stop_drops_pending_calls(self):
+        self.scheduler.call_later(0.05, self.calls.append, 'x')
+        self.scheduler.stop()
+        self.scheduler.call_later(0, self.calls.append, 'y')
+        time.sleep(0.1)
+        self.assertEqual(self.calls, [])
+
+    def test_periodic_call_on_executor_does_not_overlap(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(executor.shutdown)
+        scheduler = Scheduler(executor=executor)
+        self.addCleanup(scheduler.stop)
+        running = []
+        overlaps = []
+
+        def slow():
+            if running: overlaps.append(1)
+            running.append(1)
+            time.sleep(0.05)
+            running.pop()
+            self.calls.append(1)
+
+        scheduler.call_every(0.01, slow)
+        self.wait_for(lambda: len(self.calls) >= 3)
+        self.assertEqual(overlaps, [])
+
+
+class TestModuleLifetime(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.start_runtime(module_max_lifetime_sec=60)
+
+    def test_module_stopped_at_max_lifetime(self):
+        self.rtmngr.control(create_msg('mod-a', max_lifetime_sec=0.05))
+        self.wait_for(lambda: self.launcher.stop_module.called)
+        self.assertEqual(self.rtmngr._RuntimeMngr__modules['mod-a'].state, ModuleState.stopping)
+
+    def test_module_not_running_at_max_lifetime_is_forgotten(self):
+        self.launcher.stop_module.side_effect = LauncherException("not running")
+        self.rtmngr.control(create_msg('mod-b', max_lifetime_sec=0.05))
+        self.wait_for(lambda: any(m.payload['action'] == 'delete' for m in self.published))
+        self.assertFalse(self.rtmngr.module_exists('mod-b'))
+
+    def test_expiry_does_not_wait_for_stop(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.launcher.stop_module.side_effect = lambda *args: release.wait(5)
+        self.rtmngr.control(create_msg('mod-d'))
+        self.wait_for(lambda: len(self.published) == 1)
+        mngr_module = self.rtmngr._RuntimeMngr__modules['mod-d']
+        start = time.time()
+        self.rtmngr._RuntimeMngr__lifetime_expired(mngr_module)
+        self.assertLess(time.time() - start, 0.5)
+        self.wait_for(lambda: self.launcher.stop_module.called)
+
+    def test_sweeps_do_not_overlap(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+        sweep = lambda: (calls.append(1), release.wait(5))
+        for _ in range(3): self.rtmngr._RuntimeMngr__sweep('keepalive', sweep)
+        self.wait_for(lambda: calls)
+        time.sleep(0.05)
+        self.assertEqual(len(calls), 1)
+        release.set()
+        self.wait_for(lambda: not self.rtmngr._RuntimeMngr__sweeps)
+        self.rtmngr._RuntimeMngr__sweep('keepalive', sweep)
+        self.wait_for(lambda: len(calls) == 2)
+
+    def test_expiry_after_exit_dropped(self):
+        self.rtmngr.control(create_msg('mod-e'))
+        self.wait_for(lambda: len(self.published) == 1)
+        mngr_module = self.rtmngr._RuntimeMngr__modules['mod-e']
+        self.rtmngr._RuntimeMngr__delete_pool.shutdown()
+        # does not raise on the timer thread
+        self.rtmngr._RuntimeMngr__lifetime_expired(mngr_module)
+        self.rtmngr._RuntimeMngr__delete_inactive_module('mod-e')
+        self.launcher.stop_module.assert_not_called()
+
+    def test_sweeps_not_queued_behind_creates(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.launcher.fetch_files.side_effect = lambda *args: release.wait(5)
+        # every create worker busy, more creates waiting
+        for i in range(4): self.rtmngr.control(create_msg(f"mod-f{i}"))
+        self.wait_for(lambda: self.launcher.fetch_files.call_count == 2)
+        swept = threading.Event()
+        self.rtmngr._RuntimeMngr__sweep('keepalive', swept.set)
+        self.assertTrue(swept.wait(1))
+
+    def test_exit_cancels_lifetime_expiry(self):
+        self.rtmngr.control(create_msg('mod-c'))
+        self.wait_for(lambda: len(self.published) == 1)
+        mngr_module = self.rtmngr._RuntimeMngr__modules['mod-c']
+        timers = list(mngr_module.timers)
+        self.assertEqual(len(timers), 1)
+        self.rtmngr._RuntimeMngr__module_exit('mod-c')
+        self.assertTrue(all(timer.cancelled for timer in timers))
+
+
+if __name__ == '__main__':
+    unittest.main()
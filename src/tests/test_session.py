@@ -0,0 +1,124 @@
+"""
+Unit tests for the runtime pubsub session lifecycle:
+  - background workers and last will are set up once, no matter how many reconnects
+  - reconnects with a resumed session do not register again
+  - MQTTListner renews subscriptions when the session was not resumed
+"""
+import time
+import types
+import unittest
+from unittest.mock import MagicMock
+
+import paho.mqtt.client as paho
+
+from model import Action
+from pubsub.listner import MQTTListner
+from tests.helpers import RuntimeTestCase
+
+
+class TestSessionLifecycle(RuntimeTestCase):
+
+    def setUp(self):
+        self.pubsubc = MagicMock()
+
+    def _rtmngr(self, reg_attempts):
+        # connected by the tests (no pubsub client yet)
+        rtmngr = self.start_runtime(ka_interval_sec=60, inactivity_timeout_sec=60, inactivity_check_interval_sec=60,
+                                    reg_timeout_seconds=0.2, reg_attempts=reg_attempts)
+        rtmngr._RuntimeMngr__pubsub_client = None
+        return rtmngr
+
+    def _reg_msgs(self):
+        return [c.args[0] for c in self.pubsubc.message_publish.call_args_list 
+                if c.args[0].payload.get('action') == Action.create]
+
+    def _registered(self):
+        rtmngr = self.rtmngr
+        rtmngr.reg(types.SimpleNamespace(get=lambda key: {'result': 'ok'}))
+        rtmngr.wait_init(2)
+
+    def test_workers_started_once_across_reconnects(self):
+        rtmngr = self._rtmngr(reg_attempts=-1)
+        for _ in range(3):
+            rtmngr.pubsub_connected(self.pubsubc, session_present=False)
+        # keepalive is the only runtime-wide periodic call
+        self.assertEqual(len(rtmngr._RuntimeMngr__scheduler), 1)
+
+    def test_last_will_set_once(self):
+        rtmngr = self._rtmngr(reg_attempts=-1)
+        rtmngr.pubsub_connected(self.pubsubc)
+        rtmngr.pubsub_connected(self.pubsubc)
+        self.pubsubc.last_will_set.assert_called_once()
+        self.assertEqual(self.pubsubc.last_will_set.call_args[0][0].qos, 1)
+
+    def test_resumed_session_skips_registration(self):
+        rtmngr = self._rtmngr(reg_attempts=0)
+        rtmngr.pubsub_connected(self.pubsubc)
+        self._registered()
+        count = len(self._reg_msgs())
+        rtmngr.pubsub_disconnected()
+        rtmngr.pubsub_connected(self.pubsubc, session_present=True)
+        time.sleep(0.1)
+        self.assertEqual(len(self._reg_msgs()), count)
+
+    def test_lost_session_registers_again(self):
+        rtmngr = self._rtmngr(reg_attempts=0)
+        rtmngr.pubsub_connected(self.pubsubc)
+        self._registered()
+        count = len(self._reg_msgs())
+        rtmngr.pubsub_connected(self.pubsubc, session_present=False)
+        deadline = time.time() + 2
+        while len(self._reg_msgs()) == count and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(len(self._reg_msgs()), count)
+
+    def test_reconnect_while_registering_does_not_start_another_registration(self):
+        rtmngr = self._rtmngr(reg_attempts=0)
+        rtmngr.pubsub_connected(self.pubsubc)
+        rtmngr.pubsub_connected(self.pubsubc)
+        time.sleep(0.1)
+        self.assertEqual(len(self._reg_msgs()), 1)
+
+    def test_registration_gives_up_after_attempts(self):
+        rtmngr = self._rtmngr(reg_attempts=2)
+        rtmngr.pubsub_connected(self.pubsubc)
+        rtmngr.wait_init(2)
+        self.assertEqual(len(self._reg_msgs()), 2)
+
+
+class _Handler():
+    def __init__(self):
+        self.connected = []
+
+    def pubsub_connected(self, client, session_present=False):
+        self.connected.append(session_present)
+
+
+class TestListnerResubscribe(unittest.TestCase):
+
+    def _listner(self):
+        # only the state on_connect uses; no mqtt client
+        listner = types.SimpleNamespace(
+            _MQTTListner__subscribe_mid={},
+            _MQTTListner__topics={'a/topic': True},
+            _MQTTListner__pubsub_handler=_Handler(),
+            subscribe=MagicMock(return_value=(paho.MQTT_ERR_SUCCESS, 1)))
+        for name in ['on_connect', '_MQTTListner__resubscribe', '_MQTTListner__pubsub_handler_call']:
+            setattr(listner, name, types.MethodType(getattr(MQTTListner, name), listner))
+        return listner
+
+    def test_resubscribes_when_session_not_resumed(self):
+        listner = self._listner()
+        listner.on_connect(listner, None, types.SimpleNamespace(session_present=False), 0, None)
+        listner.subscribe.assert_called_once_with('a/topic')
+        self.assertEqual(listner._MQTTListner__pubsub_handler.connected, [False])
+
+    def test_no_resubscribe_when_session_resumed(self):
+        listner = self._listner()
+        listner.on_connect(listner, None, types.SimpleNamespace(session_present=True), 0, None)
+        listner.subscribe.assert_not_called()
+        self.assertEqual(listner._MQTTListner__pubsub_handler.connected, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+"""
+Unit tests for the sharded runtime:
+  - modules are partitioned by uuid; shard settings split capacity, quotas and journal
+  - the supervisor merges the keepalive module lists of the shards and collects their bulk results; modules of a
+    shard that dies mid-bulk get error results; the modules of a dead shard are adopted by its restart
+  - a shard handles only the requests on the modules it owns; the supervisor only answers bulk requests
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from model import Result, SlMsgs
+from runtime.shards import ShardLink, ShardSet, shard_of, shard_settings
+from tests.helpers import RT_UUID, RuntimeTestCase, create_msg, delete_msg, rt_cfg
+
+
+def _bulk_create_msg(mod_uuids):
+    mods = [{'uuid': mod_uuid, 'name': f"mod-{mod_uuid}", 'file': 'test.py', 'filetype': 'PY',
+             'location': 'arena/test', 'parent': RT_UUID} for mod_uuid in mod_uuids]
+    return SlMsgs('orchestrator').req('realm/modules', 'bulk_create', {'modules': mods}, convert=False)
+
+
+def _owned(index, count, n=20):
+    """uuids of modules partitioned to shard index"""
+    return [f"mod-{i}" for i in range(n) if shard_of(f"mod-{i}", count) == index]
+
+
+class TestShardPartition(unittest.TestCase):
+
+    def test_shard_of_stable_and_spread(self):
+        shards = [shard_of(f"mod-{i}", 4) for i in range(200)]
+        self.assertEqual(shards, [shard_of(f"mod-{i}", 4) for i in range(200)])
+        self.assertEqual(set(shards), {0, 1, 2, 3})
+
+    def test_shard_settings(self):
+        cfg = {'runtime': {'max_nmodules': 10, 'journal_path': '/tmp/journal.json',
+                           'quotas': {'scene': {'max_modules': 3, 'max_cpus': 4, 'create_rate': 2, 'create_burst': 2},
+                                      'overrides': {'ns': {'max_mem_mb': 1024}}}},
+               'mqtt': {'cid': 'rt'}}
+        shard_cfg = shard_settings(cfg, 1, 4)
+        rt = shard_cfg['runtime']
+        self.assertEqual(rt['max_nmodules'], 3)
+        self.assertEqual(rt['journal_path'], '/tmp/journal.json.shard1')
+        self.assertEqual(rt['quotas']['scene'], {'max_modules': 1, 'max_cpus': 1, 'create_rate': 0.5, 'create_burst': 1})
+        self.assertEqual(rt['quotas']['overrides']['ns'], {'max_mem_mb': 256})
+        self.assertEqual(shard_cfg['mqtt']['cid'], 'rt-shard1')
+        # the runtime settings are not changed
+        self.assertEqual(cfg['runtime']['max_nmodules'], 10)
+
+    def test_shards_always_journaled(self):
+        rt = shard_settings({'runtime': {'uuid': RT_UUID}}, 1, 2)['runtime']
+        self.assertEqual(rt['journal_path'], os.path.join(tempfile.gettempdir(), f"slruntime-{RT_UUID}.journal.shard1"))
+
+
+class TestShardSet(unittest.TestCase):
+
+    def test_children_merged(self):
+        shards = ShardSet(2, {})
+        shards._ShardSet__received(0, ('children', [{'uuid': 'a'}]))
+        shards._ShardSet__received(1, ('children', [{'uuid': 'b'}]))
+        shards._ShardSet__received(0, ('children', [{'uuid': 'c'}]))
+        self.assertCountEqual(shards.children(), [{'uuid': 'b'}, {'uuid': 'c'}])
+
+    def test_bulk_collected_from_all_shards(self):
+        shards = ShardSet(2, {})
+        on_complete = MagicMock()
+        # shard results might arrive before the supervisor handled the request
+        shards._ShardSet__received(1, ('bulk', 'req-a', [{'uuid': 'b', 'result': Result.ok}]))
+        shards.collect('req-a', on_complete)
+        on_complete.assert_not_called()
+        shards._ShardSet__received(1, ('bulk', 'req-a', [{'uuid': 'b', 'result': Result.ok}]))
+        shards._ShardSet__received(0, ('bulk', 'req-a', []))
+        on_complete.assert_called_once_with([{'uuid': 'b', 'result': Result.ok}])
+
+    def _kill(self, shards, index, msgs=()):
+        """Shard index sends msgs, then its process dies"""
+        conn = MagicMock()
+        conn.recv.side_effect = [*msgs, EOFError()]
+        with patch.object(ShardSet, '_ShardSet__start') as start:
+            shards._ShardSet__read(index, MagicMock(exitcode=-9), conn)
+        start.assert_called_once_with(index)
+
+    def test_modules_of_dead_shard_kept_until_it_reports(self):
+        shards = ShardSet(2, {}, restart_delay_sec=0)
+        shards._ShardSet__received(1, ('children', [{'uuid': 'b'}]))
+        self._kill(shards, 0, [('children', [{'uuid': 'a'}])])
+        # still running (the restarted shard adopts them)
+        self.assertCountEqual(shards.children(), [{'uuid': 'a'}, {'uuid': 'b'}])
+        shards._ShardSet__received(0, ('children', []))
+        self.assertEqual(shards.children(), [{'uuid': 'b'}])
+
+    def test_bulk_completed_when_shard_dies(self):
+        shards = ShardSet(2, {}, restart_delay_sec=0)
+        on_complete = MagicMock()
+        mod_uuids = _owned(0, 2, 6) + _owned(1, 2, 6)
+        shards.collect('req-a', on_complete, mod_uuids=mod_uuids)
+        shards._ShardSet__received(1, ('bulk', 'req-a', [{'uuid': mod_uuid, 'result': Result.ok} for mod_uuid in _owned(1, 2, 6)]))
+        # shard 0 dies mid-bulk
+        self._kill(shards, 0)
+        results = on_complete.call_args[0][0]
+        self.assertCountEqual([r['uuid'] for r in results], mod_uuids)
+        self.assertEqual({r['uuid'] for r in results if r['result'] == Result.err}, set(_owned(0, 2, 6)))
+        self.assertEqual(results[-1]['details']['desc'], 'Shard exited')
+        # the restarted shard answering a retry is ignored
+        shards._ShardSet__received(0, ('bulk', 'req-a', []))
+        on_complete.assert_called_once()
+
+    def test_shard_dies_before_request_collected(self):
+        shards = ShardSet(2, {}, restart_delay_sec=0)
+        on_complete = MagicMock()
+        self._kill(shards, 0, [('bulk', 'req-a', [])])
+        shards._ShardSet__received(1, ('bulk', 'req-b', [{'uuid': 'mod-b', 'result': Result.ok}]))
+        self._kill(shards, 0)
+        shards.collect('req-b', on_complete, mod_uuids=['mod-b'] + _owned(0, 2, 6))
+        self.assertEqual([r['result'] for r in on_complete.call_args[0][0]], [Result.ok] + [Result.err] * len(_owned(0, 2, 6)))
+
+
+class TestShardRuntime(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.conn = MagicMock()
+        self.start_runtime(mngr_args={'shard': ShardLink(0, 2, self.conn)})
+
+    def test_requests_on_other_shards_ignored(self):
+        mine, theirs = _owned(0, 2)[0], _owned(1, 2)[0]
+        self.rtmngr._RuntimeMngr__control_dispatch(create_msg(theirs))
+        self.rtmngr._RuntimeMngr__control_dispatch(delete_msg(theirs))
+        create_req = create_msg(mine)
+        self.rtmngr._RuntimeMngr__control_dispatch(create_req)
+        self.wait_for(lambda: len(self.published) == 2)
+        self.assertEqual({m.payload['object_id'] for m in self.published}, {create_req.payload['object_id']})
+        self.assertTrue(self.rtmngr.module_exists(mine))
+        self.assertFalse(self.rtmngr.module_exists(theirs))
+
+    def test_bulk_results_handed_to_supervisor(self):
+        mod_uuids = [f"mod-{i}" for i in range(10)]
+        bulk_msg = _bulk_create_msg(mod_uuids)
+        self.assertIsNone(self.rtmngr.control(bulk_msg))
+        self.wait_for(lambda: self.conn.send.called)
+        (kind, object_id, results), = self.conn.send.call_args[0]
+        self.assertEqual((kind, object_id), ('bulk', bulk_msg.payload['object_id']))
+        self.assertCountEqual([r['uuid'] for r in results], [u for u in mod_uuids if shard_of(u, 2) == 0])
+        self.assertEqual(self.published, [])
+
+    def test_keepalive_handed_to_supervisor(self):
+        self.rtmngr._RuntimeMngr__keepalive()
+        self.conn.send.assert_called_once_with(('children', []))
+        self.assertEqual(self.published, [])
+
+    def test_no_registration_or_last_will(self):
+        client = MagicMock()
+        self.rtmngr.pubsub_connected(client)
+        client.last_will_set.assert_not_called()
+        self.assertTrue(self.rtmngr._RuntimeMngr__init_done_event.wait(2))
+        client.message_publish.assert_not_called()
+
+
+class TestSupervisorRuntime(RuntimeTestCase):
+
+    def setUp(self):
+        self.shards = MagicMock()
+        self.shards.count = 2
+        self.start_runtime(mngr_args={'shards': self.shards}, response_cache_size=100)
+
+    def test_module_requests_left_to_shards(self):
+        self.assertIsNone(self.rtmngr._RuntimeMngr__control_dispatch(create_msg('mod-a')))
+        time.sleep(0.05)
+        self.assertEqual(self.published, [])
+
+    def test_bulk_answered_with_results_of_all_shards(self):
+        bulk_msg = _bulk_create_msg(['mod-a', 'mod-b'])
+        self.assertIsNone(self.rtmngr.control(bulk_msg))
+        self.assertEqual(self.published[0].payload['data']['result'], Result.pending)
+        object_id, on_complete = self.shards.collect.call_args[0]
+        self.assertEqual(object_id, bulk_msg.payload['object_id'])
+        self.assertEqual(self.shards.collect.call_args.kwargs['mod_uuids'], ['mod-a', 'mod-b'])
+        on_complete([{'uuid': 'mod-a', 'result': Result.ok}, {'uuid': 'mod-b', 'result': Result.ok}])
+        self.assertEqual(self.published[1].payload['data']['result'], Result.ok)
+        self.assertEqual(self.published[1].payload['data']['details']['counts'], {Result.ok: 2})
+        # a retry gets the final confirm
+        self.assertIs(self.rtmngr.control(bulk_msg), self.published[1])
+
+    def test_keepalive_lists_modules_of_all_shards(self):
+        self.shards.children.return_value = [{'uuid': 'mod-a'}, {'uuid': 'mod-b'}]
+        self.rtmngr._RuntimeMngr__keepalive()
+        self.assertEqual(self.published[0].payload['data']['children'], [{'uuid': 'mod-a'}, {'uuid': 'mod-b'}])
+
+    def test_shards_started_after_registration(self):
+        self.rtmngr._RuntimeMngr__start_workers()
+        self.shards.start.assert_called_once()
+
+
+class TestShardRestart(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.launcher.adopt_container.return_value = True
+        self.launcher.launcher_state.return_value = {}
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        self.cfg = shard_settings(rt_cfg(journal_path=os.path.join(journal_dir, 'journal')), 0, 2)
+
+    def _shard(self):
+        return self.start_runtime(self.cfg, mngr_args={'shard': ShardLink(0, 2, MagicMock())})
+
+    def test_restarted_shard_adopts_modules_of_dead_shard(self):
+        mod_uuid = _owned(0, 2)[0]
+        self._shard().control(create_msg(mod_uuid))
+        self.wait_for(lambda: len(self.published) == 1)
+        # the shard process dies (its containers keep running); the restarted shard adopts them
+        restarted = self._shard()
+        restarted._RuntimeMngr__register_runtime_done()
+        self.wait_for(lambda: restarted.module_exists(mod_uuid) and self.launcher.adopt_container.called)
+        self.launcher.create_container.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+Unit tests for runtime shutdown:
+  - modules are stopped concurrently, within the shutdown deadline
+  - outstanding messages are flushed instead of sleeping
+  - MQTTListner.flush waits for publish acknowledgements (QoS > 0); acknowledgements may come before publish() returns
+"""
+import threading
+from collections import OrderedDict
+import types
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from pubsub import PubsubMessage
+from pubsub.listner import MQTTListner
+from runtime.runtime_mngr import RuntimeMngr
+from tests.helpers import rt_cfg
+
+
+class TestShutdown(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('runtime.runtime_mngr.LauncherContext.get_launcher_for_module')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.rtmngr = RuntimeMngr(**rt_cfg(shutdown_timeout_sec=1, stop_grace_sec=10))
+        self.pubsubc = MagicMock()
+        self.rtmngr._RuntimeMngr__pubsub_client = self.pubsubc
+        self.rtmngr._RuntimeMngr__lastwill_msg = MagicMock()
+
+    def tearDown(self):
+        self.rtmngr._RuntimeMngr__exited = True
+
+    def _add_module(self, mod_uuid, stop):
+        mod = MagicMock()
+        mod.module.uuid = mod_uuid
+        mod.module.stop_grace_sec = None
+        mod.cancel.return_value = False
+        mod.stop.side_effect = stop
+        self.rtmngr._RuntimeMngr__modules[mod_uuid] = mod
+        return mod
+
+    def test_modules_stopped_concurrently(self):
+        barrier = threading.Barrier(5, timeout=0.8)
+        mods = [self._add_module(f"m{i}", lambda grace_sec: barrier.wait()) for i in range(5)]
+        start = time.time()
+        self.rtmngr._RuntimeMngr__exit_handler()
+        self.assertLess(time.time() - start, 0.8)
+        self.assertFalse(barrier.broken)
+        for mod in mods: mod.stop.assert_called_once()
+
+    def test_grace_cut_to_shutdown_deadline(self):
+        mod = self._add_module('m', lambda grace_sec: None)
+        self.rtmngr._RuntimeMngr__exit_handler()
+        self.assertLessEqual(mod.stop.call_args[0][0], 1)
+
+    def test_shutdown_bounded_by_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self._add_module('stuck', lambda grace_sec: release.wait(5))
+        start = time.time()
+        self.rtmngr._RuntimeMngr__exit_handler()
+        self.assertLess(time.time() - start, 2)
+        self.assertTrue(self.rtmngr._RuntimeMngr__exited)
+
+    def test_not_running_modules_are_cancelled(self):
+        mod = self._add_module('parked', None)
+        mod.cancel.return_value = True
+        mod.in_create = False
+        self.rtmngr._RuntimeMngr__exit_handler()
+        mod.stop.assert_not_called()
+        mod.cleanup.assert_called_once()
+
+    def test_lastwill_published_then_flushed(self):
+        self.rtmngr._RuntimeMngr__exit_handler()
+        names = [c[0] for c in self.pubsubc.method_calls]
+        self.assertEqual(names, ['message_publish', 'flush'])
+        self.assertLessEqual(self.pubsubc.flush.call_args[0][0], 1)
+
+    def test_deletes_published_with_qos1(self):
+        mod = self._add_module('m', lambda grace_sec: self.rtmngr._RuntimeMngr__module_exit('m'))
+        mod.module.delete_msg.return_value = PubsubMessage('realm/modules', {'action': 'delete'})
+        self.rtmngr._RuntimeMngr__exit_handler()
+        delete_msg = self.pubsubc.message_publish.call_args_list[0][0][0]
+        self.assertEqual((delete_msg.payload['action'], delete_msg.qos), ('delete', 1))
+
+    def test_not_connected(self):
+        self.rtmngr._RuntimeMngr__pubsub_client = None
+        self.rtmngr.exit()
+        self.assertTrue(self.rtmngr._RuntimeMngr__exited)
+
+
+class TestListnerFlush(unittest.TestCase):
+
+    def _listner(self, *msg_infos):
+        # only the flush state; no mqtt client
+        listner = types.SimpleNamespace(
+            _MQTTListner__unacked_lock=threading.Lock(),
+            _MQTTListner__unacked={mi.mid: mi for mi in msg_infos},
+            _MQTTListner__acked=OrderedDict())
+        listner.flush = lambda timeout_sec: MQTTListner.flush(listner, timeout_sec)
+        listner.on_publish = lambda *args: MQTTListner.on_publish(listner, *args)
+        return listner
+
+    def _msg_info(self, mid, published=True):
+        msg_info = MagicMock()
+        msg_info.mid = mid
+        msg_info.is_published.return_value = published
+        return msg_info
+
+    def test_flush_waits_for_unacked(self):
+        msg_info = self._msg_info(1)
+        self.assertTrue(self._listner(msg_info).flush(1))
+        msg_info.wait_for_publish.assert_called_once()
+        self.assertLessEqual(msg_info.wait_for_publish.call_args[0][0], 1)
+
+    def test_flush_reports_unacked(self):
+        self.assertFalse(self._listner(self._msg_info(1, published=False)).flush(0.1))
+
+    def test_flush_drops_messages_never_queued(self):
+        msg_info = self._msg_info(2, published=False)
+        msg_info.wait_for_publish.side_effect = RuntimeError("not connected")
+        listner = self._listner(msg_info)
+        listner.flush(1)
+        self.assertEqual(listner._MQTTListner__unacked, {})
+
+    def test_publish_with_qos(self):
+        listner = self._listner()
+        listner.publish = MagicMock(return_value=self._msg_info(4, published=False))
+        MQTTListner.message_publish(listner, PubsubMessage('realm/runtimes', {'action': 'delete'}, qos=1))
+        self.assertEqual(listner.publish.call_args.kwargs['qos'], 1)
+        self.assertIn(4, listner._MQTTListner__unacked)
+
+    def test_qos0_not_kept(self):
+        listner = self._listner()
+        listner.publish = MagicMock(return_value=self._msg_info(5, published=False))
+        MQTTListner.message_publish(listner, PubsubMessage('realm/runtimes', {'action': 'delete'}))
+        self.assertEqual(listner._MQTTListner__unacked, {})
+
+    def test_publish_not_holding_lock(self):
+        listner = self._listner()
+        lock = listner._MQTTListner__unacked_lock
+        def publish(*args, **kwargs):
+            # paho acknowledges (on its network thread, holding its own lock) while publish() runs
+            acked = threading.Thread(target=listner.on_publish, args=(None, None, 6, 0, None))
+            acked.start()
+            acked.join(1)
+            self.assertFalse(acked.is_alive())
+            self.assertFalse(lock.locked())
+            return self._msg_info(6, published=False)
+        listner.publish = publish
+        MQTTListner.message_publish(listner, PubsubMessage('realm/runtimes', {'action': 'delete'}, qos=1))
+        # acknowledged before it was recorded; not waited for
+        self.assertEqual(listner._MQTTListner__unacked, {})
+        self.assertTrue(listner.flush(0.1))
+
+    def test_on_publish_acks_message(self):
+        listner = self._listner(self._msg_info(3, published=False))
+        listner.on_publish(None, None, 3, 0, None)
+        self.assertEqual(listner._MQTTListner__unacked, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
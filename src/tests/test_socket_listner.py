@@ -0,0 +1,150 @@
+"""
+Unit tests for the local control socket:
+  - framed json requests are handled by the topic handlers and answered on the connection (and published on mqtt)
+  - connections subscribe to the messages the runtime publishes
+  - invalid frames, unknown topics and oversized frames
+  - a RuntimeMngr behind the socket answers queries
+"""
+import json
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from common import InvalidArgument
+from pubsub import PubsubMessage, SocketListner
+from tests.helpers import RT_CFG, RT_UUID, RuntimeTestCase
+
+
+class _Client():
+    """Control socket client"""
+
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(2)
+        self.sock.connect(path)
+
+    def send(self, obj):
+        frame = json.dumps(obj).encode('utf-8')
+        self.sock.sendall(struct.pack('!I', len(frame)) + frame)
+
+    def recv(self):
+        header = self.__read(4)
+        if header is None: return None
+        return json.loads(self.__read(struct.unpack('!I', header)[0]))
+
+    def __read(self, nbytes):
+        data = b''
+        while len(data) < nbytes:
+            chunk = self.sock.recv(nbytes - len(data))
+            if not chunk: return None
+            data += chunk
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+class TestSocketListner(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'control.sock')
+        self.handler = MagicMock()
+        self.mqttc = MagicMock()
+        self.listner = SocketListner(self.handler, self.path, error_topic='realm/errors', max_frame_bytes=1024)
+        self.addCleanup(self.listner.close)
+        self.listner.pubsub_connected(self.mqttc, True)
+        self.client = _Client(self.path)
+        self.addCleanup(self.client.close)
+
+    def test_runtime_connected_through_socket(self):
+        self.handler.pubsub_connected.assert_called_once_with(self.listner, True)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o660)
+
+    def test_request_answered_on_connection(self):
+        handler = MagicMock(side_effect=lambda msg: PubsubMessage('realm/resp', {'echo': msg.payload}))
+        self.listner.message_handler_add('realm/modules/#', handler)
+        self.mqttc.message_handler_add.assert_called_once_with('realm/modules/#', handler, True)
+
+        self.client.send({'topic': 'realm/modules/x', 'payload': {'action': 'list'}})
+        self.assertEqual(self.client.recv(), {'topic': 'realm/resp', 'payload': {'echo': {'action': 'list'}}})
+        self.assertEqual(self.mqttc.message_publish.call_args.args[0].payload, {'echo': {'action': 'list'}})
+
+    def test_handler_errors(self):
+        def fail(msg): raise InvalidArgument('uuid', 'x')
+        self.listner.message_handler_add('realm/modules', fail)
+        self.client.send({'topic': 'realm/modules', 'payload': {}})
+        resp = self.client.recv()
+        self.assertEqual(resp['topic'], 'realm/errors')
+
+        self.client.send({'topic': 'realm/other', 'payload': {}})
+        self.assertEqual(self.client.recv()['payload']['desc'], 'Invalid topic')
+
+        frame = b'not json'
+        self.client.sock.sendall(struct.pack('!I', len(frame)) + frame)
+        self.assertEqual(self.client.recv()['payload']['desc'], 'Invalid JSON')
+
+    def test_subscribed_connections_get_publishes(self):
+        self.client.send({'subscribe': 'realm/s/#'})
+        other = _Client(self.path)
+        self.addCleanup(other.close)
+        time.sleep(0.05)
+        self.listner.message_publish(PubsubMessage('realm/s/a', {'n': 1}))
+        self.listner.message_publish(PubsubMessage('realm/x', {'n': 2}))
+        self.assertEqual(self.client.recv(), {'topic': 'realm/s/a', 'payload': {'n': 1}})
+        self.assertEqual(self.mqttc.message_publish.call_count, 2)
+
+    def test_raw_payload_handler(self):
+        handler = MagicMock(return_value=None)
+        self.listner.message_handler_add('realm/stdin', handler, decode_json=False)
+        self.client.send({'topic': 'realm/stdin', 'payload': {'a': 1}})
+        self.client.send({'subscribe': 'sync'})
+        deadline = time.time() + 2
+        while not handler.called and time.time() < deadline: time.sleep(0.01)
+        self.assertEqual(handler.call_args.args[0].payload, '{"a": 1}')
+
+    def test_oversized_frame_closes_connection(self):
+        self.client.sock.sendall(struct.pack('!I', 4096))
+        self.assertEqual(self.client.recv()['payload']['desc'], 'Frame too large')
+        self.assertIsNone(self.client.recv())
+
+    def test_close(self):
+        self.client.send({'topic': 'realm/other', 'payload': {}})
+        self.client.recv()
+        self.listner.close()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(self.client.recv())
+
+
+class TestRuntimeOverSocket(RuntimeTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.patch_launcher()
+        self.start_runtime()
+        path = os.path.join(self.dir, 'control.sock')
+        self.listner = SocketListner(self.rtmngr, path)
+        self.addCleanup(self.listner.close)
+        self.listner.pubsub_connected(MagicMock())
+        self.listner.wait_init()
+        self.client = _Client(path)
+        self.addCleanup(self.client.close)
+
+    def test_query(self):
+        self.client.send({'subscribe': RT_CFG['topics']['runtimes']})
+        self.client.send({'topic': RT_CFG['topics']['modules'], 'payload': {
+            'object_id': 'q-1', 'type': 'req', 'action': 'capacity', 'data': {'parent': RT_UUID}}})
+        resp = self.client.recv()
+        self.assertEqual(resp['payload']['object_id'], 'q-1')
+        self.assertEqual(resp['payload']['data']['details']['max_nmodules'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Unit tests for live resource updates:
+  - update requests are checked, charged to the module quotas, applied to the running container and confirmed with the limits applied
+  - DockerClient updates cpus as a cpu quota, and memory with its swap limit
+"""
+import unittest
+from unittest.mock import MagicMock
+
+import docker
+
+from common import InvalidArgument, LauncherException
+from model import Module, Result, SlMsgs
+from launcher.docker_client import DockerClient
+from runtime.quota import TenantQuotas
+from tests.helpers import RuntimeTestCase, create_msg
+
+
+def _update_msg(mod_uuid, resources):
+    return SlMsgs('orchestrator').req('realm/modules', 'update', {'uuid': mod_uuid, 'resources': resources}, convert=False)
+
+
+class TestResourceLimits(unittest.TestCase):
+
+    def test_check_converts(self):
+        limits = Module.check_resource_limits({'cpus': '0.5', 'mem_mb': 256, 'cpu_shares': '512', 'cpuset_cpus': '0-1,3'})
+        self.assertEqual(limits, {'cpus': 0.5, 'mem_mb': 256.0, 'cpu_shares': 512, 'cpuset_cpus': '0-1,3'})
+
+    def test_check_rejects_invalid(self):
+        for limits in ({}, None, {'cpus': 0}, {'cpus': 'lots'}, {'cpu_shares': 1}, {'cpuset_cpus': 'all'}, {'gpus': 1}):
+            with self.assertRaises(InvalidArgument):
+                Module.check_resource_limits(limits)
+
+    def test_quota_resize(self):
+        quotas = TenantQuotas(scene={'max_cpus': 2})
+        charge, _ = quotas.charge('ns', 'ns/a', cpus=1)
+        quotas.charge('ns', 'ns/a', cpus=0.5)
+        self.assertEqual(charge.resize(3, 0).limit, 'max_cpus')
+        self.assertIsNone(charge.resize(1.5, 0))
+        self.assertEqual(quotas.usage(TenantQuotas.SCENE, 'ns/a')['cpus'], 2)
+        self.assertIsNone(charge.resize(0.25, 0))
+        self.assertEqual(quotas.usage(TenantQuotas.SCENE, 'ns/a')['cpus'], 0.75)
+
+
+class TestDockerClientUpdate(unittest.TestCase):
+
+    def _client(self):
+        client = DockerClient.__new__(DockerClient)
+        client._container = MagicMock()
+        client._container.attrs = {'HostConfig': {'CpuPeriod': 100000, 'CpuQuota': 50000, 'Memory': 256 * 2**20,
+                                                  'CpuShares': 512, 'CpusetCpus': '0'}}
+        self.addCleanup(setattr, client, '_container', None)
+        return client
+
+    def test_update_options(self):
+        client = self._client()
+        applied = client.update(cpus=0.5, mem_mb=256, cpu_shares=512)
+        client._container.update.assert_called_once_with(cpu_period=100000, cpu_quota=50000, cpu_shares=512,
+                                                         mem_limit=256 * 2**20, memswap_limit=512 * 2**20)
+        self.assertEqual(applied, {'cpus': 0.5, 'mem_mb': 256, 'cpu_shares': 512, 'cpuset_cpus': '0'})
+
+    def test_update_error(self):
+        client = self._client()
+        client._container.update.side_effect = docker.errors.APIError("bad update")
+        with self.assertRaises(LauncherException):
+            client.update(cpus=1)
+
+
+class TestRuntimeUpdate(RuntimeTestCase):
+
+    def setUp(self):
+        self.launcher = self.patch_launcher()
+        self.launcher.update_resources.side_effect = lambda limits: dict(limits)
+
+        self.start_runtime(quotas={'scene': {'max_cpus': 2}})
+        self.rtmngr.control(create_msg('mod-a', resources=[{'cpus': 1, 'mem_mb': 128}]))
+        self.wait_for(lambda: len(self.published) == 1)
+        self.mngr_module = self.rtmngr._RuntimeMngr__modules['mod-a']
+
+    def _cpus_charged(self):
+        return self.rtmngr._RuntimeMngr__quotas.usage(TenantQuotas.SCENE, 'public/default')['cpus']
+
+    def test_update_applied_and_confirmed(self):
+        resp = self.rtmngr.control(_update_msg('mod-a', {'cpus': 1.5, 'cpuset_cpus': '0-1'}))
+        self.assertEqual(resp.payload['data']['result'], Result.ok)
+        self.assertEqual(resp.payload['data']['details']['resources'], {'cpus': 1.5, 'cpuset_cpus': '0-1'})
+        self.launcher.update_resources.assert_called_once_with({'cpus': 1.5, 'cpuset_cpus': '0-1'})
+        self.assertEqual(self._cpus_charged(), 1.5)
+        # restarted containers get the new limits
+        module = self.mngr_module.module
+        self.assertEqual((module.requested_cpus, module.requested_mem_mb, module.cpuset_cpus), (1.5, 128, '0-1'))
+        self.assertEqual(self.mngr_module.spec['resources'], module.resources)
+
+    def test_update_over_quota(self):
+        resp = self.rtmngr.control(_update_msg('mod-a', {'cpus': 3}))
+        self.assertEqual(resp.payload['data']['result'], Result.busy)
+        self.assertEqual(resp.payload['data']['details']['limit'], 'max_cpus')
+        self.launcher.update_resources.assert_not_called()
+        self.assertEqual(self._cpus_charged(), 1)
+
+    def test_failed_update_restores_quota(self):
+        self.launcher.update_resources.side_effect = LauncherException("no docker")
+        with self.assertRaises(LauncherException):
+            self.rtmngr.control(_update_msg('mod-a', {'cpus': 2}))
+        self.assertEqual(self._cpus_charged(), 1)
+        self.assertEqual(self.mngr_module.module.requested_cpus, 1)
+
+    def test_update_unknown_or_stopping_module(self):
+        with self.assertRaises(InvalidArgument):
+            self.rtmngr.control(_update_msg('ghost', {'cpus': 1}))
+        self.rtmngr._RuntimeMngr__modules['mod-a'].state = 'stopping'
+        with self.assertRaises(InvalidArgument):
+            self.rtmngr.control(_update_msg('mod-a', {'cpus': 1.5}))
+        self.assertEqual(self._cpus_charged(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()